@@ -0,0 +1,16 @@
+from django.conf import settings
+
+
+def configure_sqlite_connection(sender, connection, **kwargs) -> None:
+    """Apply settings.SQLITE_PRAGMAS to every new SQLite connection.
+
+    WAL journaling lets the read endpoints keep serving the last committed
+    state while a generation holds its write transaction, and the busy
+    timeout makes competing writers wait instead of failing with
+    "database is locked".
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,164 @@
+"""Fail-fast feasibility bounds for a compiled class problem (see solver.compile_class_problem).
+
+Nothing here searches: every check compares what a resource is asked for
+with an upper bound on what it can supply, so an item reported as
+infeasible cannot be scheduled by any solver, not just the greedy one.
+Room types follow the solver: practicals are taught in labs, lectures and
+tutorials of a course without practicals in classrooms, and those of a
+course with practicals in either.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import solver
+
+BOTTLENECKS = 10
+
+
+def _max_sessions(windows: Iterable[Tuple[int, int, int]], gap: int) -> int:
+    """Most (day, start, end) windows one person can attend, ``gap`` minutes apart (earliest end first)"""
+    count = 0
+    last_end: Dict[int, int] = {}
+    for day, start, end in sorted(windows, key=lambda w: (w[0], w[2])):
+        if day not in last_end or start >= last_end[day] + gap:
+            last_end[day] = end
+            count += 1
+    return count
+
+
+def _load(demand: int, supply: int) -> Optional[float]:
+    """Demand over supply; None when there is demand but no supply at all"""
+    if supply == 0:
+        return None if demand else 0.0
+    return round(demand / supply, 3)
+
+
+def _rank(row: Dict) -> float:
+    load = _load(row["demand"], row["supply"])
+    return float("inf") if load is None else load
+
+
+def check(problem: Dict) -> Dict:
+    """Infeasible course-sections and the most loaded professors, room types and sections.
+
+    Only the course-sections solver.section_demand schedules are checked.
+
+    * per course-section: an instructor, a lab that seats it for
+      practicals, enough usable (slot, room) pairs for its sessions with
+      the instructor's breaks respected (none inside a multi-slot
+      practical), and enough days for one lecture/tutorial per day;
+    * per professor: sessions taught against the most sessions their
+      availability allows;
+    * per room type and seat count: sessions that can only use that type
+      and need at least that many seats against the room-slots that offer
+      them.
+
+    Each of those can make the problem infeasible. Per section, sessions
+    against the teaching slots its students could attend without overlap
+    are reported as a bottleneck only: the solver does not keep a
+    section's sessions apart, so exceeding it is a clash, not a failure.
+    """
+    model = solver.ClassModel(problem)
+    courses = problem["courses"]
+    sections = model.sections
+    slots = list(zip(model.slot_day, model.slot_start, model.slot_end))
+    teaching = model.slots_in(((1 << len(slots)) - 1) & ~model.mess_mask)
+    # Per teaching slot and room type: capacities of the rooms open then
+    open_caps = {
+        labs: {ti: [model.capacity[ri] for ri in by_slot[ti]] for ti in teaching}
+        for labs, by_slot in ((False, model.open_classrooms), (True, model.open_labs))
+    }
+    biggest = {labs: max((cap for caps in by_slot.values() for cap in caps), default=0)
+               for labs, by_slot in open_caps.items()}
+    teachable = {
+        model.professor_ids[pi]: model.slots_in(model.available(pi)) for pi in set(model.course_professor) if pi >= 0
+    }
+    # Sessions of a multi-slot practical follow each other without a break
+    blocks = [model.practical_block[ci] > 1 and model.practicals[ci] > 0 for ci in range(len(courses))]
+    back_to_back = {model.professor_ids[model.course_professor[ci]] for ci, block in enumerate(blocks)
+                    if block and model.course_professor[ci] >= 0}
+
+    infeasible: List[Dict] = []
+    resources: List[Dict] = []
+    professor_demand: Dict[int, int] = defaultdict(int)
+    section_demand: Dict[int, int] = defaultdict(int)
+    # (is lab, seats) -> sessions needing that room type and at least that many seats
+    room_demand: Dict[Tuple[bool, int], int] = defaultdict(int)
+
+    course_sections = 0
+    for task in model.tasks:
+        ci, si = divmod(task, len(sections))
+        _, code, instructors, lectures, tutorials, practicals = courses[ci]
+        sessions = lectures + tutorials + practicals
+        if not sessions:
+            continue
+        course_sections += 1
+        labs = practicals > 0
+        seats = model.seats(ci, si)
+        section_demand[si] += sessions
+        if labs:
+            room_demand[(True, seats)] += practicals
+        else:
+            room_demand[(False, seats)] += sessions
+        item = {"scope": "course_section", "course": code, "section": sections[si], "room_type": "LAB" if labs else "CLASSROOM"}
+        if not instructors:
+            infeasible.append(dict(item, reason="no_instructor", demand=sessions, supply=0))
+            continue
+
+        professor_demand[instructors[0]] += sessions
+        if seats > biggest[labs]:
+            infeasible.append(dict(item, reason="capacity", demand=seats, supply=biggest[labs]))
+            continue
+        # Slots with a room that seats the section: labs for practicals, either type for the rest of a lab course
+        fits = {
+            kind: [ti for ti in teachable[instructors[0]] if any(cap >= seats for cap in open_caps[kind][ti])]
+            for kind in ((True, False) if labs else (False,))
+        }
+        usable = sorted(set().union(*fits.values()))
+        gap = 0 if blocks[ci] else solver.MIN_BREAK_MINUTES
+        supply = _max_sessions((slots[ti] for ti in usable), gap)
+        lab_supply = _max_sessions((slots[ti] for ti in fits[True]), gap) if labs else 0
+        if sessions > supply:
+            infeasible.append(dict(item, reason="slots", demand=sessions, supply=supply))
+        elif labs and practicals > lab_supply:
+            infeasible.append(dict(item, reason="slots", demand=practicals, supply=lab_supply))
+        days = len({slots[ti][0] for ti in usable})
+        if lectures + tutorials > days:
+            infeasible.append(dict(item, reason="days", demand=lectures + tutorials, supply=days))
+
+    for instructor_id, needed in professor_demand.items():
+        gap = 0 if instructor_id in back_to_back else solver.MIN_BREAK_MINUTES
+        supply = _max_sessions((slots[ti] for ti in teachable[instructor_id]), gap)
+        resources.append({"scope": "professor", "id": instructor_id, "demand": needed, "supply": supply})
+
+    for labs in (False, True):
+        # Hall's condition on nested sets: sessions needing >= seats vs room-slots offering >= seats
+        thresholds = sorted(seats for is_lab, seats in room_demand if is_lab == labs)
+        worst = None
+        for seats in thresholds:
+            needed = sum(n for (is_lab, s), n in room_demand.items() if is_lab == labs and s >= seats)
+            supply = sum(cap >= seats for caps in open_caps[labs].values() for cap in caps)
+            row = {"scope": "room_type", "id": "LAB" if labs else "CLASSROOM", "seats": seats,
+                   "demand": needed, "supply": supply}
+            if worst is None or _rank(row) > _rank(worst):
+                worst = row
+        if worst:
+            resources.append(worst)
+
+    section_supply = _max_sessions((slots[ti] for ti in teaching), 0)
+    for si, needed in section_demand.items():
+        resources.append({"scope": "section", "id": sections[si], "demand": needed, "supply": section_supply})
+
+    for row in resources:
+        row["load"] = _load(row["demand"], row["supply"])
+        if row["demand"] > row["supply"] and row["scope"] != "section":
+            infeasible.append(dict(row, reason="overloaded"))
+    resources.sort(key=_rank, reverse=True)
+
+    return {
+        "feasible": not infeasible,
+        "infeasible": infeasible,
+        "bottlenecks": resources[:BOTTLENECKS],
+        "course_sections": course_sections,
+        "sessions": sum(section_demand.values()),
+    }
@@ -0,0 +1,535 @@
+import csv
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import TextIOWrapper
+from itertools import chain, islice
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import django
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import models, problem_cache
+
+DEFAULT_CHUNK_SIZE = 2000
+UPDATE_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+ENROLLMENT_CHUNK_SIZE = 5000
+VALIDATION_WORKERS = int(os.environ.get("CSV_VALIDATION_WORKERS", min(4, os.cpu_count() or 1)))
+
+TRUE_VALUES = ("1", "true", "yes")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def iter_csv_chunks(file, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Tuple[int, Dict]]]:
+    """Yield (line_number, row) pairs of an uploaded CSV in chunks"""
+    reader = csv.DictReader(TextIOWrapper(file, encoding="utf-8"))
+    numbered = enumerate(reader, start=2)  # line 1 is the header
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _has_unique_key(model, key_fields: Sequence[str]) -> bool:
+    if len(key_fields) == 1 and model._meta.get_field(key_fields[0]).unique:
+        return True
+    key_names = {model._meta.get_field(f).name for f in key_fields}
+    return any(set(together) == key_names for together in model._meta.unique_together)
+
+
+class ErrorReport:
+    """Row-level problems collected during an import instead of aborting it"""
+
+    def __init__(self, limit: int = MAX_REPORTED_ERRORS):
+        self.limit = limit
+        self.count = 0
+        self.errors: List[Dict] = []
+
+    def add(self, line: int, message: str) -> None:
+        self.count += 1
+        if len(self.errors) < self.limit:
+            self.errors.append({"line": line, "detail": message})
+
+    def as_dict(self) -> Dict:
+        return {
+            "error_count": self.count,
+            "errors": self.errors,
+            "errors_truncated": self.count > len(self.errors),
+        }
+
+
+def reference_map(model, lookup_field: str) -> Dict:
+    """Map a natural key of ``model`` to its id with a single query"""
+    return dict(model.objects.values_list(lookup_field, "id"))
+
+
+def _validate_chunk(model_label: str, fields: Sequence[str], chunk: List[Tuple[int, Dict]]) -> List[Tuple[int, Dict, List[str]]]:
+    """Convert and validate one chunk of parsed rows.
+
+    Runs in a worker process, so it only touches field definitions and never
+    the database; references are resolved by the caller beforehand.
+    """
+    model = apps.get_model(model_label)
+    model_fields = [model._meta.get_field(name) for name in fields]
+    checks_range = "start_time" in fields and "end_time" in fields
+    validated = []
+    for line, raw in chunk:
+        values = dict(raw)
+        errors = []
+        for field in model_fields:
+            name = field.attname if field.is_relation else field.name
+            try:
+                if field.is_relation:
+                    values[name] = field.to_python(raw.get(name))
+                else:
+                    values[name] = field.clean(raw.get(name), None)
+            except ValidationError as exc:
+                errors.append(f"{name}: {'; '.join(exc.messages)}")
+        if checks_range and not errors and values["start_time"] >= values["end_time"]:
+            errors.append("end_time must be after start_time")
+        validated.append((line, values, errors))
+    return validated
+
+
+def _validation_pool() -> ProcessPoolExecutor:
+    """The process's validation pool, started on first use and shared by later imports.
+
+    Workers are spawned, not forked: they never inherit the importing
+    request's database connection or its open transaction.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=VALIDATION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        return _pool
+
+
+def _validated_chunks(
+    prepared: Iterator[List[Tuple[int, Dict]]], model, fields: Sequence[str]
+) -> Iterator[List[Tuple[int, Dict, List[str]]]]:
+    """Validate chunks in order, fanning out to the validation pool for multi-chunk files"""
+    label = model._meta.label
+    head = list(islice(prepared, 2))
+    if len(head) < 2 or VALIDATION_WORKERS <= 1:
+        for chunk in chain(head, prepared):
+            yield _validate_chunk(label, fields, chunk)
+        return
+
+    pool = _validation_pool()
+    pending = deque()
+    try:
+        for chunk in chain(head, prepared):
+            pending.append(pool.submit(_validate_chunk, label, fields, chunk))
+            if len(pending) >= VALIDATION_WORKERS * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def run_import(
+    file,
+    model,
+    key_fields: Sequence[str],
+    update_fields: Sequence[str],
+    parse_row: Callable[[Dict], Dict],
+    prepare_chunk: Optional[Callable[[List[Tuple[int, Dict]], ErrorReport], List[Tuple[int, Dict]]]] = None,
+    after_chunk: Optional[Callable[[List[Dict], ErrorReport], None]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    dry_run: bool = False,
+) -> Dict:
+    """Upsert a CSV into ``model`` chunk by chunk.
+
+    Each chunk is diffed against the existing rows with a single ``__in``
+    query on the first key field, then written with one ``bulk_create`` for
+    new rows and one ``bulk_update`` for changed rows. ``parse_row`` maps a
+    CSV row onto model values and ``prepare_chunk`` may rewrite a whole
+    chunk of parsed rows (e.g. to resolve references against a preloaded
+    map), returning the rows to keep. Rows it drops should be recorded on
+    the :class:`ErrorReport`, which is returned with the counts. Keys beyond
+    ``key_fields`` and ``update_fields`` are ignored by the engine but
+    handed to ``after_chunk``.
+
+    Field values are validated (types, choices, blanks, time ranges) in a
+    process pool and invalid rows are skipped into the report. With
+    ``dry_run`` nothing is written and the counts are the projected ones.
+    """
+    started = time.perf_counter()
+    fields = list(key_fields) + list(update_fields)
+    on_conflict = _has_unique_key(model, key_fields)
+    stats = {"rows": 0, "created": 0, "updated": 0, "unchanged": 0, "duplicates": 0, "skipped": 0}
+    report = ErrorReport()
+    # Rows a dry run would already have written in an earlier chunk, by key
+    projected: Dict[Tuple, object] = {}
+
+    def prepared() -> Iterator[List[Tuple[int, Dict]]]:
+        for chunk in iter_csv_chunks(file, chunk_size):
+            stats["rows"] += len(chunk)
+            parsed = [(line, parse_row(row)) for line, row in chunk]
+            if prepare_chunk:
+                kept = prepare_chunk(parsed, report)
+                stats["skipped"] += len(parsed) - len(kept)
+                parsed = kept
+            yield parsed
+
+    with transaction.atomic():
+        for validated in _validated_chunks(prepared(), model, fields):
+            by_key: Dict[Tuple, Dict] = {}
+            for line, values, errors in validated:
+                if errors:
+                    report.add(line, "; ".join(errors))
+                    stats["skipped"] += 1
+                    continue
+                key = tuple(values[f] for f in key_fields)
+                if key in by_key:
+                    stats["duplicates"] += 1
+                by_key[key] = values
+
+            if not by_key:
+                continue
+            lookup = {f"{key_fields[0]}__in": {k[0] for k in by_key}}
+            existing = {
+                tuple(getattr(obj, f) for f in key_fields): obj
+                for obj in model.objects.filter(**lookup)
+            }
+            if dry_run:
+                # Later chunks see an earlier chunk's rows as existing, as they would after its writes
+                existing.update((key, projected[key]) for key in by_key if key in projected and key not in existing)
+
+            now = timezone.now()
+            to_create = []
+            to_update = []
+            for key, values in by_key.items():
+                obj = existing.get(key)
+                if obj is None:
+                    to_create.append(model(**{f: values[f] for f in fields}))
+                    continue
+                changed = [f for f in update_fields if getattr(obj, f) != values[f]]
+                if not changed:
+                    stats["unchanged"] += 1
+                    continue
+                for f in changed:
+                    setattr(obj, f, values[f])
+                obj.updated_at = now
+                to_update.append(obj)
+            stats["created"] += len(to_create)
+            stats["updated"] += len(to_update)
+
+            if dry_run:
+                projected.update((tuple(getattr(obj, f) for f in key_fields), obj) for obj in to_create)
+            else:
+                if to_create:
+                    if on_conflict and update_fields:
+                        # Rows inserted concurrently since the diff become updates
+                        model.objects.bulk_create(
+                            to_create,
+                            update_conflicts=True,
+                            unique_fields=list(key_fields),
+                            update_fields=list(update_fields) + ["updated_at"],
+                        )
+                    elif on_conflict:
+                        # Nothing to update on a key-only row (e.g. enrollments): one inserted
+                        # concurrently since the diff is already what this row would write
+                        model.objects.bulk_create(to_create, ignore_conflicts=True)
+                    else:
+                        model.objects.bulk_create(to_create)
+                if to_update:
+                    model.objects.bulk_update(
+                        to_update, list(update_fields) + ["updated_at"], batch_size=UPDATE_BATCH_SIZE
+                    )
+
+            if after_chunk:
+                after_chunk(list(by_key.values()), report)
+
+        if not dry_run:
+            # Bulk writes send no signals; after_chunk may have written links too
+            problem_cache.bump(model)
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["rows_per_second"] = round(stats["rows"] / elapsed, 1) if elapsed > 0 else None
+    stats.update(report.as_dict())
+    if dry_run:
+        stats["dry_run"] = True
+    return stats
+
+
+def _flag(value: Optional[str]) -> bool:
+    return (value or "false").lower() in TRUE_VALUES
+
+
+def import_students(file, dry_run: bool = False) -> Dict:
+    return run_import(
+        file,
+        models.Student,
+        key_fields=["roll_number"],
+        update_fields=["name", "program", "batch", "section"],
+        parse_row=lambda row: {
+            "roll_number": row.get("roll_number"),
+            "name": row.get("name"),
+            "program": row.get("program", ""),
+            "batch": row.get("batch", ""),
+            "section": row.get("section", "A"),
+        },
+        dry_run=dry_run,
+    )
+
+
+def import_professors(file, dry_run: bool = False) -> Dict:
+    return run_import(
+        file,
+        models.Professor,
+        key_fields=["email"],
+        update_fields=["name", "department"],
+        parse_row=lambda row: {
+            "email": row.get("email"),
+            "name": row.get("name"),
+            "department": row.get("department", ""),
+        },
+        dry_run=dry_run,
+    )
+
+
+def import_rooms(file, dry_run: bool = False) -> Dict:
+    return run_import(
+        file,
+        models.Room,
+        key_fields=["code"],
+        update_fields=["name", "building", "capacity", "room_type"],
+        parse_row=lambda row: {
+            "code": row.get("code"),
+            "name": row.get("name"),
+            "building": row.get("building", ""),
+            "capacity": row.get("capacity", 0),
+            "room_type": row.get("room_type", models.RoomType.CLASSROOM),
+        },
+        dry_run=dry_run,
+    )
+
+
+def import_slots(file, dry_run: bool = False) -> Dict:
+    return run_import(
+        file,
+        models.Slot,
+        key_fields=["code"],
+        update_fields=["day_of_week", "start_time", "end_time"],
+        parse_row=lambda row: {
+            "code": row.get("code"),
+            "day_of_week": row.get("day_of_week"),
+            "start_time": row.get("start_time"),
+            "end_time": row.get("end_time"),
+        },
+        dry_run=dry_run,
+    )
+
+
+def import_courses(file, dry_run: bool = False) -> Dict:
+    professor_ids = reference_map(models.Professor, "email")
+    through = models.Course.instructors.through
+
+    def parse_row(row: Dict) -> Dict:
+        return {
+            "code": row.get("code"),
+            "name": row.get("name"),
+            "lecture_hours": row.get("lecture_hours", 0),
+            "tutorial_hours": row.get("tutorial_hours", 0),
+            "practical_hours": row.get("practical_hours", 0),
+            "practical_block": row.get("practical_block") or 1,
+            "self_study_hours": row.get("self_study_hours", 0),
+            "credits": row.get("credits", 0),
+            "is_half_semester": _flag(row.get("is_half_semester")),
+            "is_elective": _flag(row.get("is_elective")),
+            "instructor_emails": [e.strip() for e in (row.get("instructors") or "").split(",") if e.strip()],
+        }
+
+    def keep_lines(parsed: List[Tuple[int, Dict]], report: ErrorReport) -> List[Tuple[int, Dict]]:
+        # Remember each row's line so unknown instructors can be reported
+        for line, values in parsed:
+            values["line"] = line
+        return parsed
+
+    def link_instructors(rows: List[Dict], report: ErrorReport) -> None:
+        with_emails = [r for r in rows if r["instructor_emails"]]
+        if dry_run:
+            for r in with_emails:
+                for email in r["instructor_emails"]:
+                    if email not in professor_ids:
+                        report.add(r["line"], f"Unknown instructor email {email!r} for course {r['code']}")
+            return
+        if not with_emails:
+            return
+        course_ids = dict(
+            models.Course.objects.filter(code__in=[r["code"] for r in with_emails]).values_list("code", "id")
+        )
+        links = []
+        for r in with_emails:
+            course_id = course_ids[r["code"]]
+            for email in r["instructor_emails"]:
+                if email not in professor_ids:
+                    report.add(r["line"], f"Unknown instructor email {email!r} for course {r['code']}")
+                    continue
+                links.append(through(course_id=course_id, professor_id=professor_ids[email]))
+        # Same replace semantics as instructors.set(), one DELETE and one INSERT per chunk
+        through.objects.filter(course_id__in=course_ids.values()).delete()
+        through.objects.bulk_create(links, ignore_conflicts=True)
+
+    return run_import(
+        file,
+        models.Course,
+        key_fields=["code"],
+        update_fields=[
+            "name",
+            "lecture_hours",
+            "tutorial_hours",
+            "practical_hours",
+            "practical_block",
+            "self_study_hours",
+            "credits",
+            "is_half_semester",
+            "is_elective",
+        ],
+        parse_row=parse_row,
+        prepare_chunk=keep_lines,
+        after_chunk=link_instructors,
+        dry_run=dry_run,
+    )
+
+
+def _resolve_refs(*refs: Tuple[Dict, str, str, str]):
+    """Build a ``prepare_chunk`` hook resolving natural key columns against preloaded maps.
+
+    Each ref is a ``(ref_ids, label, ref_column, fk_field)`` tuple.
+    """
+
+    def prepare(parsed: List[Tuple[int, Dict]], report: ErrorReport) -> List[Tuple[int, Dict]]:
+        kept = []
+        for line, values in parsed:
+            resolved = True
+            for ref_ids, label, ref_column, fk_field in refs:
+                ref = values.pop(ref_column)
+                if ref not in ref_ids:
+                    report.add(line, f"Unknown {label} {ref!r}")
+                    resolved = False
+                    continue
+                values[fk_field] = ref_ids[ref]
+            if resolved:
+                kept.append((line, values))
+        return kept
+
+    return prepare
+
+
+def import_professor_availability(file, dry_run: bool = False) -> Dict:
+    return run_import(
+        file,
+        models.ProfessorAvailability,
+        key_fields=["professor_id", "day_of_week", "start_time", "end_time"],
+        update_fields=[],
+        parse_row=lambda row: {
+            "professor_email": row.get("professor_email"),
+            "day_of_week": row.get("day_of_week"),
+            "start_time": row.get("start_time"),
+            "end_time": row.get("end_time"),
+        },
+        prepare_chunk=_resolve_refs(
+            (reference_map(models.Professor, "email"), "professor email", "professor_email", "professor_id"),
+        ),
+        dry_run=dry_run,
+    )
+
+
+def import_room_availability(file, dry_run: bool = False) -> Dict:
+    return run_import(
+        file,
+        models.RoomAvailability,
+        key_fields=["room_id", "day_of_week"],
+        update_fields=["start_time", "end_time"],
+        parse_row=lambda row: {
+            "room_code": row.get("room_code"),
+            "day_of_week": row.get("day_of_week"),
+            "start_time": row.get("start_time"),
+            "end_time": row.get("end_time"),
+        },
+        prepare_chunk=_resolve_refs((reference_map(models.Room, "code"), "room code", "room_code", "room_id")),
+        dry_run=dry_run,
+    )
+
+
+def import_enrollments(file, replace: bool = False, dry_run: bool = False) -> Dict:
+    """Import roll_number,course_code pairs.
+
+    With ``replace`` every course named in the file loses its existing
+    enrollments before the file's rows are written, so the upload becomes
+    the complete roster for those courses.
+    """
+    resolve = _resolve_refs(
+        (reference_map(models.Student, "roll_number"), "student roll number", "roll_number", "student_id"),
+        (reference_map(models.Course, "code"), "course code", "course_code", "course_id"),
+    )
+    cleared: Set[int] = set()
+    replaced = {"deleted": 0}
+
+    def prepare(parsed: List[Tuple[int, Dict]], report: ErrorReport) -> List[Tuple[int, Dict]]:
+        kept = resolve(parsed, report)
+        if replace:
+            new_courses = {values["course_id"] for _, values in kept} - cleared
+            if new_courses:
+                existing = models.Enrollment.objects.filter(course_id__in=new_courses)
+                replaced["deleted"] += existing.count() if dry_run else existing.delete()[0]
+                cleared.update(new_courses)
+        return kept
+
+    result = run_import(
+        file,
+        models.Enrollment,
+        # student first: the per-chunk diff query then only touches those students' rows
+        key_fields=["student_id", "course_id"],
+        update_fields=[],
+        parse_row=lambda row: {
+            "roll_number": (row.get("roll_number") or "").strip(),
+            "course_code": (row.get("course_code") or "").strip(),
+        },
+        prepare_chunk=prepare,
+        chunk_size=ENROLLMENT_CHUNK_SIZE,
+        dry_run=dry_run,
+    )
+    if replace:
+        if dry_run:
+            # Existing rows of replaced courses would have been deleted first
+            result["created"] += result["unchanged"]
+            result["unchanged"] = 0
+        result["replaced_courses"] = len(cleared)
+        result["deleted"] = replaced["deleted"]
+    return result
+
+
+def import_core_courses(file, dry_run: bool = False) -> Dict:
+    """Import course_code,section pairs: courses every student of the section takes"""
+    return run_import(
+        file,
+        models.CoreCourse,
+        key_fields=["course_id", "section"],
+        update_fields=[],
+        parse_row=lambda row: {
+            "course_code": (row.get("course_code") or "").strip(),
+            "section": (row.get("section") or "").strip(),
+        },
+        prepare_chunk=_resolve_refs((reference_map(models.Course, "code"), "course code", "course_code", "course_id")),
+        dry_run=dry_run,
+    )
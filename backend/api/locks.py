@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import models
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; fall back to a per-process lock
+    fcntl = None
+
+POLL_SECONDS = 0.2
+RUN_HISTORY = timedelta(days=1)
+
+_local_locks: Dict[int, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+
+class RunFailed(Exception):
+    """The run a caller attached to raised; ``result`` is what its owner recorded"""
+
+    def __init__(self, result: Dict):
+        super().__init__(result.get("message"))
+        self.result = result
+
+
+def _try_lock(timetable_id: int):
+    """Take the timetable's advisory lock without blocking; returns a handle or None"""
+    if fcntl is None:
+        with _local_locks_guard:
+            lock = _local_locks.setdefault(timetable_id, threading.Lock())
+        return lock if lock.acquire(blocking=False) else None
+
+    os.makedirs(settings.TIMETABLE_LOCK_DIR, exist_ok=True)
+    fh = open(os.path.join(settings.TIMETABLE_LOCK_DIR, f"timetable-{timetable_id}.lock"), "a")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        fh.close()
+        return None
+    return fh
+
+
+def _unlock(handle) -> None:
+    if fcntl is None:
+        handle.release()
+        return
+    fcntl.flock(handle, fcntl.LOCK_UN)
+    handle.close()
+
+
+def _finish(run: models.TimetableRun, status: str, result: Dict) -> None:
+    run.status = status
+    run.result = result
+    run.finished_at = timezone.now()
+    run.save(update_fields=["status", "result", "finished_at", "updated_at"])
+
+
+def _run_locked(timetable: models.Timetable, operation: str, options: Dict,
+                fn: Callable[[models.Timetable], Dict]) -> Dict:
+    run = models.TimetableRun.objects.create(timetable=timetable, operation=operation, options=options)
+    try:
+        result = fn(timetable)
+    except Exception as exc:
+        _finish(run, models.RunStatus.FAILED, {"status": "error", "message": str(exc)})
+        raise
+    _finish(run, models.RunStatus.SUCCEEDED, result)
+    models.TimetableRun.objects.filter(
+        timetable=timetable, finished_at__lt=timezone.now() - RUN_HISTORY
+    ).delete()
+    return {**result, "run_id": run.id, "coalesced": False}
+
+
+def _attached_result(run: models.TimetableRun) -> Dict:
+    result = {**(run.result or {}), "run_id": run.id, "coalesced": True}
+    if run.status == models.RunStatus.FAILED:
+        raise RunFailed(result)
+    return result
+
+
+def _await_run(run: models.TimetableRun, deadline: float) -> Optional[Dict]:
+    """Wait for another caller's run; None if its owner died without finishing it"""
+    while time.monotonic() < deadline:
+        run.refresh_from_db(fields=["status", "result"])
+        if run.status != models.RunStatus.RUNNING:
+            return _attached_result(run)
+        handle = _try_lock(run.timetable_id)
+        if handle is not None:
+            try:
+                # The owner finishes the row before unlocking, so re-check first
+                run.refresh_from_db(fields=["status", "result"])
+                if run.status != models.RunStatus.RUNNING:
+                    return _attached_result(run)
+                _finish(run, models.RunStatus.FAILED, {"status": "error", "message": "Run was abandoned"})
+                return None
+            finally:
+                _unlock(handle)
+        time.sleep(POLL_SECONDS)
+    return {"status": "busy", "message": f"Timed out waiting for {run.operation} run {run.id}", "run_id": run.id}
+
+
+def run_coalesced(timetable: models.Timetable, operation: str, fn: Callable[[models.Timetable], Dict],
+                  options: Optional[Dict] = None) -> Dict:
+    """Run ``fn`` under the timetable's advisory lock.
+
+    A caller that finds the same operation already running for the
+    timetable with the same ``options`` (the parameters ``fn`` was bound
+    to) attaches to it and returns that run's result instead of starting
+    another solve, or raises RunFailed if that run raised; a different
+    operation or different options wait for the lock. The lock is an
+    flock() on a per-timetable file, so it holds across worker processes
+    on one host.
+    """
+    # Compared with the stored JSON, so normalize the same way
+    options = json.loads(json.dumps(options or {}))
+    deadline = time.monotonic() + settings.TIMETABLE_RUN_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        handle = _try_lock(timetable.pk)
+        if handle is not None:
+            try:
+                return _run_locked(timetable, operation, options, fn)
+            finally:
+                _unlock(handle)
+
+        running = (
+            models.TimetableRun.objects.filter(timetable=timetable, status=models.RunStatus.RUNNING)
+            .order_by("-id")
+            .first()
+        )
+        if running is not None and running.operation == operation and running.options == options:
+            result = _await_run(running, deadline)
+            if result is not None:
+                return result
+            continue
+        time.sleep(POLL_SECONDS)
+    return {"status": "busy", "message": f"Timed out waiting for the {operation} lock"}
@@ -0,0 +1,204 @@
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import time as clock
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.test import APIClient
+
+from api import models, problem_cache, services
+
+# Cheap reads by default, so latency reflects waiting on the database rather than serializer work;
+# /statistics and /class-sessions/ can be added with --paths
+READ_PATHS = ("/api/timetables/{id}/sections/", "/api/timetables/{id}/data/")
+
+
+def build_dataset(courses: int, sections: int, seed: int) -> models.Timetable:
+    """A synthetic scheduling problem big enough for generation to take a few seconds"""
+    rnd = random.Random(seed)
+    professors = models.Professor.objects.bulk_create(
+        [models.Professor(name=f"P{i}", email=f"p{i}@bench.edu") for i in range(max(1, courses // 3))]
+    )
+    rooms = models.Room.objects.bulk_create(
+        [models.Room(code=f"R{i}", name=f"R{i}", capacity=rnd.choice([40, 60, 80, 120, 200])) for i in range(40)]
+        + [models.Room(code=f"L{i}", name=f"L{i}", capacity=rnd.choice([40, 60, 80]), room_type=models.RoomType.LAB)
+           for i in range(10)]
+    )
+    models.Slot.objects.bulk_create(
+        [
+            models.Slot(code=f"S{d}{h}", day_of_week=d, start_time=clock(h), end_time=clock(h, 50))
+            for d in range(5) for h in range(8, 18)
+        ]
+    )
+    models.MessHours.objects.bulk_create(
+        [models.MessHours(day_of_week=d, start_time=clock(13), end_time=clock(14)) for d in range(5)]
+    )
+    models.ProfessorAvailability.objects.bulk_create(
+        [
+            models.ProfessorAvailability(professor=p, day_of_week=d, start_time=clock(8), end_time=clock(18))
+            for p in professors for d in rnd.sample(range(5), 3)
+        ]
+    )
+    models.RoomAvailability.objects.bulk_create(
+        [
+            models.RoomAvailability(room=r, day_of_week=d, start_time=clock(8), end_time=clock(18))
+            for r in rooms for d in range(5)
+        ]
+    )
+    models.Student.objects.bulk_create(
+        [
+            models.Student(roll_number=f"{si}-{i}", name=f"S{i}", batch="2026", section=f"S{si}")
+            for si in range(sections) for i in range(rnd.choice([30, 50, 70]))
+        ]
+    )
+    created = models.Course.objects.bulk_create(
+        [
+            models.Course(code=f"C{i}", name=f"C{i}", lecture_hours=rnd.choice([2, 3]), tutorial_hours=rnd.choice([0, 1]),
+                          practical_hours=rnd.choice([0, 0, 2]))
+            for i in range(courses)
+        ]
+    )
+    models.Course.instructors.through.objects.bulk_create(
+        [models.Course.instructors.through(course_id=c.id, professor_id=rnd.choice(professors).id) for c in created]
+    )
+    return models.Timetable.objects.create(name="bench")
+
+
+def _percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure read latency while a class timetable generation runs in another process, "
+        "against an idle baseline, once per SQLite journal mode. Runs on a scratch database "
+        "file; the configured database is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", default="wal,delete",
+                            help="Comma-separated journal modes to compare (default: wal,delete)")
+        parser.add_argument("--courses", type=int, default=300)
+        parser.add_argument("--sections", type=int, default=12)
+        parser.add_argument("--paths", default=",".join(READ_PATHS),
+                            help="Comma-separated GET paths to poll; {id} is the timetable id")
+        parser.add_argument("--readers", type=int, default=2, help="Concurrent reader processes")
+        parser.add_argument("--pause", type=float, default=0.02, help="Seconds each reader sleeps between requests")
+        parser.add_argument("--idle-seconds", type=float, default=3.0,
+                            help="How long to measure reads with no generation running, as the baseline")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        default = connections["default"]
+        if default.vendor != "sqlite":
+            raise CommandError("bench_sqlite only runs against the SQLite backend")
+        original_name = default.settings_dict["NAME"]
+        original_pragmas = dict(settings.SQLITE_PRAGMAS)
+        try:
+            for mode in options["modes"].split(","):
+                self.run_mode(mode.strip(), options)
+        finally:
+            connections.close_all()
+            default.settings_dict["NAME"] = original_name
+            settings.SQLITE_PRAGMAS = original_pragmas
+            problem_cache.clear()
+
+    def run_mode(self, mode: str, options) -> None:
+        workdir = tempfile.mkdtemp(prefix="bench-sqlite-")
+        connections.close_all()
+        connections["default"].settings_dict["NAME"] = os.path.join(workdir, "bench.sqlite3")
+        settings.SQLITE_PRAGMAS = dict(settings.SQLITE_PRAGMAS, journal_mode=mode)
+        problem_cache.clear()
+        call_command("migrate", verbosity=0)
+        timetable = build_dataset(options["courses"], options["sections"], options["seed"])
+        # A first generation so readers have a live version to read
+        services.generate_class_timetable(timetable)
+        # Children are forked: none may inherit an open connection
+        connections.close_all()
+
+        context = multiprocessing.get_context("fork")
+        paths = [path.strip() for path in options["paths"].split(",") if path.strip()]
+        readers = (timetable.id, paths, options["readers"], options["pause"])
+        idle = self.read_while(context, *readers, lambda: time.sleep(options["idle_seconds"]))
+
+        def generate() -> None:
+            process = context.Process(target=_generate, args=(timetable.id, seconds))
+            process.start()
+            process.join()
+
+        seconds = context.Value("d", 0.0)
+        busy = self.read_while(context, *readers, generate)
+
+        self.stdout.write(f"journal_mode={mode}: generation {seconds.value:.2f}s, {options['readers']} reader processes")
+        for path in paths:
+            self.stdout.write(f"  {path}")
+            for label, (latencies, failures) in (("idle", idle), ("during generation", busy)):
+                samples = latencies[path]
+                summary = (
+                    f"n={len(samples):4d} p50={statistics.median(samples):8.1f}ms "
+                    f"p95={_percentile(samples, 0.95):8.1f}ms max={max(samples):8.1f}ms"
+                    if samples else "no successful reads"
+                )
+                failed = sum(1 for failed_path, _ in failures if failed_path == path)
+                self.stdout.write(f"    {label:18s} {summary}  failed={failed}")
+        for path, error in busy[1][:3]:
+            self.stdout.write(f"  failed: {path}: {error}")
+
+    def read_while(self, context, timetable_id: int, paths: List[str], readers: int, pause: float,
+                   work) -> Tuple[Dict[str, List[float]], List]:
+        """Latencies per path (ms) and failed reads of ``readers`` processes polling while ``work()`` runs"""
+        stop = context.Event()
+        results = context.Queue()
+        processes = [
+            context.Process(target=_read, args=(timetable_id, paths, pause, stop, results)) for _ in range(readers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            work()
+        finally:
+            stop.set()
+        latencies: Dict[str, List[float]] = {path: [] for path in paths}
+        failures: List = []
+        for _ in processes:
+            samples, failed = results.get()
+            for path, values in samples.items():
+                latencies[path].extend(values)
+            failures.extend(failed)
+        for process in processes:
+            process.join()
+        return latencies, failures
+
+
+def _generate(timetable_id: int, seconds) -> None:
+    started = time.perf_counter()
+    services.generate_class_timetable(models.Timetable.objects.get(id=timetable_id))
+    seconds.value = time.perf_counter() - started
+
+
+def _read(timetable_id: int, paths: List[str], pause: float, stop, results) -> None:
+    client = APIClient()
+    samples: Dict[str, List[float]] = {path: [] for path in paths}
+    failed = []
+    while not stop.is_set():
+        for path in paths:
+            started = time.perf_counter()
+            try:
+                response = client.get(path.format(id=timetable_id))
+                error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+            except Exception as exc:  # e.g. OperationalError: database is locked
+                error = str(exc)
+            if error is None:
+                samples[path].append((time.perf_counter() - started) * 1000)
+            else:
+                failed.append((path, error))
+            time.sleep(pause)
+    results.put((samples, failed))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import trace as trace_utils
+
+
+class Command(BaseCommand):
+    help = (
+        "Inspect a solver trace: print where search time went, re-run the current engine "
+        "on the recorded problem, or diff the decisions of two traces."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("trace", help="Trace file written by a traced generate/exam run")
+        parser.add_argument("--against", metavar="TRACE",
+                            help="Diff the decisions of TRACE (e.g. from another engine version) against the first trace")
+        parser.add_argument("--replay", action="store_true",
+                            help="Re-run the current engine on the recorded problem and diff its decisions")
+        parser.add_argument("--save", metavar="PATH", help="With --replay, write the replayed trace to PATH")
+        parser.add_argument("--folded", action="store_true",
+                            help="Print folded stacks (ns) for flamegraph.pl instead of the text breakdown")
+        parser.add_argument("--top", type=int, default=15, help="Courses listed in the breakdown")
+
+    def handle(self, *args, **options):
+        try:
+            recorded = trace_utils.Trace.load(options["trace"])
+            other = trace_utils.Trace.load(options["against"]) if options["against"] else None
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        if recorded.operation not in trace_utils.SOLVERS:
+            raise CommandError(f"Unknown operation {recorded.operation!r} in trace")
+
+        if options["replay"]:
+            _, other = trace_utils.replay(recorded, save_to=options["save"])
+
+        shown = other if other is not None else recorded
+        if options["folded"]:
+            for stack, ns in sorted(trace_utils.folded_stacks(shown).items()):
+                self.stdout.write(f"{stack} {ns}")
+            return
+
+        for line in trace_utils.breakdown(shown, top=options["top"]):
+            self.stdout.write(line)
+        if other is not None:
+            self.stdout.write("")
+            for line in trace_utils.diff(recorded, other):
+                self.stdout.write(line)
@@ -0,0 +1,142 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+TOP_STATEMENTS = 5
+
+_REGEX_GROUP = re.compile(r"\(\?P<(\w+)>[^)]*\)")
+
+_routes: Dict[str, Dict] = {}
+_routes_lock = threading.Lock()
+
+
+class _QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+            self.statements[sql] += 1
+
+
+def _route_key(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None or not match.route:
+        return f"{request.method} <unresolved>"
+    # Router URLs are regexes; show "timetables/<pk>/" rather than the raw pattern
+    route = _REGEX_GROUP.sub(r"<\1>", match.route).lstrip("^").rstrip("$")
+    return f"{request.method} /{route}"
+
+
+def _observe(route: str, wall_ms: float, db_ms: float, queries: int) -> None:
+    with _routes_lock:
+        stats = _routes.get(route)
+        if stats is None:
+            stats = _routes[route] = {
+                "count": 0,
+                "wall_ms_sum": 0.0,
+                "wall_ms_max": 0.0,
+                "db_ms_sum": 0.0,
+                "queries_sum": 0,
+                "queries_max": 0,
+                "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+        stats["count"] += 1
+        stats["wall_ms_sum"] += wall_ms
+        stats["wall_ms_max"] = max(stats["wall_ms_max"], wall_ms)
+        stats["db_ms_sum"] += db_ms
+        stats["queries_sum"] += queries
+        stats["queries_max"] = max(stats["queries_max"], queries)
+        stats["buckets"][bisect_left(LATENCY_BUCKETS_MS, wall_ms)] += 1
+
+
+def route_metrics() -> List[Dict]:
+    """Per-route latency histograms collected by RequestMetricsMiddleware, slowest mean first"""
+    with _routes_lock:
+        snapshot = {route: dict(stats, buckets=list(stats["buckets"])) for route, stats in _routes.items()}
+
+    rows = []
+    for route, stats in snapshot.items():
+        count = stats["count"]
+        cumulative = 0
+        histogram = {}
+        for bound, n in zip([*map(str, LATENCY_BUCKETS_MS), "+Inf"], stats["buckets"]):
+            cumulative += n
+            histogram[bound] = cumulative
+        rows.append({
+            "route": route,
+            "count": count,
+            "wall_ms_mean": round(stats["wall_ms_sum"] / count, 3),
+            "wall_ms_max": round(stats["wall_ms_max"], 3),
+            "db_ms_mean": round(stats["db_ms_sum"] / count, 3),
+            "queries_mean": round(stats["queries_sum"] / count, 2),
+            "queries_max": stats["queries_max"],
+            "histogram_ms": histogram,
+        })
+    rows.sort(key=lambda row: row["wall_ms_mean"], reverse=True)
+    return rows
+
+
+def reset_route_metrics() -> None:
+    with _routes_lock:
+        _routes.clear()
+
+
+class RequestMetricsMiddleware:
+    """Count SQL queries, DB time and wall time for every request.
+
+    The numbers are returned as X-DB-Query-Count / X-DB-Time-Ms /
+    X-Response-Time-Ms headers and folded into in-memory per-route
+    histograms (see route_metrics()). Requests slower than
+    REQUEST_SLOW_MS or issuing more than REQUEST_SLOW_QUERIES queries are
+    logged together with their most repeated SQL statements, which is
+    usually enough to spot an N+1 loop.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "REQUEST_SLOW_MS", 1000)
+        self.slow_queries = getattr(settings, "REQUEST_SLOW_QUERIES", 50)
+
+    def __call__(self, request):
+        recorder = _QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - started) * 1000
+        db_ms = recorder.seconds * 1000
+
+        response["X-DB-Query-Count"] = str(recorder.count)
+        response["X-DB-Time-Ms"] = f"{db_ms:.1f}"
+        response["X-Response-Time-Ms"] = f"{wall_ms:.1f}"
+
+        route = _route_key(request)
+        _observe(route, wall_ms, db_ms, recorder.count)
+
+        if wall_ms >= self.slow_ms or recorder.count > self.slow_queries:
+            repeated = "".join(
+                f"\n  {n}x {sql[:300]}" for sql, n in recorder.statements.most_common(TOP_STATEMENTS)
+            )
+            logger.warning(
+                "Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms in DB; top statements:%s",
+                request.method, request.get_full_path(), route, wall_ms, recorder.count, db_ms, repeated,
+            )
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.14 on 2026-10-19 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='classsession',
+            index=models.Index(fields=['timetable', 'section'], name='session_tt_section_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='classsession',
+            index=models.Index(fields=['timetable', 'instructor'], name='session_tt_instructor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='classsession',
+            index=models.Index(fields=['timetable', 'room'], name='session_tt_room_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professoravailability',
+            index=models.Index(fields=['professor', 'day_of_week', 'start_time'], name='prof_avail_day_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['room_type', 'capacity'], name='room_type_capacity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomavailability',
+            index=models.Index(fields=['room', 'day_of_week', 'start_time'], name='room_avail_day_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slot',
+            index=models.Index(fields=['day_of_week', 'start_time'], name='slot_day_start_idx'),
+        ),
+    ]
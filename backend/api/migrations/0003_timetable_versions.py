@@ -0,0 +1,55 @@
+# Generated by Django 5.0.14 on 2026-10-19 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_scheduling_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='classsession',
+            name='session_tt_section_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='classsession',
+            name='session_tt_instructor_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='classsession',
+            name='session_tt_room_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='classsession',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='classsession',
+            name='version',
+            field=models.PositiveIntegerField(default=1, help_text='Generation run that produced this session'),
+        ),
+        migrations.AddField(
+            model_name='timetable',
+            name='active_version',
+            field=models.PositiveIntegerField(default=1, help_text='Session version currently served to readers'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='classsession',
+            unique_together={('timetable', 'version', 'course', 'slot', 'section')},
+        ),
+        migrations.AddIndex(
+            model_name='classsession',
+            index=models.Index(fields=['timetable', 'version', 'section'], name='session_ver_section_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='classsession',
+            index=models.Index(fields=['timetable', 'version', 'instructor'], name='session_ver_instructor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='classsession',
+            index=models.Index(fields=['timetable', 'version', 'room'], name='session_ver_room_idx'),
+        ),
+    ]
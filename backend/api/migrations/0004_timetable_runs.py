@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-19 02:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_timetable_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimetableRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('operation', models.CharField(max_length=32)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('SUCCEEDED', 'Succeeded'), ('FAILED', 'Failed')], default='RUNNING', max_length=16)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('timetable', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='api.timetable')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timetable', 'status'], name='run_timetable_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.14 on 2026-10-19 03:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_data_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoreCourse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('section', models.CharField(max_length=10)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='core_sections', to='api.course')),
+            ],
+            options={
+                'unique_together': {('course', 'section')},
+            },
+        ),
+    ]
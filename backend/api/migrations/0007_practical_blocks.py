@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-19 03:05
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_core_courses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classsession',
+            name='block',
+            field=models.ForeignKey(blank=True, help_text='First session of the multi-slot practical this session belongs to (itself included)', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='block_sessions', to='api.classsession'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='practical_block',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Consecutive slots one practical spans, taught in the same lab on the same day', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
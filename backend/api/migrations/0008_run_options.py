@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_practical_blocks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timetablerun',
+            name='options',
+            field=models.JSONField(blank=True, default=dict, help_text='Parameters of the run; only identical ones coalesce'),
+        ),
+    ]
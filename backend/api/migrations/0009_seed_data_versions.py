@@ -0,0 +1,23 @@
+from django.db import migrations
+
+# problem_cache.NAMES when this migration was written; a counter added later needs its own migration
+NAMES = (
+    "core_course", "course", "enrollment", "mess_hours", "professor_availability", "room",
+    "room_availability", "slot", "student",
+)
+
+
+def seed(apps, schema_editor):
+    DataVersion = apps.get_model("api", "DataVersion")
+    DataVersion.objects.bulk_create([DataVersion(name=name) for name in NAMES], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_run_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed, migrations.RunPython.noop),
+    ]
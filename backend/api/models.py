@@ -1,3 +1,4 @@
+from django.core.validators import MinValueValidator
 from django.db import models
 
 
@@ -50,6 +51,11 @@ class Room(TimeStampedModel):
     capacity = models.PositiveIntegerField(default=0)
     room_type = models.CharField(max_length=16, choices=RoomType.choices, default=RoomType.CLASSROOM)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["room_type", "capacity"], name="room_type_capacity_idx"),
+        ]
+
     def __str__(self) -> str:
         return f"{self.code} ({self.capacity})"
 
@@ -60,6 +66,11 @@ class Course(TimeStampedModel):
     lecture_hours = models.PositiveSmallIntegerField(default=0)
     tutorial_hours = models.PositiveSmallIntegerField(default=0)
     practical_hours = models.PositiveSmallIntegerField(default=0)
+    practical_block = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text="Consecutive slots one practical spans, taught in the same lab on the same day",
+    )
     self_study_hours = models.PositiveSmallIntegerField(default=0)
     credits = models.PositiveSmallIntegerField(default=0)
     is_half_semester = models.BooleanField(default=False)
@@ -78,6 +89,16 @@ class Enrollment(TimeStampedModel):
         unique_together = ("course", "student")
 
 
+class CoreCourse(TimeStampedModel):
+    """A course every student of ``section`` takes: scheduled for the section with or without enrollments"""
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="core_sections")
+    section = models.CharField(max_length=10)
+
+    class Meta:
+        unique_together = ("course", "section")
+
+
 class DayOfWeek(models.IntegerChoices):
     MONDAY = 0, "Mon"
     TUESDAY = 1, "Tue"
@@ -96,6 +117,9 @@ class ProfessorAvailability(TimeStampedModel):
 
     class Meta:
         ordering = ["professor", "day_of_week", "start_time"]
+        indexes = [
+            models.Index(fields=["professor", "day_of_week", "start_time"], name="prof_avail_day_start_idx"),
+        ]
 
 
 class RoomAvailability(TimeStampedModel):
@@ -106,6 +130,9 @@ class RoomAvailability(TimeStampedModel):
 
     class Meta:
         ordering = ["room", "day_of_week", "start_time"]
+        indexes = [
+            models.Index(fields=["room", "day_of_week", "start_time"], name="room_avail_day_start_idx"),
+        ]
 
 
 class MessHours(TimeStampedModel):
@@ -120,6 +147,11 @@ class Slot(TimeStampedModel):
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["day_of_week", "start_time"], name="slot_day_start_idx"),
+        ]
+
     def __str__(self) -> str:
         return f"{self.code} {self.get_day_of_week_display()} {self.start_time}-{self.end_time}"
 
@@ -128,13 +160,21 @@ class Timetable(TimeStampedModel):
     name = models.CharField(max_length=128, default="Default")
     effective_from = models.DateField(null=True, blank=True)
     effective_to = models.DateField(null=True, blank=True)
+    active_version = models.PositiveIntegerField(default=1, help_text="Session version currently served to readers")
 
     def __str__(self) -> str:
         return self.name
 
 
+class ClassSessionQuerySet(models.QuerySet):
+    def live(self):
+        """Sessions belonging to their timetable's active version"""
+        return self.filter(version=models.F("timetable__active_version"))
+
+
 class ClassSession(TimeStampedModel):
     timetable = models.ForeignKey(Timetable, on_delete=models.CASCADE, related_name="sessions")
+    version = models.PositiveIntegerField(default=1, help_text="Generation run that produced this session")
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="class_sessions")
     slot = models.ForeignKey(Slot, on_delete=models.PROTECT, related_name="class_sessions")
     room = models.ForeignKey(Room, on_delete=models.PROTECT, related_name="class_sessions")
@@ -143,9 +183,46 @@ class ClassSession(TimeStampedModel):
     is_tutorial = models.BooleanField(default=False)
     is_practical = models.BooleanField(default=False)
     color_code = models.CharField(max_length=7, default="#3498db", help_text="Hex color for timetable display")
+    block = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="block_sessions",
+        help_text="First session of the multi-slot practical this session belongs to (itself included)",
+    )
+
+    objects = ClassSessionQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ("timetable", "version", "course", "slot", "section")
+        indexes = [
+            models.Index(fields=["timetable", "version", "section"], name="session_ver_section_idx"),
+            models.Index(fields=["timetable", "version", "instructor"], name="session_ver_instructor_idx"),
+            models.Index(fields=["timetable", "version", "room"], name="session_ver_room_idx"),
+        ]
+
+
+class RunStatus(models.TextChoices):
+    RUNNING = "RUNNING", "Running"
+    SUCCEEDED = "SUCCEEDED", "Succeeded"
+    FAILED = "FAILED", "Failed"
+
+
+class TimetableRun(TimeStampedModel):
+    """One generate/reschedule/optimize run, shared with callers that coalesce onto it"""
+
+    timetable = models.ForeignKey(Timetable, on_delete=models.CASCADE, related_name="runs")
+    operation = models.CharField(max_length=32)
+    options = models.JSONField(default=dict, blank=True, help_text="Parameters of the run; only identical ones coalesce")
+    status = models.CharField(max_length=16, choices=RunStatus.choices, default=RunStatus.RUNNING)
+    result = models.JSONField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
-        unique_together = ("timetable", "course", "slot", "section")
+        indexes = [
+            models.Index(fields=["timetable", "status"], name="run_timetable_status_idx"),
+        ]
 
 
 class Exam(TimeStampedModel):
@@ -188,3 +265,8 @@ class InvigilationDuty(TimeStampedModel):
         unique_together = ("exam", "professor", "room")
 
 
+class DataVersion(models.Model):
+    """Write counter of one solver input, bumped by api.problem_cache in the writing transaction"""
+
+    name = models.CharField(max_length=64, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
@@ -42,7 +42,9 @@ def timetable_pdf(timetable: models.Timetable) -> bytes:
     c.drawString(40, height - 40, f"Timetable: {timetable.name}")
     
     # Get timetable data
-    sessions = models.ClassSession.objects.filter(timetable=timetable).select_related(
+    sessions = models.ClassSession.objects.filter(
+        timetable=timetable, version=timetable.active_version
+    ).select_related(
         'course', 'slot', 'room', 'instructor'
     ).order_by('slot__day_of_week', 'slot__start_time')
     
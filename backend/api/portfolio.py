@@ -0,0 +1,112 @@
+"""Multi-start class timetable generation.
+
+One greedy run is deterministic, so a single bad ordering decides the
+whole outcome. ``run`` solves the same compiled problem several times in a
+process pool (each worker receives the problem once, through the pool
+initializer), with different orderings and seeds, scores every result with
+solver.score_class_result and keeps the best. It stops as soon as a start
+places everything without conflicts, or once the time budget is spent, and
+then terminates the workers so no abandoned start keeps a core busy.
+"""
+import multiprocessing
+import os
+import queue
+import time
+from typing import Dict, List, Optional, Tuple
+
+from . import profiling, solver
+
+_problem: Optional[Dict] = None
+
+
+def _init_worker(problem: Dict) -> None:
+    global _problem
+    _problem = problem
+
+
+def _solve(index: int, options: Dict) -> Tuple:
+    with profiling.detached("generate") as prof:
+        result = solver.solve_class_problem(_problem, **options)
+    score = solver.score_class_result(_problem, result)
+    return index, options, result, score, prof.seconds, dict(prof.counters), dict(prof.rejections)
+
+
+def start_options(starts: int, ordering: str) -> List[Dict]:
+    """Solver options per start.
+
+    ``ordering`` goes first and unseeded, so the portfolio never does worse
+    than a single run; then the other orderings, then seeded variants.
+    """
+    orderings = [ordering] + [o for o in solver.ORDERINGS if o != ordering]
+    options = [{"ordering": o, "seed": None} for o in orderings]
+    seed = 0
+    while len(options) < starts:
+        seed += 1
+        options.append({"ordering": orderings[seed % len(orderings)], "seed": seed})
+    return options[:starts]
+
+
+def _complete(score: Dict) -> bool:
+    return score["unplaced"] == 0 and score["conflicts"] == 0
+
+
+def run(problem: Dict, starts: int, budget_seconds: float, ordering: str,
+        workers: Optional[int] = None) -> Tuple[Optional[Dict], Optional[Dict], Dict]:
+    """Solve ``problem`` from ``starts`` starting points; returns (best result, its options, report).
+
+    The budget is counted from submission and bounds every start,
+    including the first; when no start finished within it the result and
+    options are None. Starts still queued or running when the run stops
+    are discarded and their workers terminated.
+    """
+    prof = profiling.current()
+    plans = start_options(starts, ordering)
+    workers = max(1, min(starts, workers or os.cpu_count() or 1))
+    deadline = time.monotonic() + budget_seconds
+    finished = []
+    stopped = "exhausted"
+    outcomes: queue.SimpleQueue = queue.SimpleQueue()
+
+    with prof.phase("portfolio"):
+        # Spawned, not forked, like the import validation pool: workers never inherit the
+        # request's database connection or its open transaction
+        pool = multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(problem,))
+        try:
+            for index, options in enumerate(plans):
+                pool.apply_async(_solve, (index, options), callback=outcomes.put, error_callback=outcomes.put)
+            while len(finished) < len(plans):
+                try:
+                    outcome = outcomes.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    stopped = "budget"
+                    break
+                if isinstance(outcome, BaseException):
+                    raise outcome
+                finished.append(outcome)
+                if len(finished) < len(plans) and _complete(outcome[3]):
+                    stopped = "complete"
+                    break
+        finally:
+            pool.terminate()
+
+    for run_ in finished:
+        profiling.merge(prof, run_[5], run_[6])
+    prof.count("portfolio_starts", len(finished))
+
+    finished.sort(key=lambda run_: (solver.score_key(run_[3]), run_[0]))
+    best = best_options = None
+    if finished:
+        _, best_options, best, best_score, _, _, _ = finished[0]
+    report = {
+        "starts": starts,
+        "finished": len(finished),
+        "workers": workers,
+        "budget_seconds": budget_seconds,
+        "stopped": stopped,
+        "best": dict(best_options, score=best_score) if finished else None,
+        "runs": [
+            dict(options, start=index, score=score, seconds=round(seconds, 6))
+            for index, options, _, score, seconds, _, _ in sorted(finished, key=lambda run_: run_[0])
+        ],
+    }
+    return best, best_options, report
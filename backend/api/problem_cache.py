@@ -0,0 +1,142 @@
+"""Cross-request cache of the compiled class problem.
+
+Every solver input has a DataVersion counter. Signals record each save
+or delete of the input's rows, and the counters written in a transaction
+are bumped together, with one UPDATE, once it commits: a rolled-back
+write leaves them untouched, deleting thousands of rows costs one query
+rather than one per row, and every worker process sees the bump on its
+next lookup. A run reads all counters with one query and reuses its
+process's snapshot while they are unchanged, skipping the load and
+compile phases.
+
+Bulk writes (``bulk_create``, ``bulk_update``, ``QuerySet.update``) send
+no signals; code using them must call :func:`bump` itself, as
+api.imports does.
+"""
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from . import models, profiling, solver
+
+# Counter name per tracked model; instructor links count as course writes
+TRACKED = {
+    models.Course: "course",
+    models.Course.instructors.through: "course",
+    models.Slot: "slot",
+    models.Room: "room",
+    models.ProfessorAvailability: "professor_availability",
+    models.RoomAvailability: "room_availability",
+    models.MessHours: "mess_hours",
+    models.Student: "student",
+    models.Enrollment: "enrollment",
+    models.CoreCourse: "core_course",
+}
+NAMES = tuple(sorted(set(TRACKED.values())))
+
+_lock = threading.Lock()
+_snapshot: Dict = {"versions": None, "problem": None, "model": None}
+
+
+class _PendingBumps:
+    """Counters written in the current transaction; called by on_commit to bump them"""
+
+    def __init__(self, names=()):
+        self.names = set(names)
+
+    def __call__(self) -> None:
+        # The rows exist from migration 0009 on
+        models.DataVersion.objects.filter(name__in=self.names).update(version=F("version") + 1)
+
+
+def bump(model) -> None:
+    """Record a write to ``model``'s rows; no-op for models the problem does not depend on"""
+    name = TRACKED.get(model)
+    if name is None:
+        return
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _PendingBumps((name,))()
+        return
+    # One callback per transaction; a rollback discards it together with the writes it records
+    pending = next((func for _, func, _ in connection.run_on_commit if isinstance(func, _PendingBumps)), None)
+    if pending is None:
+        pending = _PendingBumps()
+        transaction.on_commit(pending)
+    pending.names.add(name)
+
+
+def _on_write(sender, **kwargs) -> None:
+    bump(sender)
+
+
+def _on_links_changed(sender, action, **kwargs) -> None:
+    if action.startswith("post_"):
+        bump(sender)
+
+
+def connect() -> None:
+    for model in TRACKED:
+        uid = f"api.problem_cache.{model._meta.label_lower}"
+        post_save.connect(_on_write, sender=model, dispatch_uid=uid)
+        post_delete.connect(_on_write, sender=model, dispatch_uid=uid)
+    m2m_changed.connect(_on_links_changed, sender=models.Course.instructors.through,
+                        dispatch_uid="api.problem_cache.instructors")
+
+
+def versions() -> Tuple[int, ...]:
+    current = dict(models.DataVersion.objects.filter(name__in=NAMES).values_list("name", "version"))
+    return tuple(current.get(name, 0) for name in NAMES)
+
+
+def _freeze(problem: Dict) -> Dict:
+    # Shared between requests: tuples so a solver cannot modify the cached copy in place
+    return {key: tuple(value) if isinstance(value, list) else value for key, value in problem.items()}
+
+
+def get(load: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+    """The compiled problem for the current data versions, calling ``load`` only when they moved.
+
+    Callers must treat the result as read-only. A ``load`` returning None
+    (missing data) is not cached.
+    """
+    prof = profiling.current()
+    if not settings.SCHEDULER_PROBLEM_CACHE:
+        return load()
+    with prof.phase("load"):
+        key = versions()
+    with _lock:
+        if _snapshot["versions"] == key:
+            prof.count("problem_cache_hits")
+            return _snapshot["problem"]
+    prof.count("problem_cache_misses")
+    problem = load()
+    if problem is not None:
+        problem = _freeze(problem)
+        with _lock:
+            _snapshot.update(versions=key, problem=problem, model=None)
+    return problem
+
+
+def class_model(load: Callable[[], Optional[Dict]]) -> Optional[solver.ClassModel]:
+    """solver.ClassModel of the problem :func:`get` returns, built once per snapshot"""
+    problem = get(load)
+    if problem is None:
+        return None
+    with _lock:
+        if _snapshot["problem"] is problem and _snapshot["model"] is not None:
+            return _snapshot["model"]
+    built = solver.ClassModel(problem)
+    with _lock:
+        if _snapshot["problem"] is problem:
+            _snapshot["model"] = built
+    return built
+
+
+def clear() -> None:
+    with _lock:
+        _snapshot.update(versions=None, problem=None, model=None)
@@ -0,0 +1,209 @@
+import functools
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+
+from django.db import connection
+
+_local = threading.local()
+
+# Totals across all profiled runs in this process, exported by render_prometheus()
+_totals_lock = threading.Lock()
+_runs: Counter = Counter()
+_run_seconds: Counter = Counter()
+_phase_seconds: Dict[str, Counter] = defaultdict(Counter)
+_queries: Counter = Counter()
+_db_seconds: Counter = Counter()
+_counters: Dict[str, Counter] = defaultdict(Counter)
+_rejections: Dict[str, Counter] = defaultdict(Counter)
+_last_run_seconds: Dict[str, float] = {}
+
+
+class Profile:
+    """Timings and counters for one scheduler run.
+
+    Phases nest: time spent in an inner phase is not counted again in the
+    outer one, so the phase times add up to the run's wall time (minus any
+    untimed gaps).
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.phases: Counter = Counter()
+        self.counters: Counter = Counter()
+        self.rejections: Counter = Counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.seconds = 0.0
+        self._stack: List[List] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        frame = [name, 0.0]  # name, time spent in nested phases
+        self._stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stack.pop()
+            self.phases[name] += elapsed - frame[1]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def _execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+    def as_dict(self) -> Dict:
+        return {
+            "seconds": round(self.seconds, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "queries": self.queries,
+            "db_seconds": round(self.db_seconds, 6),
+            "counters": dict(self.counters),
+            "rejections": dict(self.rejections),
+        }
+
+
+def current() -> Profile:
+    """The Profile of the innermost active run on this thread (a throwaway one if none)"""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else Profile("unprofiled")
+
+
+def phase(name: str):
+    return current().phase(name)
+
+
+@contextmanager
+def profile(operation: str) -> Iterator[Profile]:
+    """Profile the enclosed block as one ``operation`` run and add it to the process totals.
+
+    Nested calls (e.g. reschedule -> generate) share the outer profile so
+    work is only counted once.
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    if stack:
+        yield stack[-1]
+        return
+
+    prof = Profile(operation)
+    stack.append(prof)
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(prof._execute):
+            yield prof
+    finally:
+        prof.seconds = time.perf_counter() - started
+        stack.pop()
+        _record(prof)
+
+
+@contextmanager
+def detached(operation: str) -> Iterator[Profile]:
+    """Collect a Profile for the enclosed block without query hooks or process totals.
+
+    For solver runs in worker processes: the caller ships the counters
+    back and merges them into its own profile.
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    prof = Profile(operation)
+    stack.append(prof)
+    started = time.perf_counter()
+    try:
+        yield prof
+    finally:
+        prof.seconds = time.perf_counter() - started
+        stack.pop()
+
+
+def merge(prof: Profile, counters: Dict[str, int], rejections: Dict[str, int]) -> None:
+    prof.counters.update(counters)
+    prof.rejections.update(rejections)
+
+
+def profiled(operation: str) -> Callable:
+    """Decorator: profile each call as ``operation`` and attach the profile to its result dict"""
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profile(operation) as prof:
+                result = fn(*args, **kwargs)
+            if isinstance(result, dict):
+                result["profile"] = prof.as_dict()
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _record(prof: Profile) -> None:
+    op = prof.operation
+    with _totals_lock:
+        _runs[op] += 1
+        _run_seconds[op] += prof.seconds
+        _last_run_seconds[op] = prof.seconds
+        _queries[op] += prof.queries
+        _db_seconds[op] += prof.db_seconds
+        _phase_seconds[op].update(prof.phases)
+        _counters[op].update(prof.counters)
+        _rejections[op].update(prof.rejections)
+
+
+def _labels(**labels: str) -> str:
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+    return "{" + body + "}"
+
+
+def render_prometheus(prefix: str = "scheduler") -> str:
+    """Process totals in the Prometheus text exposition format (0.0.4)"""
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str, samples) -> None:
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for labels, value in samples:
+            value = value if isinstance(value, int) else repr(float(value))
+            lines.append(f"{prefix}_{name}{_labels(**labels) if labels else ''} {value}")
+
+    with _totals_lock:
+        family("runs_total", "counter", "Profiled scheduler runs.",
+               [({"operation": op}, n) for op, n in sorted(_runs.items())])
+        family("run_seconds_total", "counter", "Wall time spent in scheduler runs.",
+               [({"operation": op}, s) for op, s in sorted(_run_seconds.items())])
+        family("last_run_seconds", "gauge", "Wall time of the most recent run.",
+               [({"operation": op}, s) for op, s in sorted(_last_run_seconds.items())])
+        family("phase_seconds_total", "counter", "Wall time per scheduler phase.",
+               [({"operation": op, "phase": ph}, s)
+                for op, phases in sorted(_phase_seconds.items()) for ph, s in sorted(phases.items())])
+        family("queries_total", "counter", "SQL queries executed by scheduler runs.",
+               [({"operation": op}, n) for op, n in sorted(_queries.items())])
+        family("db_seconds_total", "counter", "Time spent executing SQL in scheduler runs.",
+               [({"operation": op}, s) for op, s in sorted(_db_seconds.items())])
+        family("events_total", "counter", "Scheduler events such as placement checks.",
+               [({"operation": op, "event": ev}, n)
+                for op, events in sorted(_counters.items()) for ev, n in sorted(events.items())])
+        family("rejections_total", "counter", "Rejected placements by constraint.",
+               [({"operation": op, "reason": reason}, n)
+                for op, reasons in sorted(_rejections.items()) for reason, n in sorted(reasons.items())])
+    return "\n".join(lines) + "\n"
+
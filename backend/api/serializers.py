@@ -38,6 +38,7 @@ class CourseSerializer(serializers.ModelSerializer):
             "lecture_hours",
             "tutorial_hours",
             "practical_hours",
+            "practical_block",
             "self_study_hours",
             "credits",
             "is_half_semester",
@@ -52,6 +53,12 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         fields = ["id", "course", "student"]
 
 
+class CoreCourseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.CoreCourse
+        fields = ["id", "course", "section"]
+
+
 class ProfessorAvailabilitySerializer(serializers.ModelSerializer):
     class Meta:
         model = models.ProfessorAvailability
@@ -79,7 +86,8 @@ class SlotSerializer(serializers.ModelSerializer):
 class TimetableSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Timetable
-        fields = ["id", "name", "effective_from", "effective_to"]
+        fields = ["id", "name", "effective_from", "effective_to", "active_version"]
+        read_only_fields = ["active_version"]
 
 
 class ClassSessionSerializer(serializers.ModelSerializer):
@@ -110,10 +118,18 @@ class ClassSessionSerializer(serializers.ModelSerializer):
             "is_tutorial",
             "is_practical",
             "color_code",
+            "block",
+            "version",
             "day_name",
             "start_time",
             "end_time",
         ]
+        read_only_fields = ["version"]
+
+    def create(self, validated_data):
+        # Manually added sessions join the version readers currently see
+        validated_data["version"] = validated_data["timetable"].active_version
+        return super().create(validated_data)
 
 
 class ExamSerializer(serializers.ModelSerializer):
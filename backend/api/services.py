@@ -1,27 +1,18 @@
 import colorsys
 import csv
 import random
+import time
 from collections import defaultdict, deque
 from datetime import timedelta
 from io import TextIOWrapper
 from typing import Dict, List, Optional, Set, Tuple
 
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Count, Max
 from django.utils import timezone
 
-from . import models, serializers
-
-
-def _time_overlap(a_start, a_end, b_start, b_end) -> bool:
-    return max(a_start, b_start) < min(a_end, b_end)
-
-
-def _ensure_break(prev_end, next_start, min_minutes: int) -> bool:
-    delta = (
-        timezone.datetime.combine(timezone.now().date(), next_start)
-        - timezone.datetime.combine(timezone.now().date(), prev_end)
-    )
-    return delta.total_seconds() / 60.0 >= min_minutes
+from . import feasibility, models, portfolio, problem_cache, profiling, serializers, solver, trace as trace_utils
 
 
 def _generate_color_codes(count: int) -> List[str]:
@@ -37,248 +28,282 @@ def _generate_color_codes(count: int) -> List[str]:
     return colors
 
 
+def _next_version(timetable: models.Timetable) -> int:
+    latest = models.ClassSession.objects.filter(timetable=timetable).aggregate(v=Max("version"))["v"] or 0
+    return max(latest, timetable.active_version) + 1
+
+
+def timetable_versions(timetable: models.Timetable) -> List[Dict]:
+    """Kept session versions of a timetable, newest first"""
+    counts = (
+        models.ClassSession.objects.filter(timetable=timetable)
+        .values("version")
+        .annotate(sessions=Count("id"))
+        .order_by("-version")
+    )
+    return [
+        {"version": row["version"], "sessions": row["sessions"], "active": row["version"] == timetable.active_version}
+        for row in counts
+    ]
+
+
 @transaction.atomic
-def generate_class_timetable(timetable: models.Timetable) -> Dict:
-    """Generate comprehensive timetable with all constraints"""
+def promote_timetable_version(timetable: models.Timetable, version: int) -> None:
+    """Point readers at ``version`` in a single short UPDATE"""
+    models.Timetable.objects.filter(pk=timetable.pk).update(active_version=version, updated_at=timezone.now())
+    timetable.active_version = version
+
+
+def prune_timetable_versions(timetable: models.Timetable, keep: Optional[int] = None) -> int:
+    """Delete all but the newest ``keep`` versions, never the active one"""
+    keep = keep or settings.TIMETABLE_KEEP_VERSIONS
+    kept = [v["version"] for v in timetable_versions(timetable)][:keep]
+    return (
+        models.ClassSession.objects.filter(timetable=timetable)
+        .exclude(version__in=kept + [timetable.active_version])
+        .delete()[0]
+    )
 
-    # Clear existing sessions for this timetable
-    models.ClassSession.objects.filter(timetable=timetable).delete()
 
-    courses = list(models.Course.objects.all().prefetch_related("instructors"))
-    slots = list(models.Slot.objects.all().order_by("day_of_week", "start_time"))
-    rooms = list(models.Room.objects.filter(room_type=models.RoomType.CLASSROOM).order_by("capacity"))
-    labs = list(models.Room.objects.filter(room_type=models.RoomType.LAB).order_by("capacity"))
-    mess_hours = list(models.MessHours.objects.all())
-    
-    if not courses or not slots or not rooms:
-        return {"created_sessions": 0, "status": "error", "message": "Missing essential data (courses, slots, or rooms). Please upload all required CSVs."}
+def rollback_timetable(timetable: models.Timetable, version: Optional[int] = None) -> Dict:
+    """Re-promote a kept version, by default the newest one older than the active version"""
+    available = [v["version"] for v in timetable_versions(timetable)]
+    if version is None:
+        older = [v for v in available if v < timetable.active_version]
+        version = older[0] if older else None
+    if version is None or version not in available:
+        return {"status": "error", "message": "No such version to roll back to", "versions": available}
+    previous = timetable.active_version
+    promote_timetable_version(timetable, version)
+    return {"status": "rolled_back", "version": version, "previous_version": previous}
+
+
+@profiling.profiled("generate")
+def generate_class_timetable(timetable: models.Timetable, trace: bool = False, ordering: Optional[str] = None,
+                             starts: Optional[int] = None, budget: Optional[float] = None) -> Dict:
+    """Generate comprehensive timetable with all constraints.
+
+    Sessions are staged under a new version while readers keep seeing the
+    active one; the new version is promoted only once it is fully written,
+    and older versions beyond TIMETABLE_KEEP_VERSIONS are pruned. With
+    ``trace`` (or settings.SCHEDULER_TRACE) every solver decision is
+    recorded to a file under SCHEDULER_TRACE_DIR for offline replay.
+    ``ordering`` overrides settings.SCHEDULER_ORDERING (see solver.ORDERINGS).
+    With more than one of ``starts`` the solver runs as a portfolio (see
+    api.portfolio) for at most ``budget`` seconds and only the best
+    start is persisted; both default to the SCHEDULER_PORTFOLIO_* settings.
+    """
+    version = _next_version(timetable)
+    result = _stage_class_timetable(
+        timetable, version, trace, ordering or settings.SCHEDULER_ORDERING,
+        starts or settings.SCHEDULER_PORTFOLIO_STARTS, budget or settings.SCHEDULER_PORTFOLIO_BUDGET_SECONDS,
+    )
+    if result["status"] == "error":
+        return result
+
+    with profiling.phase("persist"):
+        previous = timetable.active_version
+        promote_timetable_version(timetable, version)
+        result["version"] = version
+        result["previous_version"] = previous
+        result["pruned_sessions"] = prune_timetable_versions(timetable)
+    return result
 
 
-    # Get all sections from students
-    sections = list(models.Student.objects.values_list("section", flat=True).distinct())
-    if not sections:
-        sections = ["A"]  # Default section
+def _run_solver(operation: str, problem: Dict, trace: bool, **options) -> Tuple[Dict, Optional[str]]:
+    """Run ``operation``'s solver on ``problem``, recording a trace file when asked to"""
+    solve = trace_utils.SOLVERS[operation]
+    if not (trace or settings.SCHEDULER_TRACE):
+        return solve(problem, **options), None
 
-    # Generate color codes for courses
-    course_colors = _generate_color_codes(len(courses))
-    course_color_map = {course.id: course_colors[i] for i, course in enumerate(courses)}
-
-    # Build availability maps
-    prof_to_avails: Dict[int, List[Tuple[int, object, object]]] = defaultdict(list)
-    for avail in models.ProfessorAvailability.objects.all():
-        prof_to_avails[avail.professor_id].append((avail.day_of_week, avail.start_time, avail.end_time))
-
-    room_to_avails: Dict[int, List[Tuple[int, object, object]]] = defaultdict(list)
-    for avail in models.RoomAvailability.objects.all():
-        room_to_avails[avail.room_id].append((avail.day_of_week, avail.start_time, avail.end_time))
-
-    # Track booked state per section
-    prof_booked: Dict[int, List[Tuple[int, object, object]]] = defaultdict(list)
-    room_booked: Dict[int, List[Tuple[int, object, object]]] = defaultdict(list)
-    course_day_booked: Dict[Tuple[int, str], Set[int]] = defaultdict(set)  # (course, section) -> days
-
-    def can_place(
-        course: models.Course,
-        instructor_id: int,
-        room_obj: models.Room,
-        slot: models.Slot,
-        section: str,
-        is_practical: bool = False,
-    ) -> bool:
-        """Check if a session can be placed with all constraints"""
-
-        # One lecture/tutorial per day per course per section
-        if slot.day_of_week in course_day_booked[(course.id, section)] and not is_practical:
-            return False
-
-        # Professor availability
-        prof_avails = prof_to_avails.get(instructor_id, [])
-        if not any(
-            day == slot.day_of_week and a_start <= slot.start_time and a_end >= slot.end_time
-            for day, a_start, a_end in prof_avails
-        ):
-            return False
-
-        # Room availability
-        room_avails = room_to_avails.get(room_obj.id, [])
-        if not any(
-            day == slot.day_of_week and r_start <= slot.start_time and r_end >= slot.end_time
-            for day, r_start, r_end in room_avails
-        ):
-            return False
-
-        # Professor not already booked (with 15-min break)
-        for d, s, e in prof_booked.get(instructor_id, []):
-            if d != slot.day_of_week:
-                continue
-            if _time_overlap(s, e, slot.start_time, slot.end_time):
-                return False
-            # Ensure 15-min break between classes
-            if not _ensure_break(e, slot.start_time, 15) and e <= slot.start_time:
-                return False
-            if not _ensure_break(slot.end_time, s, 15) and slot.end_time <= s:
-                return False
-
-        # Room not already booked
-        for d, s, e in room_booked.get(room_obj.id, []):
-            if d == slot.day_of_week and _time_overlap(s, e, slot.start_time, slot.end_time):
-                return False
-
-        # No classes during lunch (mess hours)
-        for m in mess_hours:
-            if m.day_of_week == slot.day_of_week and _time_overlap(
-                m.start_time, m.end_time, slot.start_time, slot.end_time
-            ):
-                return False
-
-        return True
-
-    created = 0
-    conflicts = []
+    path = trace_utils.trace_path(operation, settings.SCHEDULER_TRACE_DIR)
+    with open(path, "wb") as fh:
+        writer = trace_utils.TraceWriter(fh, operation, problem, {"options": options})
+        started = time.perf_counter()
+        result = solve(problem, tracer=writer, **options)
+        summary = trace_utils.summarize_result(operation, result)
+        writer.close(dict(summary, seconds=round(time.perf_counter() - started, 6)))
+    return result, path
 
-    # Process each section separately
-    for section in sections:
-        for course in courses:
-            instructors = [p.id for p in course.instructors.all()]
-            if not instructors:
-                conflicts.append(f"No instructors for course {course.code}")
-                continue
 
-            primary_instructor = instructors[0]
+def _load_class_problem() -> Optional[Dict]:
+    """The compiled class problem, from api.problem_cache while no input changed; None when data is missing"""
+    return problem_cache.get(_compile_class_problem)
 
-            # Plan session counts per section
-            lecture_needed = course.lecture_hours
-            tutorial_needed = course.tutorial_hours
-            practical_needed = course.practical_hours
 
-            # Distribute self-study hours evenly across week
-            self_study_per_day = course.self_study_hours // 5  # 5 working days
-            self_study_remaining = course.self_study_hours % 5
+def _load_class_model() -> Optional[solver.ClassModel]:
+    """The compact model of the current class problem, shared by runs while no input changed"""
+    return problem_cache.class_model(_compile_class_problem)
 
-            # Try to place sessions
-            for slot in slots:
-                if lecture_needed <= 0 and tutorial_needed <= 0 and practical_needed <= 0:
-                    break
 
-                # Choose room type based on session type
-                room_candidates = labs if practical_needed > 0 else rooms
-                placed = False
-
-                for room_obj in room_candidates:
-                    if not can_place(
-                        course, primary_instructor, room_obj, slot, section, practical_needed > 0
-                    ):
-                        continue
-
-                    # Place session based on priority
-                    if lecture_needed > 0 and slot.day_of_week not in course_day_booked[(course.id, section)]:
-                        models.ClassSession.objects.create(
-                            timetable=timetable,
-                            course=course,
-                            slot=slot,
-                            room=room_obj,
-                            instructor_id=primary_instructor,
-                            section=section,
-                            is_tutorial=False,
-                            is_practical=False,
-                            color_code=course_color_map[course.id],
-                        )
-                        course_day_booked[(course.id, section)].add(slot.day_of_week)
-                        prof_booked[primary_instructor].append(
-                            (slot.day_of_week, slot.start_time, slot.end_time)
-                        )
-                        room_booked[room_obj.id].append((slot.day_of_week, slot.start_time, slot.end_time))
-                        lecture_needed -= 1
-                        created += 1
-                        placed = True
-
-                    elif tutorial_needed > 0 and slot.day_of_week not in course_day_booked[(course.id, section)]:
-                        models.ClassSession.objects.create(
-                            timetable=timetable,
-                            course=course,
-                            slot=slot,
-                            room=room_obj,
-                            instructor_id=primary_instructor,
-                            section=section,
-                            is_tutorial=True,
-                            is_practical=False,
-                            color_code=course_color_map[course.id],
-                        )
-                        course_day_booked[(course.id, section)].add(slot.day_of_week)
-                        prof_booked[primary_instructor].append(
-                            (slot.day_of_week, slot.start_time, slot.end_time)
-                        )
-                        room_booked[room_obj.id].append((slot.day_of_week, slot.start_time, slot.end_time))
-                        tutorial_needed -= 1
-                        created += 1
-                        placed = True
-
-                    elif practical_needed > 0:
-                        models.ClassSession.objects.create(
-                            timetable=timetable,
-                            course=course,
-                            slot=slot,
-                            room=room_obj,
-                            instructor_id=primary_instructor,
-                            section=section,
-                            is_tutorial=False,
-                            is_practical=True,
-                            color_code=course_color_map[course.id],
-                        )
-                        prof_booked[primary_instructor].append(
-                            (slot.day_of_week, slot.start_time, slot.end_time)
-                        )
-                        room_booked[room_obj.id].append((slot.day_of_week, slot.start_time, slot.end_time))
-                        practical_needed -= 1
-                        created += 1
-                        placed = True
-
-                    if placed:
-                        break
-
-            # Handle unplaced sessions
-            if lecture_needed > 0:
-                conflicts.append(f"Could not place {lecture_needed} lecture(s) for {course.code} section {section}")
-            if tutorial_needed > 0:
-                conflicts.append(f"Could not place {tutorial_needed} tutorial(s) for {course.code} section {section}")
-            if practical_needed > 0:
-                conflicts.append(f"Could not place {practical_needed} practical(s) for {course.code} section {section}")
+def _compile_class_problem() -> Optional[Dict]:
+    """Load and compile what the class solver needs; None when courses, slots or rooms are missing"""
+    prof = profiling.current()
+    with prof.phase("load"):
+        courses = list(models.Course.objects.all().prefetch_related("instructors"))
+        slots = list(models.Slot.objects.all().order_by("day_of_week", "start_time"))
+        rooms = list(models.Room.objects.filter(room_type=models.RoomType.CLASSROOM).order_by("capacity"))
+        labs = list(models.Room.objects.filter(room_type=models.RoomType.LAB).order_by("capacity"))
+        mess_hours = list(models.MessHours.objects.all())
+    
+    if not courses or not slots or not rooms:
+        return None
+
+    with prof.phase("load"):
+        # Get all sections from students
+        sections = list(models.Student.objects.values_list("section", flat=True).distinct())
+        if not sections:
+            sections = ["A"]  # Default section
+        section_sizes = dict(
+            models.Student.objects.values_list("section").annotate(n=Count("id")).values_list("section", "n")
+        )
+        enrollment_counts = {
+            (course_id, section): n
+            for course_id, section, n in models.Enrollment.objects.values_list("course_id", "student__section")
+            .annotate(n=Count("id"))
+            .values_list("course_id", "student__section", "n")
+        }
+        core_courses = list(models.CoreCourse.objects.values_list("course_id", "section"))
+        professor_availability = list(models.ProfessorAvailability.objects.all())
+        room_availability = list(models.RoomAvailability.objects.all())
+
+    with prof.phase("compile"):
+        return solver.compile_class_problem(
+            courses, slots, rooms, labs, mess_hours, sections, section_sizes, enrollment_counts, core_courses,
+            professor_availability, room_availability,
+        )
 
-    return {
-        "created_sessions": created,
+
+_MISSING_DATA = "Missing essential data (courses, slots, or rooms). Please upload all required CSVs."
+
+
+def _stage_class_timetable(timetable: models.Timetable, version: int, trace: bool, ordering: str,
+                           starts: int, budget: float) -> Dict:
+    """Place all sessions for ``timetable`` under ``version`` without touching the active one.
+
+    The solve runs before the write transaction opens, so the database
+    is only locked for as long as the sessions take to insert.
+    """
+    prof = profiling.current()
+    problem = _load_class_problem()
+    if problem is None:
+        return {"created_sessions": 0, "status": "error", "message": _MISSING_DATA}
+    courses = problem["courses"]
+    slots = problem["slots"]
+    sections = problem["sections"]
+    # Generate color codes for courses
+    course_colors = _generate_color_codes(len(courses))
+
+    report = None
+    if starts > 1:
+        solution, options, report = portfolio.run(
+            problem, starts, budget, ordering, settings.SCHEDULER_PORTFOLIO_WORKERS
+        )
+        if solution is None:
+            return {
+                "created_sessions": 0,
+                "status": "error",
+                "message": f"No start finished within the {budget:g}s budget; raise the budget or use fewer starts",
+                "portfolio": report,
+            }
+        trace_file = None
+        if trace or settings.SCHEDULER_TRACE:
+            # Seeded runs are reproducible: re-run the winning start here to record it
+            solution, trace_file = _run_solver("generate", problem, True, **options)
+    else:
+        solution, trace_file = _run_solver("generate", problem, trace, ordering=ordering)
+
+    with prof.phase("persist"), transaction.atomic():
+        room_ids = [r[0] for r in problem["rooms"]] + [r[0] for r in problem["labs"]]
+        created = models.ClassSession.objects.bulk_create(
+            [
+                models.ClassSession(
+                    timetable=timetable,
+                    version=version,
+                    course_id=courses[ci][0],
+                    slot_id=slots[ti][0],
+                    room_id=room_ids[ri],
+                    instructor_id=instructor_id,
+                    section=sections[si],
+                    is_tutorial=kind == solver.TUTORIAL,
+                    is_practical=kind == solver.PRACTICAL,
+                    color_code=course_colors[ci],
+                )
+                for ci, si, ti, ri, instructor_id, kind in solution["placements"]
+            ],
+            batch_size=500,
+        )
+        # Link each multi-slot practical's sessions to its first one
+        linked = []
+        for block in solution["blocks"]:
+            for index in block:
+                created[index].block_id = created[block[0]].pk
+                linked.append(created[index])
+        models.ClassSession.objects.bulk_update(linked, ["block"], batch_size=500)
+
+    conflicts = solution["conflicts"]
+    result = {
+        "created_sessions": len(solution["placements"]),
         "sections_processed": len(sections),
+        "course_sections": len(solver.section_demand(problem)),
+        "practical_blocks": len(solution["blocks"]),
+        "ordering": solution["ordering"],
+        "seats_used": solution["seats_used"],
+        "seats_offered": solution["seats_offered"],
+        "room_utilization": round(solution["seats_used"] / solution["seats_offered"], 4) if solution["seats_offered"] else None,
+        "score": solver.score_class_result(problem, solution),
         "conflicts": conflicts,
         "status": "success" if not conflicts else "partial",
     }
+    if report:
+        result["portfolio"] = report
+    if trace_file:
+        result["trace"] = trace_file
+    return result
 
 
-@transaction.atomic
+@profiling.profiled("feasibility")
+def check_class_feasibility() -> Dict:
+    """Provably infeasible course-sections and bottleneck resources, found without solving or writing"""
+    problem = _load_class_problem()
+    if problem is None:
+        return {"status": "error", "message": _MISSING_DATA}
+    with profiling.phase("check"):
+        result = feasibility.check(problem)
+    professors = {row["id"] for row in result["bottlenecks"] + result["infeasible"] if row["scope"] == "professor"}
+    names = dict(models.Professor.objects.filter(id__in=professors).values_list("id", "name"))
+    for row in result["bottlenecks"] + result["infeasible"]:
+        if row["scope"] == "professor":
+            row["name"] = names.get(row["id"])
+    result["status"] = "feasible" if result["feasible"] else "infeasible"
+    return result
+
+
+@profiling.profiled("reschedule")
 def reschedule_canceled_classes(timetable: models.Timetable) -> Dict:
     """Reschedule classes based on updated availability"""
 
     affected_courses: Set[Tuple[int, str]] = set()  # (course_id, section)
 
-    # Find sessions that conflict with current availability
-    for session in list(models.ClassSession.objects.filter(timetable=timetable)):
-        # Check instructor availability
-        i_av = models.ProfessorAvailability.objects.filter(
-            professor=session.instructor,
-            day_of_week=session.slot.day_of_week,
-            start_time__lte=session.slot.start_time,
-            end_time__gte=session.slot.end_time,
-        ).exists()
-
-        # Check room availability
-        r_av = models.RoomAvailability.objects.filter(
-            room=session.room,
-            day_of_week=session.slot.day_of_week,
-            start_time__lte=session.slot.start_time,
-            end_time__gte=session.slot.end_time,
-        ).exists()
-
-        if not (i_av and r_av):
-            affected_courses.add((session.course_id, session.section))
-            session.delete()
+    # Find sessions that conflict with current availability; the active
+    # version stays untouched until the regenerated one is promoted
+    with profiling.phase("load"):
+        model = _load_class_model()
+        if model is None:
+            # No courses, slots or rooms, hence no sessions
+            return {"rescheduled": 0, "status": "no_changes"}
+        live_sessions = models.ClassSession.objects.filter(
+            timetable=timetable, version=timetable.active_version
+        ).values_list("course_id", "section", "instructor_id", "room_id", "slot_id")
+        for course_id, section, instructor_id, room_id, slot_id in live_sessions:
+            bit = 1 << model.slot_index[slot_id]
+            # Instructor and room availability
+            pi = model.professor_index.get(instructor_id)
+            ri = model.room_index.get(room_id)
+            i_av = pi is not None and model.professor_mask[pi] & bit
+            r_av = ri is not None and model.room_mask[ri] & bit
+            if not (i_av and r_av):
+                affected_courses.add((course_id, section))
 
     if not affected_courses:
         return {"rescheduled": 0, "status": "no_changes"}
@@ -289,165 +314,112 @@ def reschedule_canceled_classes(timetable: models.Timetable) -> Dict:
     return result
 
 
+@profiling.profiled("exam_schedule")
 @transaction.atomic
-def generate_exam_schedule() -> Dict:
+def generate_exam_schedule(trace: bool = False) -> Dict:
     """Generate exam schedule with no clashes for same batch"""
 
-    courses = list(models.Course.objects.all())
-    students_by_course: Dict[int, int] = {}
-
-    for c in courses:
-        students_by_course[c.id] = models.Enrollment.objects.filter(course=c).count()
-
-    # Build batch information per course
-    course_batches: Dict[int, Set[str]] = defaultdict(set)
-    for e in models.Enrollment.objects.select_related("student", "course"):
-        course_batches[e.course_id].add(e.student.batch)
-
-    # Get available exam rooms and time slots
-    rooms = list(models.Room.objects.filter(
-        room_type__in=[models.RoomType.HALL, models.RoomType.CLASSROOM]
-    ).order_by("-capacity"))
-    room_avails = list(models.RoomAvailability.objects.all())
-
-    # Group availability by day
-    avails_by_day: Dict[int, List[Tuple[models.Room, object, object]]] = defaultdict(list)
-    for ra in room_avails:
-        avails_by_day[ra.day_of_week].append((ra.room, ra.start_time, ra.end_time))
-
-    # Clear existing exams
-    models.Exam.objects.all().delete()
-
-    created_exams = 0
-    assigned_batches_per_day: Dict[int, Set[str]] = defaultdict(set)
-
-    # Sort courses by student count (larger courses first)
-    courses_sorted = sorted(courses, key=lambda c: (-students_by_course.get(c.id, 0), c.code))
+    with profiling.phase("load"):
+        courses = list(models.Course.objects.all())
+        students_by_course: Dict[int, int] = dict(
+            models.Enrollment.objects.values_list("course_id").annotate(n=Count("id")).values_list("course_id", "n")
+        )
 
-    for course in courses_sorted:
-        batches = course_batches.get(course.id, set())
-        placed = False
+        # Build batch information per course
+        course_batches: Dict[int, Set[str]] = defaultdict(set)
+        for course_id, batch in models.Enrollment.objects.values_list("course_id", "student__batch"):
+            course_batches[course_id].add(batch)
 
-        # Find a day with minimal batch conflicts
-        for day in range(7):  # Monday to Sunday
-            if day not in avails_by_day:
-                continue
+        # Get available exam rooms and time slots
+        rooms = list(models.Room.objects.filter(
+            room_type__in=[models.RoomType.HALL, models.RoomType.CLASSROOM]
+        ).order_by("-capacity"))
+        room_avails = list(models.RoomAvailability.objects.all())
 
-            # Check if any batch from this course is already scheduled on this day
-            if assigned_batches_per_day[day] & batches:
-                continue
+    with profiling.phase("compile"):
+        problem = solver.compile_exam_problem(courses, students_by_course, course_batches, rooms, room_avails)
 
-            # Use first available time slot
-            windows = avails_by_day[day]
-            if not windows:
-                continue
+    solution, trace_file = _run_solver("exam_schedule", problem, trace)
 
-            start_time = min(w[1] for w in windows)
-            end_time = max(w[2] for w in windows)
+    with profiling.phase("persist"):
+        # Clear existing exams
+        models.Exam.objects.all().delete()
 
-            # Create exam
+        today = timezone.now().date()
+        for ci, day, start, end, allocations in solution["exams"]:
             exam = models.Exam.objects.create(
-                course=course,
-                date=timezone.now().date() + timedelta(days=day),
-                start_time=start_time,
-                end_time=end_time,
+                course=courses[ci],
+                date=today + timedelta(days=day),
+                start_time=solver.clock(start),
+                end_time=solver.clock(end),
             )
-            created_exams += 1
-
-            # Mark batches as assigned to this day
-            assigned_batches_per_day[day].update(batches)
-
-            # Allocate rooms by capacity
-            remaining_students = students_by_course.get(course.id, 0)
-            for room in rooms:
-                if remaining_students <= 0:
-                    break
-
-                capacity = room.capacity
-                used = min(capacity, remaining_students)
-
-                models.ExamRoomAllocation.objects.create(
-                    exam=exam,
-                    room=room,
-                    capacity_used=used,
-                )
-
-                remaining_students -= used
-
-            placed = True
-            break
-
-        if not placed:
-            # Fallback: create on any available day
-            for day in range(7):
-                if day in avails_by_day and avails_by_day[day]:
-                    windows = avails_by_day[day]
-                    start_time = min(w[1] for w in windows)
-                    end_time = max(w[2] for w in windows)
-
-                    models.Exam.objects.create(
-                        course=course,
-                        date=timezone.now().date() + timedelta(days=day),
-                        start_time=start_time,
-                        end_time=end_time,
-                    )
-                    created_exams += 1
-                    break
-
-    return {"created_exams": created_exams}
+            models.ExamRoomAllocation.objects.bulk_create([
+                models.ExamRoomAllocation(exam=exam, room_id=room_id, capacity_used=used)
+                for room_id, used in allocations
+            ])
+
+    result = {"created_exams": len(solution["exams"])}
+    if trace_file:
+        result["trace"] = trace_file
+    return result
 
 
+@profiling.profiled("seating")
 @transaction.atomic
 def generate_seating_for_exam(exam: models.Exam) -> Dict:
     """Generate intelligent seating arrangement with mixed seating"""
 
-    allocations = list(models.ExamRoomAllocation.objects.filter(exam=exam).select_related("room"))
-    enrollments = list(models.Enrollment.objects.filter(course=exam.course).select_related("student"))
+    with profiling.phase("load"):
+        allocations = list(models.ExamRoomAllocation.objects.filter(exam=exam).select_related("room"))
+        enrollments = list(models.Enrollment.objects.filter(course=exam.course).select_related("student"))
     students = [e.student for e in enrollments]
 
     # Clear existing seating
-    models.SeatingAssignment.objects.filter(exam=exam).delete()
+    with profiling.phase("persist"):
+        models.SeatingAssignment.objects.filter(exam=exam).delete()
 
-    placed = 0
+    with profiling.phase("place"):
+        placed = 0
 
-    for alloc in allocations:
-        room = alloc.room
+        for alloc in allocations:
+            room = alloc.room
 
-        # Calculate grid dimensions
-        import math
+            # Calculate grid dimensions
+            import math
 
-        capacity = room.capacity
-        rows = max(1, int(math.sqrt(capacity)))
-        cols = max(1, (capacity + rows - 1) // rows)
+            capacity = room.capacity
+            rows = max(1, int(math.sqrt(capacity)))
+            cols = max(1, (capacity + rows - 1) // rows)
 
-        # Shuffle students for mixed seating
-        room_students = students[: alloc.capacity_used]
-        random.shuffle(room_students)
+            # Shuffle students for mixed seating
+            room_students = students[: alloc.capacity_used]
+            random.shuffle(room_students)
 
-        # Place students in grid with spacing
-        r = 0
-        c = 0
+            # Place students in grid with spacing
+            r = 0
+            c = 0
 
-        for student in room_students:
-            if placed >= alloc.capacity_used:
-                break
+            for student in room_students:
+                if placed >= alloc.capacity_used:
+                    break
 
-            models.SeatingAssignment.objects.create(
-                exam=exam,
-                room=room,
-                student=student,
-                row_index=r,
-                col_index=c,
-            )
-            placed += 1
+                with profiling.phase("persist"):
+                    models.SeatingAssignment.objects.create(
+                        exam=exam,
+                        room=room,
+                        student=student,
+                        row_index=r,
+                        col_index=c,
+                    )
+                placed += 1
 
-            # Move to next position with spacing
-            c += 2  # Skip one seat for spacing
-            if c >= cols:
-                c = 0
-                r += 2  # Skip one row for spacing
-                if r >= rows:
-                    r = 0  # Wrap around if needed
+                # Move to next position with spacing
+                c += 2  # Skip one seat for spacing
+                if c >= cols:
+                    c = 0
+                    r += 2  # Skip one row for spacing
+                    if r >= rows:
+                        r = 0  # Wrap around if needed
 
     return {"seated": placed}
 
@@ -481,7 +453,7 @@ def balance_invigilation(exam: models.Exam) -> Dict:
 def get_timetable_data(timetable_id: int) -> Dict:
     """Get formatted timetable data for frontend"""
 
-    sessions = models.ClassSession.objects.filter(timetable_id=timetable_id).select_related(
+    sessions = models.ClassSession.objects.filter(timetable_id=timetable_id).live().select_related(
         "course", "slot", "room", "instructor"
     ).order_by("slot__day_of_week", "slot__start_time")
 
@@ -503,6 +475,7 @@ def get_timetable_data(timetable_id: int) -> Dict:
                 "end_time": session.slot.end_time.strftime("%H:%M"),
                 "type": "Tutorial" if session.is_tutorial else ("Practical" if session.is_practical else "Lecture"),
                 "color": session.color_code,
+                "block": session.block_id,
             }
         )
 
@@ -512,71 +485,76 @@ def get_timetable_data(timetable_id: int) -> Dict:
 def check_timetable_conflicts(timetable_id: int) -> Dict:
     """Check for scheduling conflicts in timetable"""
     conflicts = []
-
-    sessions = models.ClassSession.objects.filter(timetable_id=timetable_id).select_related(
-        "course", "slot", "room", "instructor"
+    model = _load_class_model()
+    rows = models.ClassSession.objects.filter(timetable_id=timetable_id).live().values_list(
+        "slot_id", "instructor_id", "instructor__name", "room_id", "room__code", "course__code", "block_id"
     )
+    if model is None:
+        rows = []
+    # (slot index, instructor id, instructor name, room id, room code, course code, block id)
+    sessions = [(model.slot_index[row[0]],) + row[1:] for row in rows]
+
+    def day(ti: int) -> str:
+        return models.DayOfWeek(model.slot_day[ti]).label
+
+    def span(ti: int) -> str:
+        return f"{solver.clock(model.slot_start[ti])}-{solver.clock(model.slot_end[ti])}"
 
     # Check for instructor double-booking
     instructor_sessions = defaultdict(list)
     for session in sessions:
-        instructor_sessions[session.instructor_id].append(session)
+        instructor_sessions[session[1]].append(session)
 
     for instructor_id, instructor_sessions_list in instructor_sessions.items():
         for i, session1 in enumerate(instructor_sessions_list):
             for session2 in instructor_sessions_list[i + 1 :]:
-                if session1.slot.day_of_week == session2.slot.day_of_week and _time_overlap(
-                    session1.slot.start_time, session1.slot.end_time, session2.slot.start_time, session2.slot.end_time
-                ):
+                if model.busy_mask[session1[0]] >> session2[0] & 1:
                     conflicts.append(
                         {
                             "type": "instructor_double_booking",
-                            "instructor": session1.instructor.name,
-                            "day": session1.slot.get_day_of_week_display(),
-                            "time": f"{session1.slot.start_time}-{session1.slot.end_time}",
-                            "courses": [session1.course.code, session2.course.code],
-                            "rooms": [session1.room.code, session2.room.code],
+                            "instructor": session1[2],
+                            "day": day(session1[0]),
+                            "time": span(session1[0]),
+                            "courses": [session1[5], session2[5]],
+                            "rooms": [session1[4], session2[4]],
                         }
                     )
 
     # Check for room double-booking
     room_sessions = defaultdict(list)
     for session in sessions:
-        room_sessions[session.room_id].append(session)
+        room_sessions[session[3]].append(session)
 
     for room_id, room_sessions_list in room_sessions.items():
         for i, session1 in enumerate(room_sessions_list):
             for session2 in room_sessions_list[i + 1 :]:
-                if session1.slot.day_of_week == session2.slot.day_of_week and _time_overlap(
-                    session1.slot.start_time, session1.slot.end_time, session2.slot.start_time, session2.slot.end_time
-                ):
+                if model.busy_mask[session1[0]] >> session2[0] & 1:
                     conflicts.append(
                         {
                             "type": "room_double_booking",
-                            "room": session1.room.code,
-                            "day": session1.slot.get_day_of_week_display(),
-                            "time": f"{session1.slot.start_time}-{session1.slot.end_time}",
-                            "courses": [session1.course.code, session2.course.code],
-                            "instructors": [session1.instructor.name, session2.instructor.name],
+                            "room": session1[4],
+                            "day": day(session1[0]),
+                            "time": span(session1[0]),
+                            "courses": [session1[5], session2[5]],
+                            "instructors": [session1[2], session2[2]],
                         }
                     )
 
     # Check for insufficient breaks
     for instructor_id, instructor_sessions_list in instructor_sessions.items():
-        instructor_sessions_list.sort(key=lambda s: (s.slot.day_of_week, s.slot.start_time))
-        for i in range(len(instructor_sessions_list) - 1):
-            session1 = instructor_sessions_list[i]
-            session2 = instructor_sessions_list[i + 1]
-            if session1.slot.day_of_week == session2.slot.day_of_week and not _ensure_break(
-                session1.slot.end_time, session2.slot.start_time, 15
-            ):
+        instructor_sessions_list.sort(key=lambda s: (model.slot_day[s[0]], model.slot_start[s[0]]))
+        for session1, session2 in zip(instructor_sessions_list, instructor_sessions_list[1:]):
+            if session1[6] is not None and session1[6] == session2[6]:
+                continue  # consecutive slots of one practical
+            # Same day and less than MIN_BREAK_MINUTES apart (or overlapping)
+            if (model.busy_mask[session1[0]] | model.break_mask[session1[0]]) >> session2[0] & 1:
                 conflicts.append(
                     {
                         "type": "insufficient_break",
-                        "instructor": session1.instructor.name,
-                        "day": session1.slot.get_day_of_week_display(),
-                        "break_time": "Less than 15 minutes",
-                        "courses": [session1.course.code, session2.course.code],
+                        "instructor": session1[2],
+                        "day": day(session1[0]),
+                        "break_time": f"Less than {solver.MIN_BREAK_MINUTES} minutes",
+                        "courses": [session1[5], session2[5]],
                     }
                 )
 
@@ -587,22 +565,27 @@ def optimize_timetable(timetable: models.Timetable) -> Dict:
     """Optimize timetable for better resource utilization"""
 
     # Get current sessions
-    current_sessions = list(models.ClassSession.objects.filter(timetable=timetable))
-    if not current_sessions:
+    current_sessions = list(
+        models.ClassSession.objects.filter(timetable=timetable, version=timetable.active_version)
+        .values_list("instructor_id", "room_id", "slot_id")
+    )
+    model = _load_class_model()
+    if not current_sessions or model is None:
+        # Without courses, slots or classrooms there is no schedulable problem to improve on
         return {"message": "No sessions to optimize", "optimizations": 0}
 
     optimizations = 0
 
     # Try to reduce room changes for instructors
     instructor_rooms = defaultdict(list)
-    for session in current_sessions:
-        instructor_rooms[session.instructor_id].append((session.room, session.slot.day_of_week))
+    for instructor_id, room_id, slot_id in current_sessions:
+        instructor_rooms[instructor_id].append((room_id, model.slot_day[model.slot_index[slot_id]]))
 
     # Find instructors with too many room changes
     for instructor_id, room_day_list in instructor_rooms.items():
         unique_rooms_per_day = defaultdict(set)
-        for room, day in room_day_list:
-            unique_rooms_per_day[day].add(room.id)
+        for room_id, day in room_day_list:
+            unique_rooms_per_day[day].add(room_id)
 
         # If instructor uses more than 2 rooms per day, try to consolidate
         for day, rooms in unique_rooms_per_day.items():
@@ -612,8 +595,8 @@ def optimize_timetable(timetable: models.Timetable) -> Dict:
 
     # Try to balance workload across days
     daily_sessions = defaultdict(int)
-    for session in current_sessions:
-        daily_sessions[session.slot.day_of_week] += 1
+    for _, _, slot_id in current_sessions:
+        daily_sessions[model.slot_day[model.slot_index[slot_id]]] += 1
 
     # Find days with too many or too few sessions
     avg_sessions = sum(daily_sessions.values()) / len(daily_sessions) if daily_sessions else 0
@@ -630,7 +613,7 @@ def optimize_timetable(timetable: models.Timetable) -> Dict:
 
 def get_timetable_statistics(timetable_id: int) -> Dict:
     """Get comprehensive timetable statistics"""
-    sessions = models.ClassSession.objects.filter(timetable_id=timetable_id)
+    sessions = models.ClassSession.objects.filter(timetable_id=timetable_id).live()
 
     total_sessions = sessions.count()
     sections = sessions.values_list("section", flat=True).distinct().count()
@@ -0,0 +1,862 @@
+"""Database-free scheduling engines.
+
+``services`` loads the models, compiles them into a plain "problem" dict
+(ids, indexes and minute-of-day integers only) and hands it to the solvers
+here, which return their decisions without touching the ORM. Keeping the
+solvers pure is what lets a recorded trace (see ``api.trace``) re-run them
+offline.
+"""
+import random
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from heapq import heapify, heappop, heappush, nsmallest
+from datetime import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import profiling
+
+ENGINE_VERSION = "matching-3"
+
+# Rejection reasons; the position is the reason code in traces
+REJECT_REASONS = (
+    "same_day",
+    "professor_availability",
+    "room_availability",
+    "professor_busy",
+    "break",
+    "room_busy",
+    "mess_hours",
+    "capacity",
+    "no_consecutive_slots",
+)
+EXAM_REJECT_REASONS = ("no_availability", "batch_clash")
+# Codes of accepted decisions: sessions for class timetables, exam events for exam schedules
+SESSION_KINDS = ("lecture", "tutorial", "practical")
+EXAM_EVENTS = ("exam", "room", "fallback")
+
+MIN_BREAK_MINUTES = 15
+
+# Order in which course-sections are placed: as loaded, or fewest feasible (slot, room) options first
+ORDER_INPUT = "input"
+ORDER_MOST_CONSTRAINED = "most_constrained"
+ORDERINGS = (ORDER_MOST_CONSTRAINED, ORDER_INPUT)
+
+# Seeded runs scale each most-constrained ranking key by up to this much
+RANK_JITTER = 0.3
+
+# Solution quality, compared field by field in this order; lower is better
+SCORE_FIELDS = ("unplaced", "conflicts", "instructor_gap_minutes", "day_imbalance")
+
+(SAME_DAY, PROFESSOR_AVAILABILITY, ROOM_AVAILABILITY, PROFESSOR_BUSY, BREAK, ROOM_BUSY, MESS_HOURS, CAPACITY,
+ NO_CONSECUTIVE_SLOTS) = range(9)
+NO_AVAILABILITY, BATCH_CLASH = range(2)
+LECTURE, TUTORIAL, PRACTICAL = range(3)
+EXAM_PLACED, EXAM_ROOM, EXAM_FALLBACK = range(3)
+
+
+def minutes(t) -> int:
+    return t.hour * 60 + t.minute
+
+
+def clock(minute_of_day: int) -> time:
+    return time(minute_of_day // 60, minute_of_day % 60)
+
+
+def _windows(rows) -> Dict[int, List[Tuple[int, int, int]]]:
+    grouped: Dict[int, List[Tuple[int, int, int]]] = defaultdict(list)
+    for owner, day, start, end in rows:
+        grouped[owner].append((day, start, end))
+    return grouped
+
+
+def compile_class_problem(courses, slots, rooms, labs, mess_hours, sections, section_sizes,
+                          enrollment_counts, core_courses, professor_availability, room_availability) -> Dict:
+    """Flatten loaded models into the problem consumed by solve_class_problem.
+
+    ``section_sizes`` maps section -> students, ``enrollment_counts``
+    maps (course id, section) -> enrolled students of that section and
+    ``core_courses`` holds the (course id, section) overrides.
+    """
+    course_index = {c.id: i for i, c in enumerate(courses)}
+    section_index = {name: i for i, name in enumerate(sections)}
+    return {
+        "courses": [
+            (c.id, c.code, [p.id for p in c.instructors.all()], c.lecture_hours, c.tutorial_hours, c.practical_hours)
+            for c in courses
+        ],
+        "slots": [(s.id, s.day_of_week, minutes(s.start_time), minutes(s.end_time)) for s in slots],
+        "rooms": [(r.id, r.capacity) for r in rooms],
+        "labs": [(r.id, r.capacity) for r in labs],
+        "mess_hours": [(m.day_of_week, minutes(m.start_time), minutes(m.end_time)) for m in mess_hours],
+        "practical_blocks": [c.practical_block for c in courses],
+        "sections": list(sections),
+        "section_sizes": [section_sizes.get(name, 0) for name in sections],
+        "enrollment_counts": sorted(
+            (course_index[course_id], section_index[section], n)
+            for (course_id, section), n in enrollment_counts.items()
+            if course_id in course_index and section in section_index
+        ),
+        "core_courses": sorted(
+            (course_index[course_id], section_index[section])
+            for course_id, section in core_courses
+            if course_id in course_index and section in section_index
+        ),
+        "professor_availability": [
+            (a.professor_id, a.day_of_week, minutes(a.start_time), minutes(a.end_time)) for a in professor_availability
+        ],
+        "room_availability": [
+            (a.room_id, a.day_of_week, minutes(a.start_time), minutes(a.end_time)) for a in room_availability
+        ],
+    }
+
+
+def section_demand(problem: Dict) -> Dict[Tuple[int, int], int]:
+    """Students expected per (course, section) for the course-sections to schedule.
+
+    A course is scheduled for a section when students of the section are
+    enrolled in it (seating those students) or when it is one of the
+    section's core courses (seating the whole section). With neither
+    enrollments nor core courses on record every section takes every
+    course, as before enrollments were used.
+    """
+    sizes = problem["section_sizes"]
+    core = problem.get("core_courses", ())
+    if not problem["enrollment_counts"] and not core:
+        return {(ci, si): sizes[si] for ci in range(len(problem["courses"])) for si in range(len(sizes))}
+    demand = {(ci, si): n for ci, si, n in problem["enrollment_counts"]}
+    for ci, si in core:
+        demand[(ci, si)] = sizes[si]
+    return demand
+
+
+class ClassModel:
+    """Integer-indexed, array-backed view of a compiled class problem.
+
+    Built once per run by every class engine (the solver, api.feasibility
+    and the session checks in services). Slots, rooms (classrooms first,
+    then labs), professors and courses are positions in parallel arrays,
+    and availability is precomputed as bitmasks over slot indexes, so
+    "is this professor available in slot ti" is a shift and an AND
+    instead of a scan over availability windows.
+    """
+
+    __slots__ = (
+        "slot_ids", "slot_index", "slot_day", "slot_start", "slot_end", "slot_next", "days",
+        "overlapping", "busy_mask", "break_mask", "mess_mask",
+        "room_ids", "room_index", "capacity", "n_classrooms", "room_mask", "open_classrooms", "open_labs",
+        "professor_ids", "professor_index", "professor_mask",
+        "course_ids", "course_codes", "course_professor", "lectures", "tutorials", "practicals", "practical_block",
+        "sections", "demand", "tasks",
+    )
+
+    def __init__(self, problem: Dict):
+        slots = problem["slots"]
+        n_slots = len(slots)
+        self.slot_ids = array("q", (s[0] for s in slots))
+        self.slot_index = {slot_id: ti for ti, slot_id in enumerate(self.slot_ids)}
+        self.slot_day = array("b", (s[1] for s in slots))
+        self.slot_start = array("h", (s[2] for s in slots))
+        self.slot_end = array("h", (s[3] for s in slots))
+        self.days = tuple(sorted(set(self.slot_day)))
+
+        by_day: Dict[int, List[int]] = defaultdict(list)
+        for ti, (_, day, _, _) in enumerate(slots):
+            by_day[day].append(ti)
+        # Per slot: same-day slots it overlaps (itself included) and those within the break after or before it
+        self.busy_mask = [0] * n_slots
+        self.break_mask = [0] * n_slots
+        for ti, (_, day, start, end) in enumerate(slots):
+            for tj in by_day[day]:
+                _, _, s, e = slots[tj]
+                if s < end and start < e:
+                    self.busy_mask[ti] |= 1 << tj
+                elif e <= start < e + MIN_BREAK_MINUTES or end <= s < end + MIN_BREAK_MINUTES:
+                    self.break_mask[ti] |= 1 << tj
+        self.overlapping = [tuple(tj for tj in self.slots_in(mask) if tj != ti) for ti, mask in enumerate(self.busy_mask)]
+        # Per slot: the slot a multi-slot block continues into, the earliest one starting within the
+        # break after it (-1 if none)
+        self.slot_next = array("h", (
+            min((tj for tj in self.slots_in(self.break_mask[ti]) if slots[tj][2] >= end),
+                key=lambda tj: (slots[tj][2], slots[tj][3]), default=-1)
+            for ti, (_, _, _, end) in enumerate(slots)
+        ))
+
+        def covered(windows) -> int:
+            # Slots lying entirely inside one of the (day, start, end) windows
+            mask = 0
+            for day, w_start, w_end in windows:
+                for ti in by_day.get(day, ()):
+                    if w_start <= slots[ti][2] and slots[ti][3] <= w_end:
+                        mask |= 1 << ti
+            return mask
+
+        self.mess_mask = 0
+        for day, m_start, m_end in problem["mess_hours"]:
+            for ti in by_day.get(day, ()):
+                if m_start < slots[ti][3] and slots[ti][2] < m_end:
+                    self.mess_mask |= 1 << ti
+
+        rooms = list(problem["rooms"]) + list(problem["labs"])
+        room_windows = _windows(problem["room_availability"])
+        self.room_ids = array("q", (r[0] for r in rooms))
+        self.room_index = {room_id: ri for ri, room_id in enumerate(self.room_ids)}
+        self.capacity = array("i", (r[1] for r in rooms))
+        self.n_classrooms = len(problem["rooms"])
+        self.room_mask = [covered(room_windows.get(room_id, ())) for room_id in self.room_ids]
+        self.open_classrooms = [
+            tuple(ri for ri in range(self.n_classrooms) if self.room_mask[ri] >> ti & 1) for ti in range(n_slots)
+        ]
+        self.open_labs = [
+            tuple(ri for ri in range(self.n_classrooms, len(rooms)) if self.room_mask[ri] >> ti & 1)
+            for ti in range(n_slots)
+        ]
+
+        courses = problem["courses"]
+        professor_windows = _windows(problem["professor_availability"])
+        self.professor_ids = array("q", sorted(set(professor_windows) | {c[2][0] for c in courses if c[2]}))
+        self.professor_index = {pid: pi for pi, pid in enumerate(self.professor_ids)}
+        self.professor_mask = [covered(professor_windows.get(pid, ())) for pid in self.professor_ids]
+
+        self.course_ids = array("q", (c[0] for c in courses))
+        self.course_codes = tuple(c[1] for c in courses)
+        self.course_professor = array("i", (self.professor_index[c[2][0]] if c[2] else -1 for c in courses))
+        self.lectures = array("h", (c[3] for c in courses))
+        self.tutorials = array("h", (c[4] for c in courses))
+        self.practicals = array("h", (c[5] for c in courses))
+        # Traces recorded before blocks existed carry no practical_blocks
+        self.practical_block = array("h", (max(1, n) for n in problem.get("practical_blocks") or [1] * len(courses)))
+
+        self.sections = tuple(problem["sections"])
+        demand = section_demand(problem)
+        n_sections = len(self.sections)
+        self.demand = array("i", (demand.get((ci, si), 0) for ci in range(len(courses)) for si in range(n_sections)))
+        # Course-sections to schedule (course * sections + section), section by section in course order
+        self.tasks = array("i", sorted((ci * n_sections + si for ci, si in demand), key=lambda t: (t % n_sections, t)))
+
+    @staticmethod
+    def slots_in(mask: int) -> List[int]:
+        """Slot indexes whose bit is set in ``mask``, ascending"""
+        members = []
+        while mask:
+            low = mask & -mask
+            members.append(low.bit_length() - 1)
+            mask ^= low
+        return members
+
+    def seats(self, ci: int, si: int) -> int:
+        return self.demand[ci * len(self.sections) + si]
+
+    def available(self, pi: int) -> int:
+        """Mask of slots professor ``pi`` can teach: inside their availability and outside mess hours"""
+        return self.professor_mask[pi] & ~self.mess_mask
+
+
+def _min_waste_assignment(costs: List[List[int]]) -> List[int]:
+    """Hungarian algorithm: the column for each row of an n x m (n <= m) cost matrix
+    minimising the total cost; some assignment must avoid every _UNUSABLE entry"""
+    n, m = len(costs), len(costs[0])
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    owner = [0] * (m + 1)  # column -> 1-based row
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        owner[0] = row
+        col = 0
+        min_slack = [_UNUSABLE] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[col] = True
+            r = owner[col]
+            delta, next_col = _UNUSABLE, 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                slack = costs[r - 1][j - 1] - u[r] - v[j]
+                if slack < min_slack[j]:
+                    min_slack[j] = slack
+                    way[j] = col
+                if min_slack[j] < delta:
+                    delta, next_col = min_slack[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            col = next_col
+            if owner[col] == 0:
+                break
+        while col:
+            prev = way[col]
+            owner[col] = owner[prev]
+            col = prev
+    assignment = [0] * n
+    for j in range(1, m + 1):
+        if owner[j]:
+            assignment[owner[j] - 1] = j - 1
+    return assignment
+
+
+_UNUSABLE = 1 << 40
+
+
+def solve_class_problem(problem: Dict, tracer=None, ordering: str = ORDER_MOST_CONSTRAINED,
+                        seed: Optional[int] = None) -> Dict:
+    """Greedy placement of every course's weekly sessions.
+
+    The course-sections section_demand asks for are taken in
+    ``ordering``: ``most_constrained`` (the default) places those with the
+    fewest feasible (slot, room) options per session first and re-ranks
+    as instructors fill up; ``input`` goes section by section in load
+    order. A ``seed`` randomizes the run reproducibly: days are scanned
+    in a shuffled order, ``input`` tasks are shuffled and
+    ``most_constrained`` keys get up to RANK_JITTER noise, which is what
+    gives api.portfolio different starts to pick from. Slots are chosen
+    greedily; rooms are not. Each slot keeps a bipartite
+    matching between the sessions placed in it and the rooms big enough
+    for them (capacity >= the course-section's demand), and a new session
+    is accepted as long as an augmenting path still seats everyone, so an
+    early small tutorial no longer locks a large hall away from a later
+    big lecture. Once every slot is filled, each slot's rooms are
+    reassigned by min-cost matching on wasted seats.
+
+    Practicals of a course with a ``practical_block`` over one are placed
+    first, as blocks of that many consecutive slots (see
+    ClassModel.slot_next) in one lab that is free for all of them. A
+    block is checked with one mask test per professor constraint and
+    per lab; its sessions keep that lab through the room matching.
+
+    Returns ``placements`` as (course index, section index, slot index,
+    room index, instructor id, session kind) tuples, where room indexes
+    run over ``rooms`` followed by ``labs``, the human-readable
+    ``conflicts`` for whatever could not be placed, ``blocks`` as tuples
+    of placement indexes (one tuple per multi-slot practical, in slot
+    order), and seat usage. The
+    ``tracer`` receives every decision (see api.trace.TraceWriter);
+    rooms recorded for accepted sessions are the tentative ones.
+    """
+    prof = profiling.current()
+    counters = prof.counters
+    rejections = prof.rejections
+    record = tracer.decision if tracer is not None else None
+
+    with prof.phase("model"):
+        model = ClassModel(problem)
+    slot_day = model.slot_day
+    capacities = model.capacity
+    open_classrooms, open_labs, overlapping = model.open_classrooms, model.open_labs, model.overlapping
+    busy_mask, break_mask, mess_mask = model.busy_mask, model.break_mask, model.mess_mask
+    professor_mask = model.professor_mask
+    course_professor = model.course_professor
+    codes, sections = model.course_codes, model.sections
+    n_sections = len(sections)
+    demand = model.demand
+    rng = random.Random(seed) if seed is not None else None
+
+    # Rooms of the right type open in slot ``ti`` that seat ``seats``; one shared tuple per combination
+    fitting: Dict[Tuple[int, bool, int], Tuple[int, ...]] = {}
+
+    def rooms_for(ti: int, is_practical: bool, seats: int) -> Tuple[int, ...]:
+        rooms = fitting.get((ti, is_practical, seats))
+        if rooms is None:
+            usable = open_labs[ti] if is_practical else open_classrooms[ti]
+            rooms = fitting[(ti, is_practical, seats)] = tuple(ri for ri in usable if capacities[ri] >= seats)
+        return rooms
+
+    # Placed sessions are matching nodes, stored column-wise: candidate rooms, current room,
+    # demand, slot, course-section (course * sections + section) and session kind
+    node_rooms: List[Tuple[int, ...]] = []
+    node_room = array("i")
+    node_demand = array("i")
+    node_slot = array("i")
+    node_task = array("i")
+    node_kind = array("b")
+    holders: List[Dict[int, int]] = [{} for _ in slot_day]  # per slot: room -> node
+    # Per room: mask of the slots it is held in, so a block can test all its slots at once
+    room_held = [0] * len(capacities)
+    # Placed multi-slot practicals: their nodes, first slot first; these nodes only have their one room
+    blocks: List[Tuple[int, ...]] = []
+
+    def blocked_rooms(ti: int) -> Set[int]:
+        blocked: Set[int] = set()
+        for tj in overlapping[ti]:
+            blocked.update(holders[tj])
+        return blocked
+
+    def augment(node: int, ti: int, blocked: Set[int], seen: Set[int]) -> bool:
+        # Kuhn's augmenting path: seat ``node`` in slot ``ti``, moving others if needed
+        holder = holders[ti]
+        for ri in node_rooms[node]:
+            if ri in seen or ri in blocked:
+                continue
+            seen.add(ri)
+            other = holder.get(ri)
+            if other is None:
+                room_held[ri] |= 1 << ti
+            if other is None or augment(other, ti, blocked, seen):
+                holder[ri] = node
+                node_room[node] = ri
+                return True
+        return False
+
+    # Booked state: per professor the slots taken and those too close to a class for a break,
+    # per course-section a bitmask of days with a lecture or tutorial
+    professor_busy = [0] * len(model.professor_ids)
+    professor_break = [0] * len(model.professor_ids)
+    days_booked = array("B", bytes(len(codes) * n_sections))
+
+    def try_place(ci: int, si: int, pi: int, ti: int, is_practical: bool) -> bool:
+        """Check every constraint for a session in slot ``ti`` and seat it in a room if possible"""
+        counters["can_place_calls"] += 1
+        bit = 1 << ti
+        task = ci * n_sections + si
+
+        if days_booked[task] >> slot_day[ti] & 1 and not is_practical:
+            # One lecture/tutorial per day per course per section
+            reason = SAME_DAY
+        elif not professor_mask[pi] & bit:
+            reason = PROFESSOR_AVAILABILITY
+        elif professor_busy[pi] & bit:
+            reason = PROFESSOR_BUSY
+        elif professor_break[pi] & bit:
+            # 15-min break between a professor's classes
+            reason = BREAK
+        elif mess_mask & bit:
+            # No classes during lunch (mess hours)
+            reason = MESS_HOURS
+        elif not (open_labs[ti] if is_practical else open_classrooms[ti]):
+            # Choose room type based on session type
+            reason = ROOM_AVAILABILITY
+        else:
+            seats = demand[task]
+            rooms = rooms_for(ti, is_practical, seats)
+            if not rooms:
+                reason = CAPACITY
+            else:
+                node = len(node_room)
+                node_rooms.append(rooms)
+                node_room.append(-1)
+                node_demand.append(seats)
+                node_slot.append(ti)
+                holder = holders[ti]
+                blocked = blocked_rooms(ti)
+                # A room nobody holds needs no augmenting path search
+                free = next((ri for ri in rooms if ri not in holder and ri not in blocked), None)
+                if free is not None:
+                    holder[free] = node
+                    node_room[node] = free
+                    room_held[free] |= 1 << ti
+                    return True
+                if augment(node, ti, blocked, set()):
+                    return True
+                for column in (node_rooms, node_room, node_demand, node_slot):
+                    column.pop()
+                reason = ROOM_BUSY
+
+        rejections[REJECT_REASONS[reason]] += 1
+        if record:
+            record(False, reason, ci, si, ti, 0)
+        return False
+
+    # (first slot, length) -> the block's slots, their mask, the slots overlapping them and their break
+    # neighbourhood; None when the day has fewer consecutive slots from there
+    runs: Dict[Tuple[int, int], Optional[Tuple[Tuple[int, ...], int, int, int]]] = {}
+
+    def run_from(ti: int, length: int) -> Optional[Tuple[Tuple[int, ...], int, int, int]]:
+        key = (ti, length)
+        if key not in runs:
+            members = [ti]
+            while len(members) < length and model.slot_next[members[-1]] >= 0:
+                members.append(model.slot_next[members[-1]])
+            run = None
+            if len(members) == length:
+                mask = busy = near = 0
+                for tj in members:
+                    mask |= 1 << tj
+                    busy |= busy_mask[tj]
+                    near |= break_mask[tj]
+                run = (tuple(members), mask, busy, near & ~mask)
+            runs[key] = run
+        return runs[key]
+
+    def place_block(ci: int, si: int, pi: int, ti: int, length: int) -> bool:
+        """Place one practical over ``length`` consecutive slots from ``ti``, all in the same lab"""
+        counters["can_place_calls"] += 1
+        task = ci * n_sections + si
+        run = run_from(ti, length)
+        if run is None:
+            reason = NO_CONSECUTIVE_SLOTS
+        else:
+            members, mask, busy, near = run
+            seats = demand[task]
+            if professor_mask[pi] & mask != mask:
+                reason = PROFESSOR_AVAILABILITY
+            elif professor_busy[pi] & mask:
+                reason = PROFESSOR_BUSY
+            elif professor_break[pi] & mask:
+                reason = BREAK
+            elif mess_mask & mask:
+                reason = MESS_HOURS
+            else:
+                labs = [ri for ri in open_labs[ti] if model.room_mask[ri] & mask == mask]
+                fits = [ri for ri in labs if capacities[ri] >= seats]
+                # Rooms are pinned for the whole block: only a lab free in every slot will do
+                free = next((ri for ri in fits if not room_held[ri] & busy), None)
+                if free is not None:
+                    head = len(node_room)
+                    for tj in members:
+                        holders[tj][free] = len(node_room)
+                        node_rooms.append((free,))
+                        node_room.append(free)
+                        node_demand.append(seats)
+                        node_slot.append(tj)
+                        node_task.append(task)
+                        node_kind.append(PRACTICAL)
+                        if record:
+                            record(True, PRACTICAL, ci, si, tj, free)
+                    room_held[free] |= mask
+                    professor_busy[pi] |= busy
+                    professor_break[pi] |= near
+                    blocks.append(tuple(range(head, len(node_room))))
+                    return True
+                reason = ROOM_BUSY if fits else CAPACITY if labs else ROOM_AVAILABILITY
+
+        rejections[REJECT_REASONS[reason]] += 1
+        if record:
+            record(False, reason, ci, si, ti, 0)
+        return False
+
+    conflicts: List[str] = []
+
+    # Order in which place_task scans slots: by day then time, days shuffled on seeded runs
+    slot_order = list(range(len(slot_day)))
+    if rng:
+        days = list(model.days)
+        rng.shuffle(days)
+        day_rank = {day: rank for rank, day in enumerate(days)}
+        slot_order.sort(key=lambda ti: (day_rank[slot_day[ti]], model.slot_start[ti]))
+
+    def place_task(ci: int, si: int) -> None:
+        """Place every session of one course-section, earliest feasible slots first"""
+        pi = course_professor[ci]
+        if pi < 0:
+            conflicts.append(f"No instructors for course {codes[ci]}")
+            return
+
+        lecture_needed, tutorial_needed, practical_needed = model.lectures[ci], model.tutorials[ci], model.practicals[ci]
+        task = ci * n_sections + si
+
+        block_needed = 0
+        if model.practical_block[ci] > 1:
+            # Multi-slot practicals go first and never fall back to loose single slots
+            block_needed, practical_needed = practical_needed, 0
+            for ti in slot_order:
+                if block_needed <= 0:
+                    break
+                length = min(model.practical_block[ci], block_needed)
+                if place_block(ci, si, pi, ti, length):
+                    block_needed -= length
+
+        for ti in slot_order:
+            if lecture_needed <= 0 and tutorial_needed <= 0 and practical_needed <= 0:
+                break
+
+            if not try_place(ci, si, pi, ti, practical_needed > 0):
+                continue
+
+            # Place session based on priority
+            day_bit = 1 << slot_day[ti]
+            if lecture_needed > 0 and not days_booked[task] & day_bit:
+                kind = LECTURE
+                lecture_needed -= 1
+                days_booked[task] |= day_bit
+            elif tutorial_needed > 0 and not days_booked[task] & day_bit:
+                kind = TUTORIAL
+                tutorial_needed -= 1
+                days_booked[task] |= day_bit
+            else:
+                kind = PRACTICAL
+                practical_needed -= 1
+
+            professor_busy[pi] |= busy_mask[ti]
+            professor_break[pi] |= break_mask[ti]
+            node_task.append(task)
+            node_kind.append(kind)
+            if record:
+                record(True, kind, ci, si, ti, node_room[-1])
+
+        # Handle unplaced sessions
+        practical_needed += block_needed
+        section = sections[si]
+        if lecture_needed > 0:
+            conflicts.append(f"Could not place {lecture_needed} lecture(s) for {codes[ci]} section {section}")
+        if tutorial_needed > 0:
+            conflicts.append(f"Could not place {tutorial_needed} tutorial(s) for {codes[ci]} section {section}")
+        if practical_needed > 0:
+            conflicts.append(f"Could not place {practical_needed} practical(s) for {codes[ci]} section {section}")
+
+    def most_constrained_first(tasks: List[Tuple[int, int]], report: Dict):
+        """Yield course-sections fewest (slot, room) options per session first.
+
+        A task's options are the slots its instructor can teach (outside
+        mess hours) times the open rooms of the right type that can seat
+        the section. After each placement the tasks sharing that
+        instructor are re-ranked on what is left: slots where the
+        instructor is still free, less the rooms already taken in them.
+        """
+        capacities_by_slot = {
+            False: [sorted(capacities[ri] for ri in rooms) for rooms in open_classrooms],
+            True: [sorted(capacities[ri] for ri in rooms) for rooms in open_labs],
+        }
+        teachable: Dict[int, List[int]] = {}
+
+        def options(ci: int, si: int) -> List[Tuple[int, int]]:
+            """(slot, rooms that fit) for every slot the task could use, before anything is booked"""
+            pi = course_professor[ci]
+            seats = demand[ci * n_sections + si]
+            labs = model.practicals[ci] > 0
+            if pi not in teachable:
+                teachable[pi] = model.slots_in(model.available(pi))
+            fits = []
+            for ti in teachable[pi]:
+                caps = capacities_by_slot[labs][ti]
+                n = len(caps) - bisect_left(caps, seats)
+                if labs and model.lectures[ci] + model.tutorials[ci] > 0:
+                    caps = capacities_by_slot[False][ti]
+                    n += len(caps) - bisect_left(caps, seats)
+                if n:
+                    fits.append((ti, n))
+            return fits
+
+        def key(ci: int, si: int, live: bool) -> float:
+            pi = course_professor[ci]
+            if pi < 0:
+                return -1.0
+            sessions = model.lectures[ci] + model.tutorials[ci] + model.practicals[ci]
+            if live:
+                taken = professor_busy[pi] | professor_break[pi]
+                free = sum(max(0, n - len(holders[ti])) for ti, n in task_options[(ci, si)] if not taken >> ti & 1)
+            else:
+                free = sum(n for _, n in task_options[(ci, si)])
+            return free / sessions * jitter.get((ci, si), 1.0)
+
+        pending = [
+            (ci, si) for ci, si in tasks
+            if course_professor[ci] < 0 or model.lectures[ci] + model.tutorials[ci] + model.practicals[ci] > 0
+        ]
+        task_options = {(ci, si): options(ci, si) for ci, si in pending if course_professor[ci] >= 0}
+        jitter = {task: 1.0 + rng.random() * RANK_JITTER for task in task_options} if rng else {}
+        by_instructor: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        for ci, si in task_options:
+            by_instructor[course_professor[ci]].append((ci, si))
+
+        heap = []
+        latest: Dict[Tuple[int, int], int] = {}
+        for seq, (ci, si) in enumerate(pending):
+            heap.append((key(ci, si, live=False), seq, ci, si))
+            latest[(ci, si)] = seq
+        heapify(heap)
+        report["tightest"] = [
+            {"course": codes[ci], "section": sections[si], "options_per_session": round(k, 2)}
+            for k, _, ci, si in nsmallest(5, heap)
+        ]
+
+        seq = len(heap)
+        reranked = 0
+        while heap:
+            _, entry, ci, si = heappop(heap)
+            if latest.get((ci, si)) != entry:
+                continue  # superseded by a re-ranked entry
+            del latest[(ci, si)]
+            yield ci, si
+            if course_professor[ci] < 0:
+                continue
+            for other in by_instructor[course_professor[ci]]:
+                if other in latest:
+                    seq += 1
+                    latest[other] = seq
+                    heappush(heap, (key(*other, live=True), seq) + other)
+                    reranked += 1
+        report["reranked"] = reranked
+
+    tasks = [(task // n_sections, task % n_sections) for task in model.tasks]
+    ordering_report: Dict = {"rule": ordering, "seed": seed}
+
+    with prof.phase("place"):
+        if ordering == ORDER_INPUT:
+            # Section by section, courses in input order
+            if rng:
+                rng.shuffle(tasks)
+            for ci, si in tasks:
+                place_task(ci, si)
+        elif ordering == ORDER_MOST_CONSTRAINED:
+            for ci, si in most_constrained_first(tasks, ordering_report):
+                place_task(ci, si)
+        else:
+            raise ValueError(f"Unknown ordering {ordering!r}; expected one of {', '.join(ORDERINGS)}")
+
+    with prof.phase("match"):
+        # Best fit: per slot, the perfect matching that wastes the fewest seats
+        for ti, holder in enumerate(holders):
+            if not holder:
+                continue
+            members = list(holder.values())
+            blocked = blocked_rooms(ti)
+            columns = sorted({ri for node in members for ri in node_rooms[node] if ri not in blocked})
+            costs = [
+                [
+                    capacities[ri] - node_demand[node] if ri in node_rooms[node] else _UNUSABLE
+                    for ri in columns
+                ]
+                for node in members
+            ]
+            holder.clear()
+            for node, column in zip(members, _min_waste_assignment(costs)):
+                node_room[node] = columns[column]
+                holder[columns[column]] = node
+
+    professor_ids = model.professor_ids
+    placements = [
+        (task // n_sections, task % n_sections, ti, ri, professor_ids[course_professor[task // n_sections]], kind)
+        for task, ti, ri, kind in zip(node_task, node_slot, node_room, node_kind)
+    ]
+    seats_used = sum(node_demand)
+    seats_offered = sum(capacities[ri] for ri in node_room)
+    return {
+        "placements": placements,
+        "conflicts": conflicts,
+        "blocks": blocks,
+        "ordering": ordering_report,
+        "seats_used": seats_used,
+        "seats_offered": seats_offered,
+    }
+
+
+def score_class_result(problem: Dict, result: Dict) -> Dict:
+    """Quality of a solve_class_problem result, one number per SCORE_FIELDS entry.
+
+    ``unplaced`` counts required sessions without a slot, ``conflicts``
+    the conflict messages, ``instructor_gap_minutes`` the idle time
+    between an instructor's consecutive sessions on the same day, and
+    ``day_imbalance`` sums, per section, the difference between its
+    busiest and quietest teaching day.
+    """
+    slots = problem["slots"]
+    courses = problem["courses"]
+    required = sum(sum(courses[ci][3:6]) for ci, _ in section_demand(problem))
+    placements = result["placements"]
+
+    teaching: Dict[Tuple[int, int], List[Tuple[int, int]]] = defaultdict(list)
+    per_day: Dict[int, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    for _, si, ti, _, instructor_id, _ in placements:
+        _, day, start, end = slots[ti]
+        teaching[(instructor_id, day)].append((start, end))
+        per_day[si][day] += 1
+
+    gaps = 0
+    for sessions in teaching.values():
+        sessions.sort()
+        gaps += sum(max(0, nxt[0] - prev[1]) for prev, nxt in zip(sessions, sessions[1:]))
+
+    days = sorted({day for _, day, _, _ in slots})
+    imbalance = sum(
+        max(counts[day] for day in days) - min(counts[day] for day in days) for counts in per_day.values()
+    )
+    return {
+        "unplaced": required - len(placements),
+        "conflicts": len(result["conflicts"]),
+        "instructor_gap_minutes": gaps,
+        "day_imbalance": imbalance,
+    }
+
+
+def score_key(score: Dict) -> Tuple:
+    return tuple(score[field] for field in SCORE_FIELDS)
+
+
+def compile_exam_problem(courses, students_by_course, course_batches, rooms, room_availability) -> Dict:
+    """Flatten loaded models into the problem consumed by solve_exam_problem"""
+    return {
+        "courses": [
+            (c.id, c.code, students_by_course.get(c.id, 0), sorted(course_batches.get(c.id, ()))) for c in courses
+        ],
+        "rooms": [(r.id, r.capacity) for r in rooms],
+        "room_availability": [
+            (a.room_id, a.day_of_week, minutes(a.start_time), minutes(a.end_time)) for a in room_availability
+        ],
+    }
+
+
+def solve_exam_problem(problem: Dict, tracer=None) -> Dict:
+    """One exam per course on the first day without a batch clash, largest courses first.
+
+    Returns ``exams`` as (course index, day, start, end, [(room id, seats
+    used), ...]) tuples.
+    """
+    prof = profiling.current()
+    rejections = prof.rejections
+    record = tracer.decision if tracer is not None else None
+
+    windows_by_day: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    for _, day, start, end in problem["room_availability"]:
+        windows_by_day[day].append((start, end))
+
+    courses = problem["courses"]
+    order = sorted(range(len(courses)), key=lambda i: (-courses[i][2], courses[i][1]))
+    assigned_batches_per_day: Dict[int, Set[str]] = defaultdict(set)
+    exams = []
+
+    with prof.phase("place"):
+        for ci in order:
+            _, _, students, batch_list = courses[ci]
+            batches = set(batch_list)
+            placed = False
+
+            # Find a day with no batch conflicts
+            for day in range(7):  # Monday to Sunday
+                windows = windows_by_day.get(day)
+                if not windows:
+                    reason = NO_AVAILABILITY
+                elif assigned_batches_per_day[day] & batches:
+                    reason = BATCH_CLASH
+                else:
+                    reason = None
+                if reason is not None:
+                    rejections[EXAM_REJECT_REASONS[reason]] += 1
+                    if record:
+                        record(False, reason, ci, 0, day, 0)
+                    continue
+
+                # Mark batches as assigned to this day
+                assigned_batches_per_day[day].update(batches)
+
+                # Allocate rooms by capacity
+                allocations = []
+                remaining_students = students
+                for ri, (room_id, capacity) in enumerate(problem["rooms"]):
+                    if remaining_students <= 0:
+                        break
+                    used = min(capacity, remaining_students)
+                    allocations.append((room_id, used))
+                    remaining_students -= used
+                    if record:
+                        record(True, EXAM_ROOM, ci, 0, day, ri)
+
+                exams.append((ci, day, min(w[0] for w in windows), max(w[1] for w in windows), allocations))
+                if record:
+                    record(True, EXAM_PLACED, ci, 0, day, 0)
+                placed = True
+                break
+
+            if not placed:
+                # Fallback: create on any available day, without rooms
+                for day in range(7):
+                    windows = windows_by_day.get(day)
+                    if windows:
+                        exams.append((ci, day, min(w[0] for w in windows), max(w[1] for w in windows), []))
+                        if record:
+                            record(True, EXAM_FALLBACK, ci, 0, day, 0)
+                        break
+
+    return {"exams": exams}
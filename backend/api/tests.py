@@ -0,0 +1,940 @@
+import io
+import itertools
+import multiprocessing
+import random
+import re
+import tempfile
+import textwrap
+import time
+from datetime import time as clock
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api import feasibility, imports, locks, middleware, models, portfolio, problem_cache, profiling, services, solver
+
+# Any (timetable, version, ...) index serves a live-version prefix lookup
+LIVE_SESSIONS_SEARCH = re.compile(r"SEARCH api_classsession USING (COVERING )?INDEX \w+ \(timetable_id=\? AND version=\?")
+
+
+def _plan(queryset) -> str:
+    return queryset.explain()
+
+
+def _best_of(queryset, runs: int = 5) -> float:
+    """Fastest of ``runs`` executions of ``queryset``'s SQL (rows fetched, no model instances), in milliseconds"""
+    sql, params = queryset.query.sql_with_params()
+    best = float("inf")
+    with connection.cursor() as cursor:
+        for _ in range(runs):
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+class SchedulingIndexTests(TestCase):
+    """EXPLAIN QUERY PLAN of the hot scheduling queries, and their latency with and without the indexes"""
+
+    TIMETABLES = 2
+    VERSIONS = 4
+    SECTIONS = 40
+    COURSES = 100
+    SLOTS = 40
+
+    @classmethod
+    def setUpTestData(cls):
+        professors = models.Professor.objects.bulk_create(
+            [models.Professor(name=f"P{i}", email=f"p{i}@example.edu") for i in range(25)]
+        )
+        rooms = models.Room.objects.bulk_create(
+            [models.Room(code=f"R{i}", name=f"R{i}", capacity=40 + i, room_type=models.RoomType.CLASSROOM) for i in range(30)]
+        )
+        courses = models.Course.objects.bulk_create([models.Course(code=f"C{i}", name=f"C{i}") for i in range(cls.COURSES)])
+        slots = models.Slot.objects.bulk_create(
+            [
+                models.Slot(code=f"S{i}", day_of_week=i % 5, start_time=clock(8 + i // 5), end_time=clock(8 + i // 5, 50))
+                for i in range(cls.SLOTS)
+            ]
+        )
+        timetables = [models.Timetable.objects.create(name=f"T{i}", active_version=cls.VERSIONS) for i in range(cls.TIMETABLES)]
+        sessions = []
+        for timetable in timetables:
+            for version in range(1, cls.VERSIONS + 1):
+                for si in range(cls.SECTIONS):
+                    for ci, course in enumerate(courses):
+                        sessions.append(
+                            models.ClassSession(
+                                timetable=timetable,
+                                version=version,
+                                course=course,
+                                slot=slots[(ci + si) % cls.SLOTS],
+                                room=rooms[(ci * 7 + si) % len(rooms)],
+                                instructor=professors[ci % len(professors)],
+                                section=f"S{si}",
+                            )
+                        )
+        models.ClassSession.objects.bulk_create(sessions, batch_size=2000)
+        models.ProfessorAvailability.objects.bulk_create(
+            [
+                models.ProfessorAvailability(professor=p, day_of_week=d, start_time=clock(h), end_time=clock(h + 1))
+                for p in professors for d in range(5) for h in range(8, 18)
+            ]
+        )
+        models.RoomAvailability.objects.bulk_create(
+            [
+                models.RoomAvailability(room=r, day_of_week=d, start_time=clock(h), end_time=clock(h + 1))
+                for r in rooms for d in range(5) for h in range(8, 18)
+            ]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.timetable = timetables[-1]
+        cls.professor = professors[3]
+        cls.room = rooms[3]
+
+    def queries(self):
+        """The filters services.py and views.py run, keyed by the index each one should use"""
+        live = models.ClassSession.objects.filter(timetable_id=self.timetable.id).live()
+        return {
+            "session_ver_section_idx": live.filter(section="S3"),
+            "session_ver_instructor_idx": models.ClassSession.objects.filter(
+                timetable=self.timetable, version=self.timetable.active_version, instructor=self.professor
+            ),
+            "session_ver_room_idx": models.ClassSession.objects.filter(
+                timetable=self.timetable, version=self.timetable.active_version, room=self.room
+            ),
+            "prof_avail_day_start_idx": models.ProfessorAvailability.objects.filter(professor=self.professor, day_of_week=2),
+            "room_avail_day_start_idx": models.RoomAvailability.objects.filter(room=self.room, day_of_week=2),
+        }
+
+    def test_session_lookups_use_version_indexes(self):
+        live = models.ClassSession.objects.filter(timetable_id=self.timetable.id).live()
+        self.assertIn("USING INDEX session_ver_section_idx (timetable_id=? AND version=? AND section=?)",
+                      _plan(live.filter(section="S3")))
+        # /sections: DISTINCT section of the live version, answered from the index alone
+        self.assertIn("USING COVERING INDEX session_ver_section_idx (timetable_id=? AND version=?)",
+                      _plan(live.values_list("section", flat=True).distinct()))
+        # /data and /statistics: every live session of one timetable
+        data = live.select_related("course", "slot", "room", "instructor").order_by("slot__day_of_week", "slot__start_time")
+        plan = _plan(data)
+        self.assertRegex(plan, LIVE_SESSIONS_SEARCH)
+        self.assertNotIn("SCAN api_classsession", plan)
+
+    def test_availability_lookups_use_owner_day_indexes(self):
+        plans = self.queries()
+        self.assertIn("USING INDEX prof_avail_day_start_idx (professor_id=? AND day_of_week=?)",
+                      _plan(plans["prof_avail_day_start_idx"]))
+        self.assertIn("USING INDEX room_avail_day_start_idx (room_id=? AND day_of_week=?)",
+                      _plan(plans["room_avail_day_start_idx"]))
+        # Meta.ordering (owner, day, start) is read in index order, without a sort
+        for model, index in ((models.ProfessorAvailability, "prof_avail_day_start_idx"),
+                             (models.RoomAvailability, "room_avail_day_start_idx")):
+            plan = _plan(model.objects.all())
+            self.assertIn(f"USING INDEX {index}", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_solver_loads_use_slot_and_room_indexes(self):
+        plan = _plan(models.Slot.objects.order_by("day_of_week", "start_time"))
+        self.assertIn("USING INDEX slot_day_start_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        plan = _plan(models.Room.objects.filter(room_type=models.RoomType.LAB).order_by("capacity"))
+        self.assertIn("USING INDEX room_type_capacity_idx (room_type=?)", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_latency_with_and_without_indexes(self):
+        for index, queryset in self.queries().items():
+            indexed = _best_of(queryset)
+            # DDL is transactional on SQLite: the test's rollback restores the index
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP INDEX {index}")
+            self.assertNotIn(index, _plan(queryset))
+            unindexed = _best_of(queryset)
+            if index.startswith("session_"):
+                # Without it only the timetable FK index is left: every version and section is read
+                self.assertLess(indexed, unindexed, index)
+
+
+class RollbackViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        course = models.Course.objects.create(code="C1", name="C1")
+        slot = models.Slot.objects.create(code="S1", day_of_week=0, start_time=clock(9), end_time=clock(9, 50))
+        room = models.Room.objects.create(code="R1", name="R1", capacity=40)
+        professor = models.Professor.objects.create(name="P1", email="p1@example.edu")
+        cls.timetable = models.Timetable.objects.create(name="T", active_version=2)
+        models.ClassSession.objects.bulk_create(
+            [
+                models.ClassSession(timetable=cls.timetable, version=v, course=course, slot=slot, room=room,
+                                    instructor=professor, section="A")
+                for v in (1, 2)
+            ]
+        )
+        cls.url = f"/api/timetables/{cls.timetable.id}/rollback/"
+
+    def test_rejects_malformed_version(self):
+        for version in ("two", "", 0, -1, [1]):
+            response = self.client.post(self.url, {"version": version}, format="json")
+            self.assertEqual(response.status_code, 400, version)
+            self.assertIn("version", response.data["error"])
+
+    def test_unknown_version_is_not_found(self):
+        response = self.client.post(self.url, {"version": 7}, format="json")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data["versions"], [2, 1])
+
+    def test_rolls_back_to_named_and_previous_version(self):
+        response = self.client.post(self.url, {"version": "1"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["version"], response.data["previous_version"]), (1, 2))
+        # Nothing older than version 1 is kept
+        self.assertEqual(self.client.post(self.url, {}, format="json").status_code, 400)
+
+
+@override_settings(TIMETABLE_LOCK_DIR=tempfile.mkdtemp(prefix="locks-"), TIMETABLE_RUN_WAIT_SECONDS=0.5)
+class CoalescingTests(TestCase):
+    OPTIONS = {"ordering": "most_constrained", "starts": 4, "budget": 10.0, "trace": False}
+
+    def setUp(self):
+        self.timetable = models.Timetable.objects.create(name="T")
+        # Stands in for another worker's run in progress
+        self.handle = locks._try_lock(self.timetable.pk)
+        self.addCleanup(locks._unlock, self.handle)
+        self.run = models.TimetableRun.objects.create(timetable=self.timetable, operation="generate", options=self.OPTIONS)
+
+    def coalesce(self, options):
+        return locks.run_coalesced(self.timetable, "generate", lambda timetable: self.fail("ran a second solve"), options)
+
+    def test_attaches_only_to_identical_options(self):
+        # Attached, then gave up waiting on that run
+        self.assertEqual(self.coalesce(dict(self.OPTIONS))["run_id"], self.run.id)
+        # Different parameters wait for the lock instead of taking another request's result
+        result = self.coalesce(dict(self.OPTIONS, starts=1))
+        self.assertEqual(result["status"], "busy")
+        self.assertNotIn("run_id", result)
+
+    def test_failed_run_is_raised_to_waiters(self):
+        self.run.status = models.RunStatus.FAILED
+        self.run.result = {"status": "error", "message": "boom"}
+        self.run.save()
+        self.run.status = models.RunStatus.RUNNING
+        with self.assertRaises(locks.RunFailed) as raised:
+            locks._await_run(self.run, time.monotonic() + 1)
+        self.assertEqual(raised.exception.result["message"], "boom")
+
+
+def _class_problem(courses, slots, rooms, labs=(), sections=("A",), section_sizes=(30,), core_courses=(),
+                   practical_blocks=None, professor_availability=None, room_availability=None):
+    """A compiled class problem (see solver.compile_class_problem) built by hand.
+
+    ``slots`` are (id, day, "HH:MM", "HH:MM"); professors and rooms are
+    available all day, every day unless windows are given for them.
+    """
+    def minute(text):
+        hours, mins = text.split(":")
+        return int(hours) * 60 + int(mins)
+
+    slots = [(sid, day, minute(start), minute(end)) for sid, day, start, end in slots]
+    days = sorted({s[1] for s in slots})
+    professors = sorted({p for c in courses for p in c[2]})
+    return {
+        "courses": list(courses),
+        "slots": slots,
+        "rooms": list(rooms),
+        "labs": list(labs),
+        "mess_hours": [],
+        "practical_blocks": practical_blocks or [1] * len(courses),
+        "sections": list(sections),
+        "section_sizes": list(section_sizes),
+        "enrollment_counts": [],
+        "core_courses": sorted(core_courses),
+        "professor_availability": professor_availability
+        if professor_availability is not None else [(p, d, 0, 24 * 60) for p in professors for d in days],
+        "room_availability": room_availability
+        if room_availability is not None else [(r[0], d, 0, 24 * 60) for r in list(rooms) + list(labs) for d in days],
+    }
+
+
+class RoomMatchingTests(SimpleTestCase):
+    def test_min_waste_assignment_matches_brute_force(self):
+        rnd = random.Random(0)
+        for _ in range(200):
+            n = rnd.randint(1, 5)
+            m = rnd.randint(n, 6)
+            costs = [[rnd.choice([rnd.randint(0, 90), solver._UNUSABLE]) for _ in range(m)] for _ in range(n)]
+            # As in the solver, where the tentative rooms already seat everyone: some finite assignment exists
+            for i, j in enumerate(rnd.sample(range(m), n)):
+                costs[i][j] = rnd.randint(0, 90)
+            assignment = solver._min_waste_assignment(costs)
+            self.assertEqual(len(set(assignment)), n)
+            best = min(sum(costs[i][j] for i, j in enumerate(cols)) for cols in itertools.permutations(range(m), n))
+            self.assertEqual(sum(costs[i][j] for i, j in enumerate(assignment)), best, costs)
+
+    def test_augmenting_path_frees_the_large_room(self):
+        # One slot; the small section comes first and takes the first room that seats it, the hall
+        problem = _class_problem(
+            courses=[(1, "TUT", [10], 1, 0, 0), (2, "LEC", [20], 1, 0, 0)],
+            slots=[(1, 0, "09:00", "09:50")],
+            rooms=[(100, 120), (101, 30)],
+            sections=("A", "B"),
+            section_sizes=(30, 110),
+            core_courses=[(0, 0), (1, 1)],
+        )
+        result = solver.solve_class_problem(problem, ordering=solver.ORDER_INPUT)
+        self.assertEqual(result["conflicts"], [])
+        rooms = {(ci, si): ri for ci, si, _, ri, _, _ in result["placements"]}
+        # The tutorial was moved to the small room so the lecture could have the hall
+        self.assertEqual(rooms, {(0, 0): 1, (1, 1): 0})
+        self.assertEqual((result["seats_used"], result["seats_offered"]), (140, 150))
+
+    def test_rooms_are_reassigned_to_waste_fewest_seats(self):
+        problem = _class_problem(
+            courses=[(1, "A1", [10], 1, 0, 0), (2, "B1", [20], 1, 0, 0)],
+            slots=[(1, 0, "09:00", "09:50")],
+            rooms=[(100, 200), (101, 60), (102, 40)],
+            sections=("A", "B"),
+            section_sizes=(35, 55),
+            core_courses=[(0, 0), (1, 1)],
+        )
+        result = solver.solve_class_problem(problem, ordering=solver.ORDER_INPUT)
+        self.assertEqual(sorted(ri for _, _, _, ri, _, _ in result["placements"]), [1, 2])
+        self.assertEqual(result["seats_offered"], 100)
+
+
+class OrderingTests(SimpleTestCase):
+    def test_most_constrained_places_the_narrow_instructor_first(self):
+        # Professor 10 can only teach Monday 9:00, the first slot anyone would take
+        problem = _class_problem(
+            courses=[(1, "WIDE", [20], 1, 0, 0), (2, "NARROW", [10], 1, 0, 0)],
+            slots=[(1, 0, "09:00", "09:50"), (2, 0, "10:00", "10:50"), (3, 1, "09:00", "09:50")],
+            rooms=[(100, 60)],
+            professor_availability=[(10, 0, 9 * 60, 10 * 60)] + [(20, d, 0, 24 * 60) for d in (0, 1)],
+        )
+        loose = solver.solve_class_problem(problem, ordering=solver.ORDER_INPUT)
+        self.assertEqual(loose["conflicts"], ["Could not place 1 lecture(s) for NARROW section A"])
+
+        result = solver.solve_class_problem(problem, ordering=solver.ORDER_MOST_CONSTRAINED)
+        self.assertEqual(result["conflicts"], [])
+        self.assertEqual(sorted((ci, ti) for ci, _, ti, _, _, _ in result["placements"]), [(0, 1), (1, 0)])
+        self.assertEqual(result["ordering"]["rule"], solver.ORDER_MOST_CONSTRAINED)
+        self.assertEqual(result["ordering"]["tightest"][0]["course"], "NARROW")
+
+    def test_seeded_runs_are_reproducible(self):
+        rnd = random.Random(3)
+        problem = _class_problem(
+            courses=[(i, f"C{i}", [rnd.randrange(6)], rnd.choice([2, 3]), rnd.choice([0, 1]), rnd.choice([0, 0, 2]))
+                     for i in range(14)],
+            slots=[(d * 10 + h, d, f"{9 + h:02d}:00", f"{9 + h:02d}:50") for d in range(5) for h in range(4)],
+            rooms=[(100 + i, rnd.choice([40, 60, 90])) for i in range(3)],
+            labs=[(200, 60), (201, 40)],
+            sections=("A", "B", "C"),
+            section_sizes=(35, 50, 55),
+        )
+        for ordering in solver.ORDERINGS:
+            runs = {seed: solver.solve_class_problem(problem, ordering=ordering, seed=seed) for seed in range(1, 6)}
+            again = solver.solve_class_problem(problem, ordering=ordering, seed=3)
+            self.assertEqual(again, runs[3], ordering)
+            # Different seeds are different starts for the portfolio
+            self.assertGreater(len({tuple(run["placements"]) for run in runs.values()}), 1, ordering)
+            self.assertEqual(solver.solve_class_problem(problem, ordering=ordering),
+                             solver.solve_class_problem(problem, ordering=ordering))
+
+
+class PracticalBlockTests(SimpleTestCase):
+    # Monday: 9:00, 10:00, then 11:30 after a long break; 16:00 and 17:00 end the day.
+    # Tuesday: 8:00, 9:00, 10:00 is the only run of three.
+    SLOTS = [
+        (1, 0, "09:00", "09:50"), (2, 0, "10:00", "10:50"), (3, 0, "11:30", "12:20"),
+        (4, 0, "16:00", "16:50"), (5, 0, "17:00", "17:50"),
+        (6, 1, "08:00", "08:50"), (7, 1, "09:00", "09:50"), (8, 1, "10:00", "10:50"),
+    ]
+
+    def solve(self, block, hours=None, **kwargs):
+        problem = _class_problem(
+            courses=[(1, "LAB", [10], 0, 0, hours or block)],
+            slots=self.SLOTS,
+            rooms=[(100, 60)],
+            labs=[(200, 60), (201, 60)],
+            practical_blocks=[block],
+            **kwargs,
+        )
+        return solver.ClassModel(problem), solver.solve_class_problem(problem)
+
+    def assertContiguous(self, model, result, block):
+        placements = result["placements"]
+        for nodes in result["blocks"]:
+            self.assertEqual(len(nodes), block)
+            slots = [placements[n][2] for n in nodes]
+            self.assertEqual(len({placements[n][3] for n in nodes}), 1, "one lab for the whole block")
+            self.assertTrue(all(model.slot_day[ti] == model.slot_day[slots[0]] for ti in slots))
+            for ti, tj in zip(slots, slots[1:]):
+                self.assertEqual(model.slot_next[ti], tj)
+                self.assertLessEqual(model.slot_start[tj] - model.slot_end[ti], solver.MIN_BREAK_MINUTES)
+
+    def test_block_never_spans_a_break_or_a_day(self):
+        model, result = self.solve(3)
+        self.assertEqual(result["conflicts"], [])
+        self.assertEqual(len(result["blocks"]), 1)
+        self.assertContiguous(model, result, 3)
+        self.assertEqual([result["placements"][n][2] for n in result["blocks"][0]], [5, 6, 7])
+        self.assertTrue(all(p[3] >= model.n_classrooms and p[5] == solver.PRACTICAL for p in result["placements"]))
+
+    def test_block_takes_one_lab_free_for_all_its_slots(self):
+        # The first lab is closed on Tuesday from 9:00, so only the second can hold 8:00-10:50
+        rooms = [(100, d, 0, 24 * 60) for d in (0, 1)] + [(201, d, 0, 24 * 60) for d in (0, 1)]
+        rooms += [(200, 0, 0, 24 * 60), (200, 1, 0, 9 * 60)]
+        model, result = self.solve(3, room_availability=rooms)
+        self.assertEqual(result["conflicts"], [])
+        self.assertContiguous(model, result, 3)
+        self.assertEqual({result["placements"][n][3] for n in result["blocks"][0]}, {model.room_index[201]})
+
+    def test_hours_split_into_blocks_and_longer_blocks_stay_unplaced(self):
+        model, result = self.solve(2, hours=4)
+        self.assertEqual(result["conflicts"], [])
+        self.assertEqual(len(result["blocks"]), 2)
+        self.assertContiguous(model, result, 2)
+
+        _, result = self.solve(4)
+        self.assertEqual((result["placements"], result["blocks"]), ([], []))
+        self.assertEqual(result["conflicts"], ["Could not place 4 practical(s) for LAB section A"])
+
+
+class SectionDemandTests(SimpleTestCase):
+    PROBLEM = _class_problem(
+        courses=[(1, "C1", [10], 2, 0, 0), (2, "C2", [10], 2, 0, 0), (3, "C3", [10], 2, 0, 0)],
+        slots=[(1, 0, "09:00", "09:50")],
+        rooms=[(100, 60)],
+        sections=("A", "B"),
+        section_sizes=(30, 25),
+    )
+
+    def test_only_enrolled_and_core_course_sections_are_scheduled(self):
+        # C1 is taken by 12 students of A, C2 is core for both sections (5 of B also enrolled), C3 by nobody
+        problem = dict(self.PROBLEM, enrollment_counts=[(0, 0, 12), (1, 1, 5)], core_courses=[(1, 0), (1, 1)])
+        self.assertEqual(solver.section_demand(problem), {(0, 0): 12, (1, 0): 30, (1, 1): 25})
+
+    def test_core_courses_alone_are_kept_for_every_section(self):
+        problem = dict(self.PROBLEM, core_courses=[(2, 0), (2, 1)])
+        self.assertEqual(solver.section_demand(problem), {(2, 0): 30, (2, 1): 25})
+
+    def test_every_section_takes_every_course_without_enrollments_or_core_courses(self):
+        self.assertEqual(
+            solver.section_demand(self.PROBLEM),
+            {(ci, si): (30, 25)[si] for ci in range(3) for si in range(2)},
+        )
+
+
+class _Stall:
+    """Unpickles by sleeping, so a spawned worker handed a problem holding one never starts solving"""
+
+    def __reduce__(self):
+        return time.sleep, (30,)
+
+
+def _two_day_timetable() -> models.Timetable:
+    """One two-lecture course, one professor and one room, all available at the single slot of two days"""
+    professor = models.Professor.objects.create(name="P", email="p@example.edu")
+    course = models.Course.objects.create(code="C1", name="C1", lecture_hours=2)
+    course.instructors.add(professor)
+    room = models.Room.objects.create(code="R1", name="R1", capacity=60)
+    for day in range(2):
+        models.Slot.objects.create(code=f"S{day}", day_of_week=day, start_time=clock(9), end_time=clock(9, 50))
+        models.ProfessorAvailability.objects.create(professor=professor, day_of_week=day, start_time=clock(8),
+                                                    end_time=clock(18))
+        models.RoomAvailability.objects.create(room=room, day_of_week=day, start_time=clock(8), end_time=clock(18))
+    return models.Timetable.objects.create(name="T")
+
+
+class PortfolioTests(TestCase):
+    PROBLEM = _class_problem(
+        courses=[(1, "C1", [10], 2, 1, 0), (2, "C2", [20], 2, 0, 0)],
+        slots=[(d * 10 + h, d, f"{9 + h:02d}:00", f"{9 + h:02d}:50") for d in range(3) for h in range(3)],
+        rooms=[(100, 60), (101, 40)],
+    )
+
+    def test_keeps_the_best_start(self):
+        best, options, report = portfolio.run(self.PROBLEM, 3, 30, solver.ORDER_MOST_CONSTRAINED, workers=2)
+        self.assertEqual(best, solver.solve_class_problem(self.PROBLEM, **options))
+        self.assertEqual(report["best"]["score"]["unplaced"], 0)
+        # The first start placed everything, so the run stopped early or ran out of starts
+        self.assertIn(report["stopped"], ("complete", "exhausted"))
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_budget_bounds_every_start_and_stops_the_workers(self):
+        started = time.monotonic()
+        problem = dict(self.PROBLEM, stall=_Stall())
+        best, options, report = portfolio.run(problem, 2, 0.5, solver.ORDER_MOST_CONSTRAINED, workers=2)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual((best, options, report["stopped"], report["finished"]), (None, None, "budget", 0))
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_generate_solves_outside_the_write_transaction(self):
+        problem_cache.clear()
+        self.addCleanup(problem_cache.clear)
+        timetable = _two_day_timetable()
+        depth = len(connection.atomic_blocks)
+        solved_in = []
+
+        def run(*args, **kwargs):
+            solved_in.append(len(connection.atomic_blocks))
+            return portfolio_run(*args, **kwargs)
+
+        portfolio_run = portfolio.run
+        with mock.patch.object(portfolio, "run", run):
+            result = services.generate_class_timetable(timetable, starts=2, budget=30)
+        self.assertEqual(solved_in, [depth])
+        self.assertEqual((result["status"], result["created_sessions"]), ("success", 2))
+
+        def stalled_run(problem, *args, **kwargs):
+            return portfolio_run(dict(problem, stall=_Stall()), *args, **kwargs)
+
+        with mock.patch.object(portfolio, "run", stalled_run):
+            result = services.generate_class_timetable(timetable, starts=2, budget=0.5)
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(result["portfolio"]["stopped"], "budget")
+
+
+CONFLICT = re.compile(r"Could not place \d+ \w+\(s\) for (?P<course>\S+) section (?P<section>\S+)|No instructors for course (?P<bare>\S+)")
+
+
+def _random_class_problem(rnd):
+    """A small class problem with uneven breaks between slots, partial availability, labs and blocks"""
+    slots, start = [], {}
+    for day in range(rnd.randint(2, 4)):
+        start[day] = 8 * 60
+        for _ in range(rnd.randint(3, 6)):
+            slots.append((len(slots), day, start[day], start[day] + 50))
+            start[day] += 50 + rnd.choice([0, 10, 10, 20, 40])
+    days = list(start)
+    courses = [
+        (i, f"C{i}", [rnd.randint(1, 4)] if rnd.random() > 0.02 else [], rnd.randint(0, 2), rnd.randint(0, 1),
+         rnd.choice([0, 0, 0, 2, 3]))
+        for i in range(rnd.randint(2, 6))
+    ]
+    rooms = [(100 + i, rnd.choice([30, 40, 60, 90])) for i in range(rnd.randint(1, 3))]
+    labs = [(200 + i, rnd.choice([30, 40, 60])) for i in range(rnd.randint(0, 2))]
+
+    def windows(owners):
+        return [(owner, day, 8 * 60 + rnd.choice([0, 0, 60, 120]), 8 * 60 + rnd.choice([240, 600, 600]))
+                for owner in owners for day in days if rnd.random() < 0.9]
+
+    sections = ["A", "B"][:rnd.randint(1, 2)]
+    return {
+        "courses": courses,
+        "slots": slots,
+        "rooms": rooms,
+        "labs": labs,
+        "mess_hours": [(day, 12 * 60, 13 * 60) for day in days if rnd.random() < 0.3],
+        "practical_blocks": [rnd.choice([1, 1, 2, 3]) for _ in courses],
+        "sections": sections,
+        "section_sizes": [rnd.choice([20, 30, 45]) for _ in sections],
+        "enrollment_counts": [],
+        "core_courses": [],
+        "professor_availability": windows(range(1, 5)),
+        "room_availability": windows([r[0] for r in rooms + labs]),
+    }
+
+
+class FeasibilityTests(SimpleTestCase):
+    def test_never_reports_what_the_solver_places(self):
+        outcomes = set()
+        for seed in range(300):
+            problem = _random_class_problem(random.Random(seed))
+            report = feasibility.check(problem)
+            runs = [solver.solve_class_problem(problem, ordering=ordering, seed=s)
+                    for ordering in solver.ORDERINGS for s in (None, 1)]
+            if any(not run["conflicts"] for run in runs):
+                self.assertTrue(report["feasible"], (seed, report["infeasible"]))
+            for run in runs:
+                failed = {(m["course"] or m["bare"], m["section"]) for m in map(CONFLICT.match, run["conflicts"])}
+                for row in report["infeasible"]:
+                    if row["scope"] == "course_section":
+                        self.assertTrue({(row["course"], row["section"]), (row["course"], None)} & failed, (seed, row))
+            outcomes.add(report["feasible"])
+        self.assertEqual(outcomes, {True, False})
+
+    def test_section_overload_is_a_bottleneck_not_infeasible(self):
+        # Three one-lecture courses, three professors, three rooms, two slots: the solver places all
+        # three sessions, two of them at the same time for the one section
+        problem = _class_problem(
+            courses=[(i, f"C{i}", [10 + i], 1, 0, 0) for i in range(3)],
+            slots=[(1, 0, "09:00", "09:50"), (2, 0, "10:00", "10:50")],
+            rooms=[(100 + i, 60) for i in range(3)],
+        )
+        self.assertEqual(solver.solve_class_problem(problem)["conflicts"], [])
+        report = feasibility.check(problem)
+        self.assertTrue(report["feasible"], report["infeasible"])
+        section = next(row for row in report["bottlenecks"] if row["scope"] == "section")
+        self.assertEqual((section["demand"], section["supply"], section["load"]), (3, 2, 1.5))
+
+
+class ProblemCacheVersionTests(TestCase):
+    def versions(self):
+        return dict(models.DataVersion.objects.values_list("name", "version"))
+
+    def test_every_counter_exists_after_migrate(self):
+        self.assertLessEqual(set(problem_cache.NAMES), set(self.versions()))
+
+    def test_a_transaction_bumps_each_counter_once_on_commit(self):
+        # Bulk writes send no signals: the test's own transaction starts without a pending record
+        [course] = models.Course.objects.bulk_create([models.Course(code="C1", name="C1")])
+        students = models.Student.objects.bulk_create(
+            [models.Student(roll_number=f"R{i}", name=f"S{i}", batch="2026", section="A") for i in range(50)]
+        )
+        models.Enrollment.objects.bulk_create([models.Enrollment(student=s, course=course) for s in students])
+        before = self.versions()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+                models.Enrollment.objects.filter(course=course).delete()
+                course.delete()
+        bumps = [q["sql"] for q in queries if "api_dataversion" in q["sql"]]
+        self.assertEqual((len(callbacks), bumps), (1, []))
+        after = self.versions()
+        self.assertEqual((after["enrollment"], after["course"]), (before["enrollment"] + 1, before["course"] + 1))
+        self.assertEqual(after["student"], before["student"])
+
+    def test_rolled_back_write_bumps_nothing(self):
+        before = self.versions()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                models.Room.objects.create(code="R1", name="R1", capacity=40)
+                raise RuntimeError
+            # A later write in the same outer transaction starts a new record
+            models.Slot.objects.create(code="S1", day_of_week=0, start_time=clock(9), end_time=clock(9, 50))
+        self.assertEqual(len(callbacks), 1)
+        after = self.versions()
+        self.assertEqual((after["room"], after["slot"]), (before["room"], before["slot"] + 1))
+
+
+class ConflictCheckTests(TestCase):
+    def setUp(self):
+        problem_cache.clear()
+        self.addCleanup(problem_cache.clear)
+        self.professor = models.Professor.objects.create(name="P", email="p@example.edu")
+        self.room = models.Room.objects.create(code="R1", name="R1", capacity=40)
+        self.timetable = models.Timetable.objects.create(name="T")
+
+    def schedule(self, code, start, end):
+        course = models.Course.objects.create(code=code, name=code, lecture_hours=1)
+        slot = models.Slot.objects.create(code=code, day_of_week=0, start_time=start, end_time=end)
+        models.ClassSession.objects.create(timetable=self.timetable, course=course, slot=slot, room=self.room,
+                                           instructor=self.professor, section="A")
+
+    def test_same_day_sessions_closer_than_the_break(self):
+        self.schedule("C1", clock(9), clock(9, 50))
+        self.schedule("C2", clock(9, 55), clock(10, 45))
+        result = services.check_timetable_conflicts(self.timetable.id)
+        self.assertEqual(result["status"], "conflicts_found")
+        self.assertEqual(
+            result["conflicts"],
+            [
+                {
+                    "type": "insufficient_break",
+                    "instructor": "P",
+                    "day": "Mon",
+                    "break_time": f"Less than {solver.MIN_BREAK_MINUTES} minutes",
+                    "courses": ["C1", "C2"],
+                }
+            ],
+        )
+
+    def test_same_day_sessions_with_a_break(self):
+        self.schedule("C1", clock(9), clock(9, 50))
+        self.schedule("C2", solver.clock(9 * 60 + 50 + solver.MIN_BREAK_MINUTES), clock(11, 30))
+        result = services.check_timetable_conflicts(self.timetable.id)
+        self.assertEqual((result["conflict_count"], result["status"]), (0, "no_conflicts"))
+
+
+class OptimizeTests(TestCase):
+    def setUp(self):
+        problem_cache.clear()
+        self.addCleanup(problem_cache.clear)
+
+    def test_no_schedulable_problem(self):
+        # Sessions held in a lab while no classroom is left: the class problem does not compile
+        lab = models.Room.objects.create(code="L1", name="L1", capacity=40, room_type=models.RoomType.LAB)
+        slot = models.Slot.objects.create(code="S1", day_of_week=0, start_time=clock(9), end_time=clock(9, 50))
+        course = models.Course.objects.create(code="C1", name="C1", practical_hours=1)
+        professor = models.Professor.objects.create(name="P", email="p@example.edu")
+        timetable = models.Timetable.objects.create(name="T")
+        models.ClassSession.objects.create(timetable=timetable, course=course, slot=slot, room=lab, instructor=professor,
+                                           section="A", is_practical=True)
+        self.assertIsNone(services._load_class_model())
+        self.assertEqual(services.optimize_timetable(timetable), {"message": "No sessions to optimize", "optimizations": 0})
+
+
+def _csv(text: str) -> io.BytesIO:
+    return io.BytesIO(textwrap.dedent(text).lstrip().encode())
+
+
+class DryRunImportTests(TestCase):
+    STUDENTS = """\
+        roll_number,name,program,batch,section
+        R1,A,CS,2026,A
+        R2,B,CS,2026,A
+        R1,A2,CS,2026,A
+        R0,New,CS,2026,A
+        R2,B,CS,2026,A
+        R3,C,CS,2026,A
+        R3,C,CS,2026,A
+        R3,C2,CS,2026,B
+    """
+
+    def setUp(self):
+        models.Student.objects.create(roll_number="R0", name="Old", program="CS", batch="2026", section="A")
+
+    def import_students(self, dry_run):
+        with mock.patch.object(imports, "VALIDATION_WORKERS", 1):
+            stats = imports.run_import(
+                _csv(self.STUDENTS),
+                models.Student,
+                key_fields=["roll_number"],
+                update_fields=["name", "program", "batch", "section"],
+                parse_row=dict,
+                chunk_size=2,
+                dry_run=dry_run,
+            )
+        return {k: stats[k] for k in ("rows", "created", "updated", "unchanged", "duplicates", "skipped")}
+
+    def test_counts_match_a_real_run(self):
+        projected = self.import_students(dry_run=True)
+        self.assertEqual(list(models.Student.objects.values_list("roll_number", "name")), [("R0", "Old")])
+        # Rows of earlier chunks are updates or unchanged, not duplicates; only the repeat inside the last chunk is
+        expected = {"rows": 8, "created": 3, "updated": 3, "unchanged": 1, "duplicates": 1, "skipped": 0}
+        self.assertEqual(projected, expected)
+        self.assertEqual(self.import_students(dry_run=False), expected)
+        self.assertEqual(
+            dict(models.Student.objects.values_list("roll_number", "name")), {"R0": "New", "R1": "A2", "R2": "B", "R3": "C2"}
+        )
+
+
+class CSVImportTests(APITestCase):
+    def setUp(self):
+        patcher = mock.patch.object(imports, "VALIDATION_WORKERS", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, action, text, **params):
+        query = "&".join(f"{name}={value}" for name, value in params.items())
+        upload = SimpleUploadedFile("import.csv", textwrap.dedent(text).lstrip().encode())
+        response = self.client.post(f"/api/csv/{action}/?{query}", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def counts(self, result):
+        return tuple(result[name] for name in ("created", "updated", "unchanged", "duplicates", "skipped"))
+
+    def test_students_counts_and_error_report(self):
+        models.Student.objects.create(roll_number="R1", name="Old", program="CS", batch="2026", section="A")
+        models.Student.objects.create(roll_number="R2", name="Same", program="CS", batch="2026", section="A")
+        result = self.post(
+            "students",
+            """\
+            roll_number,name,program,batch,section
+            R1,New,CS,2026,A
+            R2,Same,CS,2026,A
+            R3,Fresh,CS,2026,B
+            R4,,CS,2026,B
+            R3,Fresh,CS,2026,C
+            """,
+        )
+        self.assertEqual(self.counts(result), (1, 1, 1, 1, 1))
+        self.assertEqual(result["rows"], 5)
+        self.assertEqual(
+            (result["error_count"], result["errors"], result["errors_truncated"]),
+            (1, [{"line": 5, "detail": "name: This field cannot be blank."}], False),
+        )
+        self.assertEqual(
+            dict(models.Student.objects.values_list("roll_number", "section")), {"R1": "A", "R2": "A", "R3": "C"}
+        )
+        self.assertEqual(models.Student.objects.get(roll_number="R1").name, "New")
+
+    def test_row_inserted_since_the_diff_is_updated(self):
+        models.Professor.objects.create(name="Old", email="p@example.edu", department="Maths")
+        # The diff query misses the existing row, as if it was inserted concurrently
+        with mock.patch.object(models.Professor.objects, "filter", return_value=models.Professor.objects.none()):
+            result = self.post("professors", "name,email,department\nNew,p@example.edu,Physics\n")
+        self.assertEqual(self.counts(result), (1, 0, 0, 0, 0))
+        self.assertEqual(
+            list(models.Professor.objects.values_list("name", "email", "department")),
+            [("New", "p@example.edu", "Physics")],
+        )
+
+    def test_courses_link_instructors_and_availability_resolves_references(self):
+        p1 = models.Professor.objects.create(name="P1", email="p1@example.edu")
+        p2 = models.Professor.objects.create(name="P2", email="p2@example.edu")
+        room = models.Room.objects.create(code="R1", name="R1", capacity=40)
+        header = "code,name,lecture_hours,tutorial_hours,practical_hours,self_study_hours,credits,instructors\n"
+        rows = 'C1,One,3,1,0,4,4,"p1@example.edu,p2@example.edu"\nC2,Two,2,0,0,2,2,nobody@example.edu\n'
+        result = self.post("courses", header + rows)
+        self.assertEqual(self.counts(result), (2, 0, 0, 0, 0))
+        self.assertEqual(
+            result["errors"], [{"line": 3, "detail": "Unknown instructor email 'nobody@example.edu' for course C2"}]
+        )
+        course = models.Course.objects.get(code="C1")
+        self.assertEqual(set(course.instructors.all()), {p1, p2})
+        self.assertEqual(course.lecture_hours, 3)
+
+        # A re-import replaces the instructor set
+        result = self.post("courses", header + "C1,One,3,1,0,4,4,p2@example.edu\n")
+        self.assertEqual(self.counts(result), (0, 0, 1, 0, 0))
+        self.assertEqual(list(course.instructors.all()), [p2])
+
+        result = self.post(
+            "professor-availability",
+            """\
+            professor_email,day_of_week,start_time,end_time
+            p1@example.edu,0,08:00,12:00
+            p1@example.edu,1,14:00,12:00
+            ghost@example.edu,0,08:00,12:00
+            """,
+        )
+        self.assertEqual(self.counts(result), (1, 0, 0, 0, 2))
+        self.assertEqual(
+            [e["detail"] for e in result["errors"]],
+            ["Unknown professor email 'ghost@example.edu'", "end_time must be after start_time"],
+        )
+        self.assertEqual(
+            list(models.ProfessorAvailability.objects.values_list("professor", "day_of_week", "start_time", "end_time")),
+            [(p1.id, 0, clock(8), clock(12))],
+        )
+
+        models.RoomAvailability.objects.create(room=room, day_of_week=0, start_time=clock(8), end_time=clock(12))
+        result = self.post(
+            "room-availability", "room_code,day_of_week,start_time,end_time\nR1,0,09:00,17:00\nR1,1,08:00,18:00\n"
+        )
+        self.assertEqual(self.counts(result), (1, 1, 0, 0, 0))
+        self.assertEqual(
+            list(models.RoomAvailability.objects.values_list("day_of_week", "start_time", "end_time")),
+            [(0, clock(9), clock(17)), (1, clock(8), clock(18))],
+        )
+
+    def test_enrollments_replace_and_ignore_conflicts(self):
+        students = [
+            models.Student.objects.create(roll_number=f"R{i}", name=f"S{i}", batch="2026", section="A") for i in range(3)
+        ]
+        c1, c2, c3 = [models.Course.objects.create(code=f"C{i}", name=f"C{i}") for i in (1, 2, 3)]
+        for student in students:
+            models.Enrollment.objects.create(student=student, course=c1)
+            models.Enrollment.objects.create(student=student, course=c3)
+
+        result = self.post("enrollments", "roll_number,course_code\nR0,C1\nR1,C2\nR9,C2\n", replace="true")
+        self.assertEqual(self.counts(result), (2, 0, 0, 0, 1))
+        self.assertEqual((result["replaced_courses"], result["deleted"]), (2, 3))
+        self.assertEqual(result["errors"], [{"line": 4, "detail": "Unknown student roll number 'R9'"}])
+        enrolled = set(models.Enrollment.objects.values_list("student__roll_number", "course__code"))
+        # C3 is not in the file, so its roster is kept
+        self.assertEqual(enrolled, {("R0", "C1"), ("R1", "C2"), ("R0", "C3"), ("R1", "C3"), ("R2", "C3")})
+
+        # The diff query misses an existing pair, as if it was inserted concurrently
+        with mock.patch.object(models.Enrollment.objects, "filter", return_value=models.Enrollment.objects.none()):
+            result = self.post("enrollments", "roll_number,course_code\nR0,C1\nR2,C1\n")
+        self.assertEqual(self.counts(result), (2, 0, 0, 0, 0))
+        self.assertEqual(models.Enrollment.objects.filter(course=c1).count(), 2)
+
+    def test_dry_run_writes_nothing_and_matches_a_real_run(self):
+        models.Room.objects.create(code="R1", name="Old", capacity=40)
+        text = """\
+            code,name,building,capacity,room_type
+            R1,Hall,Main,60,CLASSROOM
+            R2,Lab,Main,30,LAB
+            R3,Bad,Main,-1,CLASSROOM
+            R4,Odd,Main,20,KITCHEN
+            """
+        projected = self.post("rooms", text, dry_run="true")
+        self.assertIs(projected["dry_run"], True)
+        self.assertEqual(list(models.Room.objects.values_list("code", "name", "capacity")), [("R1", "Old", 40)])
+
+        result = self.post("rooms", text)
+        self.assertNotIn("dry_run", result)
+        for name in ("rows", "created", "updated", "unchanged", "duplicates", "skipped", "error_count", "errors"):
+            self.assertEqual(projected[name], result[name], name)
+        self.assertEqual(self.counts(result), (1, 1, 0, 0, 2))
+        self.assertEqual(
+            list(models.Room.objects.order_by("code").values_list("code", "name", "capacity")),
+            [("R1", "Hall", 60), ("R2", "Lab", 30)],
+        )
+
+
+def _runs_total(metrics: str, operation: str) -> int:
+    match = re.search(rf'^scheduler_runs_total{{operation="{operation}"}} (\d+)$', metrics, re.M)
+    return int(match.group(1)) if match else 0
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        problem_cache.clear()
+        self.addCleanup(problem_cache.clear)
+
+    def metrics(self) -> str:
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_generate_returns_its_profile_and_counts_on_metrics(self):
+        timetable = _two_day_timetable()
+        before = _runs_total(self.metrics(), "generate")
+        response = self.client.post(f"/api/timetables/{timetable.id}/generate/?starts=1")
+        self.assertEqual(response.status_code, 200, response.content)
+        profile = response.json()["profile"]
+        self.assertLessEqual({"load", "compile", "persist"}, set(profile["phases"]))
+        self.assertGreater(profile["queries"], 0)
+        self.assertEqual(_runs_total(self.metrics(), "generate"), before + 1)
+
+    def test_reschedule_shares_its_profile_with_the_generate_it_runs(self):
+        timetable = _two_day_timetable()
+        services.generate_class_timetable(timetable, starts=1)
+        timetable.refresh_from_db()
+        models.ProfessorAvailability.objects.filter(day_of_week=0).delete()
+        problem_cache.clear()  # the version bump only runs on commit
+        metrics = self.metrics()
+        before = (_runs_total(metrics, "reschedule"), _runs_total(metrics, "generate"))
+        result = services.reschedule_canceled_classes(timetable)
+        self.assertEqual(result["rescheduled"], 1)
+        # One profile: the phases of the nested generate are reported by, and counted for, the reschedule
+        self.assertLessEqual({"load", "compile", "persist"}, set(result["profile"]["phases"]))
+        metrics = self.metrics()
+        self.assertEqual((_runs_total(metrics, "reschedule"), _runs_total(metrics, "generate")), (before[0] + 1, before[1]))
+
+    def test_nested_phase_time_is_not_counted_twice(self):
+        prof = profiling.Profile("generate")
+        # outer starts at 0, inner runs from 1 to 4, outer ends at 10
+        with mock.patch.object(profiling.time, "perf_counter", side_effect=[0.0, 1.0, 4.0, 10.0]):
+            with prof.phase("outer"), prof.phase("inner"):
+                pass
+        self.assertEqual(prof.phases, {"outer": 7.0, "inner": 3.0})
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        middleware.reset_route_metrics()
+        self.addCleanup(middleware.reset_route_metrics)
+        for i in range(3):
+            models.Room.objects.create(code=f"R{i}", name=f"R{i}", capacity=40)
+
+    def test_headers_and_route_histogram(self):
+        client = Client()
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get("/api/rooms/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(int(response["X-DB-Query-Count"]), len(queries))
+            self.assertGreaterEqual(float(response["X-Response-Time-Ms"]), float(response["X-DB-Time-Ms"]))
+        [row] = middleware.route_metrics()
+        self.assertEqual((row["route"], row["count"], row["queries_max"]), ("GET /api/rooms/", 2, len(queries)))
+        self.assertEqual(row["histogram_ms"]["+Inf"], 2)
+        self.assertEqual(list(row["histogram_ms"]), [*map(str, middleware.LATENCY_BUCKETS_MS), "+Inf"])
+        self.assertEqual(sorted(row["histogram_ms"].values()), list(row["histogram_ms"].values()))
+
+    def test_logs_requests_over_the_query_threshold(self):
+        # The middleware reads its thresholds when a new client's handler loads it on the first request
+        with override_settings(REQUEST_SLOW_QUERIES=0), self.assertLogs("api.middleware", "WARNING") as logs:
+            Client().get("/api/rooms/")
+        [message] = logs.output
+        self.assertIn("Slow request GET /api/rooms/ (GET /api/rooms/)", message)
+        self.assertRegex(message, r"\n  1x SELECT .*api_room")
@@ -0,0 +1,262 @@
+"""Binary solver traces: record a run, re-run it offline, compare and break down timings.
+
+A trace file is ``MAGIC`` followed by one zlib stream holding:
+
+* a length-prefixed JSON header with the operation, engine version and the
+  compiled problem the solver was given;
+* one fixed-size ``RECORD`` per decision: flags (bit 0 = accepted), reason
+  or kind code, four small indexes (course, section, slot/day, room) and
+  the nanoseconds spent since the previous decision;
+* an end marker and a length-prefixed JSON trailer with the run summary.
+"""
+import io
+import json
+import os
+import struct
+import time
+import zlib
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from . import solver
+
+MAGIC = b"TTTRACE1"
+RECORD = struct.Struct("<BBHHHHI")
+LENGTH = struct.Struct("<I")
+END_MARKER = 0xFF
+ACCEPTED = 0x01
+FLUSH_BYTES = 1 << 16
+MAX_DELTA_NS = 0xFFFFFFFF
+
+SOLVERS = {
+    "generate": solver.solve_class_problem,
+    "exam_schedule": solver.solve_exam_problem,
+}
+
+Decision = Tuple[bool, int, int, int, int, int, int]  # accepted, code, course, section, slot/day, room, ns
+
+
+class TraceWriter:
+    """Streams decisions into a trace file; pass as ``tracer`` to a solver"""
+
+    def __init__(self, fh: BinaryIO, operation: str, problem: Dict, meta: Optional[Dict] = None):
+        self.fh = fh
+        self.decisions = 0
+        self._compressor = zlib.compressobj(6)
+        self._buffer = bytearray()
+        header = {
+            "operation": operation,
+            "engine": solver.ENGINE_VERSION,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "meta": meta or {},
+            "problem": problem,
+        }
+        fh.write(MAGIC)
+        self._write_blob(header)
+        self._last = time.perf_counter_ns()
+
+    def _write_blob(self, payload: Dict) -> None:
+        data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self._buffer += LENGTH.pack(len(data))
+        self._buffer += data
+
+    def _flush(self) -> None:
+        self.fh.write(self._compressor.compress(bytes(self._buffer)))
+        self._buffer.clear()
+
+    def decision(self, accepted: bool, code: int, course: int, section: int, slot: int, room: int) -> None:
+        now = time.perf_counter_ns()
+        self._buffer += RECORD.pack(
+            ACCEPTED if accepted else 0, code, course, section, slot, room, min(now - self._last, MAX_DELTA_NS)
+        )
+        self._last = now
+        self.decisions += 1
+        if len(self._buffer) >= FLUSH_BYTES:
+            self._flush()
+
+    def close(self, summary: Optional[Dict] = None) -> None:
+        self._buffer += RECORD.pack(END_MARKER, 0, 0, 0, 0, 0, 0)
+        self._write_blob(dict(summary or {}, decisions=self.decisions))
+        self._flush()
+        self.fh.write(self._compressor.flush())
+
+
+class Trace:
+    """A decoded trace file"""
+
+    def __init__(self, header: Dict, decisions: List[Decision], summary: Dict):
+        self.header = header
+        self.decisions = decisions
+        self.summary = summary
+
+    @property
+    def operation(self) -> str:
+        return self.header["operation"]
+
+    @property
+    def problem(self) -> Dict:
+        return self.header["problem"]
+
+    @classmethod
+    def load(cls, path: str) -> "Trace":
+        with open(path, "rb") as fh:
+            return cls.parse(fh.read())
+
+    @classmethod
+    def parse(cls, raw: bytes) -> "Trace":
+        if not raw.startswith(MAGIC):
+            raise ValueError("Not a solver trace")
+        data = zlib.decompress(raw[len(MAGIC):])
+        header, offset = _read_blob(data, 0)
+        decisions: List[Decision] = []
+        while True:
+            flags, code, course, section, slot, room, ns = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            if flags == END_MARKER:
+                break
+            decisions.append((bool(flags & ACCEPTED), code, course, section, slot, room, ns))
+        summary, _ = _read_blob(data, offset)
+        return cls(header, decisions, summary)
+
+
+def _read_blob(data: bytes, offset: int) -> Tuple[Dict, int]:
+    (length,) = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    return json.loads(data[offset:offset + length]), offset + length
+
+
+def trace_path(operation: str, directory: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return os.path.join(directory, f"{operation}-{stamp}.trace")
+
+
+def summarize_result(operation: str, result: Dict) -> Dict:
+    if operation == "generate":
+        return {"placements": len(result["placements"]), "conflicts": len(result["conflicts"])}
+    return {"exams": len(result["exams"])}
+
+
+def replay(trace: Trace, save_to: Optional[str] = None) -> Tuple[Dict, Trace]:
+    """Re-run the current engine on the trace's problem; returns its result and a fresh trace"""
+    buffer = io.BytesIO()
+    options = trace.header["meta"].get("options", {})
+    meta = {"replay_of": trace.header.get("recorded_at"), "options": options}
+    writer = TraceWriter(buffer, trace.operation, trace.problem, meta)
+    started = time.perf_counter()
+    result = SOLVERS[trace.operation](trace.problem, tracer=writer, **options)
+    writer.close(dict(summarize_result(trace.operation, result), seconds=round(time.perf_counter() - started, 6)))
+    if save_to:
+        with open(save_to, "wb") as fh:
+            fh.write(buffer.getvalue())
+    return result, Trace.parse(buffer.getvalue())
+
+
+def _resolve(trace: Trace, decision: Decision) -> Tuple:
+    """Identify a decision by course code, section, slot id and room id rather than by index"""
+    _, _, course, section, slot, room, _ = decision
+    problem = trace.problem
+    if trace.operation == "generate":
+        rooms = problem["rooms"] + problem["labs"]
+        return problem["courses"][course][1], problem["sections"][section], problem["slots"][slot][0], rooms[room][0]
+    return problem["courses"][course][1], "", slot, problem["rooms"][room][0] if problem["rooms"] else None
+
+
+def _describe(trace: Trace, decision: Decision) -> str:
+    course_code, section, slot, room_id = _resolve(trace, decision)
+    if trace.operation == "generate":
+        return f"{_outcome(trace, decision)}: {course_code} section {section}, slot #{slot}, room #{room_id}"
+    return f"{_outcome(trace, decision)}: {course_code} day {slot}, room #{room_id}"
+
+
+def _outcome(trace: Trace, decision: Decision) -> str:
+    accepted, code = decision[0], decision[1]
+    if trace.operation == "generate":
+        return f"place {solver.SESSION_KINDS[code]}" if accepted else f"reject {solver.REJECT_REASONS[code]}"
+    return solver.EXAM_EVENTS[code] if accepted else f"reject {solver.EXAM_REJECT_REASONS[code]}"
+
+
+def diff(old: Trace, new: Trace) -> List[str]:
+    """Human-readable differences between the decisions of two traces of the same problem"""
+    lines = [
+        f"engines: {old.header['engine']} -> {new.header['engine']}",
+        f"decisions: {len(old.decisions)} -> {len(new.decisions)}",
+    ]
+    if old.problem != new.problem:
+        lines.append("warning: the traces were recorded on different problems")
+
+    key = lambda d: d[:6]  # noqa: E731 - ignore timings
+    first = next(
+        (i for i, (a, b) in enumerate(zip(old.decisions, new.decisions)) if key(a) != key(b)),
+        None if len(old.decisions) == len(new.decisions) else min(len(old.decisions), len(new.decisions)),
+    )
+    if first is None:
+        lines.append("decision sequences are identical")
+    else:
+        lines.append(f"first divergence at decision {first}:")
+        for label, trace in (("  old", old), ("  new", new)):
+            if first < len(trace.decisions):
+                lines.append(f"{label}: {_describe(trace, trace.decisions[first])}")
+            else:
+                lines.append(f"{label}: <end of trace>")
+
+    old_accepted = {_resolve(old, d) + (_outcome(old, d),): d for d in old.decisions if d[0]}
+    new_accepted = {_resolve(new, d) + (_outcome(new, d),): d for d in new.decisions if d[0]}
+    removed = sorted(set(old_accepted) - set(new_accepted))
+    added = sorted(set(new_accepted) - set(old_accepted))
+    lines.append(f"accepted decisions: {len(old_accepted)} -> {len(new_accepted)} (+{len(added)} / -{len(removed)})")
+    for label, changed, trace, accepted in (("  +", added, new, new_accepted), ("  -", removed, old, old_accepted)):
+        for identity in changed[:20]:
+            lines.append(f"{label} {_describe(trace, accepted[identity])}")
+
+    old_outcomes = Counter(_outcome(old, d) for d in old.decisions)
+    new_outcomes = Counter(_outcome(new, d) for d in new.decisions)
+    for outcome in sorted(set(old_outcomes) | set(new_outcomes)):
+        if old_outcomes[outcome] != new_outcomes[outcome]:
+            lines.append(f"  {outcome}: {old_outcomes[outcome]} -> {new_outcomes[outcome]}")
+
+    old_ms = sum(d[6] for d in old.decisions) / 1e6
+    new_ms = sum(d[6] for d in new.decisions) / 1e6
+    lines.append(f"search time: {old_ms:.1f} ms -> {new_ms:.1f} ms")
+    return lines
+
+
+def folded_stacks(trace: Trace) -> Dict[str, int]:
+    """Nanoseconds per operation;section;course;outcome stack, in flamegraph.pl "folded" form"""
+    problem = trace.problem
+    stacks: Dict[str, int] = defaultdict(int)
+    for decision in trace.decisions:
+        course_code = problem["courses"][decision[2]][1]
+        if trace.operation == "generate":
+            frames = (trace.operation, f"section {problem['sections'][decision[3]]}", course_code)
+        else:
+            frames = (trace.operation, course_code)
+        stacks[";".join(frames + (_outcome(trace, decision),))] += decision[6]
+    return stacks
+
+
+def breakdown(trace: Trace, top: int = 15) -> List[str]:
+    """Flame-style text summary of where search time went"""
+    total = sum(d[6] for d in trace.decisions) or 1
+    by_outcome: Dict[str, int] = defaultdict(int)
+    by_course: Dict[str, int] = defaultdict(int)
+    for stack, ns in folded_stacks(trace).items():
+        frames = stack.split(";")
+        by_outcome[frames[-1]] += ns
+        by_course[frames[-2]] += ns
+
+    def bars(title: str, rows: Iterable[Tuple[str, int]]) -> List[str]:
+        out = [title]
+        for label, ns in rows:
+            share = ns / total
+            out.append(f"  {label:<32} {ns / 1e6:9.2f} ms {share:6.1%} {'#' * max(1, round(share * 40))}")
+        return out
+
+    lines = [
+        f"{trace.operation} ({trace.header['engine']}, recorded {trace.header.get('recorded_at')}): "
+        f"{len(trace.decisions)} decisions, {total / 1e6:.2f} ms searching",
+    ]
+    lines += bars("by outcome:", sorted(by_outcome.items(), key=lambda kv: -kv[1]))
+    lines += bars(f"top {top} courses:", sorted(by_course.items(), key=lambda kv: -kv[1])[:top])
+    return lines
@@ -10,6 +10,7 @@ router.register(r'students', views.StudentViewSet)
 router.register(r'rooms', views.RoomViewSet)
 router.register(r'courses', views.CourseViewSet)
 router.register(r'enrollments', views.EnrollmentViewSet)
+router.register(r'core-courses', views.CoreCourseViewSet)
 router.register(r'professor-availability', views.ProfessorAvailabilityViewSet)
 router.register(r'room-availability', views.RoomAvailabilityViewSet)
 router.register(r'mess-hours', views.MessHoursViewSet)
@@ -31,4 +32,7 @@ urlpatterns = [
     path('csv/slots/', views.CSVImportViewSet.as_view({'post': 'import_slots'})),
     path('csv/professor-availability/', views.CSVImportViewSet.as_view({'post': 'import_professor_availability'})),
     path('csv/room-availability/', views.CSVImportViewSet.as_view({'post': 'import_room_availability'})),
+    path('csv/enrollments/', views.CSVImportViewSet.as_view({'post': 'import_enrollments'})),
+    path('csv/core-courses/', views.CSVImportViewSet.as_view({'post': 'import_core_courses'})),
+    path('request-metrics/', views.request_metrics),
 ]
\ No newline at end of file
@@ -1,13 +1,18 @@
-from io import TextIOWrapper
-import csv
-from django.db import transaction
+from functools import partial
+
+from django.conf import settings
 from django.http import HttpResponse
 from django.utils import timezone
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
-from . import models, serializers, services, calendar as cal, pdf as pdf_utils
+from . import models, serializers, services, solver, imports, locks, middleware, profiling, calendar as cal, pdf as pdf_utils
+
+
+def _wants_trace(request) -> bool:
+    return request.query_params.get("trace", "false").lower() in imports.TRUE_VALUES
 
 
 class ProfessorViewSet(viewsets.ModelViewSet):
@@ -40,6 +45,11 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.EnrollmentSerializer
 
 
+class CoreCourseViewSet(viewsets.ModelViewSet):
+    queryset = models.CoreCourse.objects.all()
+    serializer_class = serializers.CoreCourseSerializer
+
+
 class ProfessorAvailabilityViewSet(viewsets.ModelViewSet):
     queryset = models.ProfessorAvailability.objects.all()
     serializer_class = serializers.ProfessorAvailabilitySerializer
@@ -61,7 +71,7 @@ class SlotViewSet(viewsets.ModelViewSet):
 
 
 class ClassSessionViewSet(viewsets.ModelViewSet):
-    queryset = models.ClassSession.objects.all()
+    queryset = models.ClassSession.objects.live()
     serializer_class = serializers.ClassSessionSerializer
 
 
@@ -71,7 +81,7 @@ class ExamViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["post"], url_path="generate")
     def generate(self, request):
-        result = services.generate_exam_schedule()
+        result = services.generate_exam_schedule(trace=_wants_trace(request))
         return Response(result)
 
     @action(detail=True, methods=["post"], url_path="generate-seating")
@@ -102,23 +112,62 @@ class TimetableViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _run_exclusive(self, operation, fn, options=None):
+        """Run ``fn`` under the timetable lock, sharing an in-flight run of the same operation and options"""
+        timetable = self.get_object()
+        try:
+            result = locks.run_coalesced(timetable, operation, fn, options)
+        except locks.RunFailed as exc:
+            # The run's owner got a 500 from the same exception
+            return Response(exc.result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if result.get("status") == "busy":
+            return Response(result, status=status.HTTP_409_CONFLICT)
+        return Response(result)
+
     @action(detail=True, methods=["post"], url_path="generate")
     def generate(self, request, pk=None):
-        timetable = self.get_object()
-        result = services.generate_class_timetable(timetable)
+        ordering = request.query_params.get("ordering")
+        if ordering is not None and ordering not in solver.ORDERINGS:
+            return Response(
+                {"error": f"ordering must be one of: {', '.join(solver.ORDERINGS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            starts = int(request.query_params.get("starts", settings.SCHEDULER_PORTFOLIO_STARTS))
+            budget = float(request.query_params.get("budget", settings.SCHEDULER_PORTFOLIO_BUDGET_SECONDS))
+        except ValueError:
+            starts = budget = 0
+        if not 1 <= starts <= settings.SCHEDULER_PORTFOLIO_MAX_STARTS or not budget > 0:
+            return Response(
+                {"error": f"starts must be 1-{settings.SCHEDULER_PORTFOLIO_MAX_STARTS} and budget a positive number of seconds"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        trace = _wants_trace(request)
+        return self._run_exclusive(
+            "generate",
+            partial(services.generate_class_timetable, trace=trace, ordering=ordering, starts=starts, budget=budget),
+            {"ordering": ordering or settings.SCHEDULER_ORDERING, "starts": starts, "budget": budget, "trace": trace},
+        )
+
+    @action(detail=True, methods=["get"], url_path="feasibility")
+    def feasibility(self, request, pk=None):
+        """Check the input data for provably unschedulable items before generating"""
+        self.get_object()
+        result = services.check_class_feasibility()
+        if result["status"] == "error":
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
         return Response(result)
 
     @action(detail=True, methods=["post"], url_path="reschedule")
     def reschedule(self, request, pk=None):
-        timetable = self.get_object()
-        result = services.reschedule_canceled_classes(timetable)
-        return Response(result)
+        return self._run_exclusive("reschedule", services.reschedule_canceled_classes)
 
     @action(detail=True, methods=["post"], url_path="sync-calendar")
     def sync_calendar(self, request, pk=None):
         timetable = self.get_object()
         events = []
-        for s in models.ClassSession.objects.filter(timetable=timetable).select_related("course", "room", "slot"):
+        sessions = models.ClassSession.objects.filter(timetable=timetable, version=timetable.active_version)
+        for s in sessions.select_related("course", "room", "slot"):
             start_dt = timezone.make_aware(timezone.datetime.combine(timezone.now().date(), s.slot.start_time))
             end_dt = timezone.make_aware(timezone.datetime.combine(timezone.now().date(), s.slot.end_time))
             events.append({
@@ -140,7 +189,7 @@ class TimetableViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"], url_path="sections")
     def get_timetable_sections(self, request, pk=None):
         """Get all sections in a timetable"""
-        sections = models.ClassSession.objects.filter(timetable_id=pk).values_list('section', flat=True).distinct()
+        sections = models.ClassSession.objects.filter(timetable_id=pk).live().values_list('section', flat=True).distinct()
         return Response(list(sections))
 
     @action(detail=True, methods=["get"], url_path="conflicts")
@@ -152,9 +201,7 @@ class TimetableViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["post"], url_path="optimize")
     def optimize_timetable(self, request, pk=None):
         """Optimize timetable for better resource utilization"""
-        timetable = self.get_object()
-        result = services.optimize_timetable(timetable)
-        return Response(result)
+        return self._run_exclusive("optimize", services.optimize_timetable)
 
     @action(detail=True, methods=["get"], url_path="export")
     def export_timetable(self, request, pk=None):
@@ -169,9 +216,36 @@ class TimetableViewSet(viewsets.ModelViewSet):
     def clear_timetable(self, request, pk=None):
         """Clear all sessions from timetable"""
         timetable = self.get_object()
-        deleted_count = models.ClassSession.objects.filter(timetable=timetable).delete()[0]
+        deleted_count = models.ClassSession.objects.filter(
+            timetable=timetable, version=timetable.active_version
+        ).delete()[0]
         return Response({"deleted_sessions": deleted_count})
 
+    @action(detail=True, methods=["get"], url_path="versions")
+    def list_versions(self, request, pk=None):
+        """List kept generation versions of the timetable"""
+        timetable = self.get_object()
+        return Response({"active_version": timetable.active_version, "versions": services.timetable_versions(timetable)})
+
+    @action(detail=True, methods=["post"], url_path="rollback")
+    def rollback(self, request, pk=None):
+        """Serve a previously generated version again"""
+        timetable = self.get_object()
+        version = request.data.get("version")
+        if version is not None:
+            try:
+                version = int(version)
+            except (TypeError, ValueError):
+                version = 0
+            if version < 1:
+                return Response({"error": "version must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+        result = services.rollback_timetable(timetable, version)
+        if result["status"] == "error":
+            # A named version that is not kept is missing; no older version to fall back to is a bad request
+            code = status.HTTP_404_NOT_FOUND if version is not None else status.HTTP_400_BAD_REQUEST
+            return Response(result, status=code)
+        return Response(result)
+
     @action(detail=True, methods=["get"], url_path="statistics")
     def get_statistics(self, request, pk=None):
         """Get comprehensive timetable statistics"""
@@ -195,153 +269,61 @@ class InvigilationDutyViewSet(viewsets.ModelViewSet):
 
 
 class CSVImportViewSet(viewsets.ViewSet):
-    @action(detail=False, methods=["post"], url_path="courses")
-    def import_courses(self, request):
+    def _run_import(self, request, importer):
         file = request.FILES.get("file")
         if not file:
             return Response({"detail": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
-        reader = csv.DictReader(TextIOWrapper(file, encoding="utf-8"))
-        created = 0
-        with transaction.atomic():
-            for row in reader:
-                data = {
-                    "code": row.get("code"),
-                    "name": row.get("name"),
-                    "lecture_hours": int(row.get("lecture_hours", 0)),
-                    "tutorial_hours": int(row.get("tutorial_hours", 0)),
-                    "practical_hours": int(row.get("practical_hours", 0)),
-                    "self_study_hours": int(row.get("self_study_hours", 0)),
-                    "credits": int(row.get("credits", 0)),
-                    "is_half_semester": row.get("is_half_semester", "false").lower() in ("1", "true", "yes"),
-                    "is_elective": row.get("is_elective", "false").lower() in ("1", "true", "yes"),
-                }
-                instructor_emails = [e.strip() for e in (row.get("instructors") or "").split(",") if e.strip()]
-                serializer = serializers.CourseSerializer(data={**data, "instructors": []})
-                serializer.is_valid(raise_exception=True)
-                course = serializer.save()
-                if instructor_emails:
-                    profs = list(models.Professor.objects.filter(email__in=instructor_emails))
-                    course.instructors.set(profs)
-                created += 1
-        return Response({"created": created})
+        dry_run = request.query_params.get("dry_run", "false").lower() in imports.TRUE_VALUES
+        return Response(importer(file, dry_run=dry_run))
+
+    @action(detail=False, methods=["post"], url_path="courses")
+    def import_courses(self, request):
+        return self._run_import(request, imports.import_courses)
 
     @action(detail=False, methods=["post"], url_path="students")
     def import_students(self, request):
-        file = request.FILES.get("file")
-        if not file:
-            return Response({"detail": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
-        reader = csv.DictReader(TextIOWrapper(file, encoding="utf-8"))
-        created = 0
-        with transaction.atomic():
-            for row in reader:
-                models.Student.objects.update_or_create(
-                    roll_number=row.get("roll_number"),
-                    defaults={
-                        "name": row.get("name"),
-                        "program": row.get("program", ""),
-                        "batch": row.get("batch", ""),
-                        "section": row.get("section", "A"),
-                    },
-                )
-                created += 1
-        return Response({"created": created})
+        return self._run_import(request, imports.import_students)
 
     @action(detail=False, methods=["post"], url_path="professors")
     def import_professors(self, request):
-        file = request.FILES.get("file")
-        if not file:
-            return Response({"detail": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
-        reader = csv.DictReader(TextIOWrapper(file, encoding="utf-8"))
-        created = 0
-        with transaction.atomic():
-            for row in reader:
-                models.Professor.objects.update_or_create(
-                    email=row.get("email"),
-                    defaults={
-                        "name": row.get("name"),
-                        "department": row.get("department", ""),
-                    },
-                )
-                created += 1
-        return Response({"created": created})
+        return self._run_import(request, imports.import_professors)
 
     @action(detail=False, methods=["post"], url_path="rooms")
     def import_rooms(self, request):
-        file = request.FILES.get("file")
-        if not file:
-            return Response({"detail": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
-        reader = csv.DictReader(TextIOWrapper(file, encoding="utf-8"))
-        created = 0
-        with transaction.atomic():
-            for row in reader:
-                models.Room.objects.update_or_create(
-                    code=row.get("code"),
-                    defaults={
-                        "name": row.get("name"),
-                        "building": row.get("building", ""),
-                        "capacity": int(row.get("capacity", 0)),
-                        "room_type": row.get("room_type", models.RoomType.CLASSROOM),
-                    },
-                )
-                created += 1
-        return Response({"created": created})
+        return self._run_import(request, imports.import_rooms)
 
     @action(detail=False, methods=["post"], url_path="slots")
     def import_slots(self, request):
-        file = request.FILES.get("file")
-        if not file:
-            return Response({"detail": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
-        reader = csv.DictReader(TextIOWrapper(file, encoding="utf-8"))
-        created = 0
-        with transaction.atomic():
-            for row in reader:
-                models.Slot.objects.update_or_create(
-                    code=row.get("code"),
-                    defaults={
-                        "day_of_week": int(row.get("day_of_week")),
-                        "start_time": row.get("start_time"),
-                        "end_time": row.get("end_time"),
-                    },
-                )
-                created += 1
-        return Response({"created": created})
+        return self._run_import(request, imports.import_slots)
 
     @action(detail=False, methods=["post"], url_path="professor-availability")
     def import_professor_availability(self, request):
-        file = request.FILES.get("file")
-        if not file:
-            return Response({"detail": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
-        reader = csv.DictReader(TextIOWrapper(file, encoding="utf-8"))
-        created = 0
-        with transaction.atomic():
-            for row in reader:
-                professor = models.Professor.objects.get(email=row.get("professor_email"))
-                models.ProfessorAvailability.objects.update_or_create(
-                    professor=professor,
-                    day_of_week=int(row.get("day_of_week")),
-                    start_time=row.get("start_time"),
-                    end_time=row.get("end_time"),
-                )
-                created += 1
-        return Response({"created": created})
+        return self._run_import(request, imports.import_professor_availability)
 
     @action(detail=False, methods=["post"], url_path="room-availability")
     def import_room_availability(self, request):
-        file = request.FILES.get("file")
-        if not file:
-            return Response({"detail": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
-        reader = csv.DictReader(TextIOWrapper(file, encoding="utf-8"))
-        created = 0
-        with transaction.atomic():
-            for row in reader:
-                room = models.Room.objects.get(code=row.get("room_code"))
-                models.RoomAvailability.objects.update_or_create(
-                    room=room,
-                    day_of_week=int(row.get("day_of_week")),
-                    defaults={
-                        "start_time": row.get("start_time"),
-                        "end_time": row.get("end_time"),
-                    },
-                )
-                created += 1
-        return Response({"created": created})
\ No newline at end of file
+        return self._run_import(request, imports.import_room_availability)
+
+    @action(detail=False, methods=["post"], url_path="enrollments")
+    def import_enrollments(self, request):
+        replace = request.query_params.get("replace", "false").lower() in imports.TRUE_VALUES
+        return self._run_import(request, partial(imports.import_enrollments, replace=replace))
+
+    @action(detail=False, methods=["post"], url_path="core-courses")
+    def import_core_courses(self, request):
+        return self._run_import(request, imports.import_core_courses)
+
+
+def metrics(request):
+    """Scheduler profiling totals for this process in Prometheus text format"""
+    return HttpResponse(profiling.render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api_view(["GET", "DELETE"])
+@permission_classes([IsAdminUser])
+def request_metrics(request):
+    """Per-route request latency and query counts; DELETE starts a fresh window"""
+    if request.method == "DELETE":
+        middleware.reset_route_metrics()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({"routes": middleware.route_metrics()})
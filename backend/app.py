@@ -1,10 +1,19 @@
+import click
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from pymongo import MongoClient
-from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from bson import BSON, ObjectId
 from urllib.parse import quote_plus
+import hashlib
 import json
 import logging
+import atexit
+import os
+import queue
+import threading
+import time
+import random
+from collections import OrderedDict
 from datetime import datetime
 
 app = Flask(__name__)
@@ -26,20 +35,339 @@ encoded_password = quote_plus(password)
 
 MONGODB_URI = f"mongodb+srv://{encoded_username}:{encoded_password}@{cluster_url}/?retryWrites=true&w=majority"
 
+# Connection pool settings (override via environment)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '20'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '20000'))
+HEALTH_CHECK_INTERVAL = float(os.environ.get('MONGO_HEALTH_CHECK_INTERVAL', '15'))
+
+# Listing and latest-timetable cache settings
+TIMETABLES_PAGE_SIZE = 50
+TIMETABLES_MAX_PAGE_SIZE = 200
+LATEST_CACHE_TTL = float(os.environ.get('LATEST_TIMETABLE_CACHE_TTL', '30'))
+GENERATION_CACHE_SIZE = int(os.environ.get('GENERATION_CACHE_SIZE', '128'))
+
+# Write-behind persistence of generated timetables
+WRITE_QUEUE_SIZE = int(os.environ.get('TIMETABLE_WRITE_QUEUE_SIZE', '256'))
+WRITE_MAX_ATTEMPTS = int(os.environ.get('TIMETABLE_WRITE_MAX_ATTEMPTS', '5'))
+WRITE_RETRY_BACKOFF = float(os.environ.get('TIMETABLE_WRITE_RETRY_BACKOFF', '0.5'))
+WRITE_FLUSH_TIMEOUT = float(os.environ.get('TIMETABLE_WRITE_FLUSH_TIMEOUT', '30'))
+
+# One pooled client per process, created on first use
+_mongo_client = None
+_mongo_client_lock = threading.Lock()
+_indexes_ensured = False
+
+# Last known connectivity, refreshed by a background thread
+_db_health = {'connected': None, 'checked_at': None, 'error': None}
+_health_thread = None
+
+def get_client():
+    """Return the process-wide MongoClient, creating it (and the indexes) lazily"""
+    global _mongo_client, _indexes_ensured
+    if _mongo_client is None:
+        with _mongo_client_lock:
+            if _mongo_client is None:
+                _mongo_client = MongoClient(
+                    MONGODB_URI,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                    connect=False,
+                )
+                if not _indexes_ensured:
+                    _indexes_ensured = True
+                    ensure_indexes()
+                start_health_monitor()
+    return _mongo_client
+
+def check_database_health():
+    """Ping MongoDB once and record the result"""
+    try:
+        get_client().admin.command('ping')
+        connected, error = True, None
+    except Exception as e:
+        connected, error = False, str(e)
+    if connected != _db_health['connected']:
+        if connected:
+            logger.info("Successfully connected to MongoDB")
+        else:
+            logger.error(f"Failed to connect to MongoDB: {error}")
+    _db_health.update(connected=connected, checked_at=datetime.now(), error=error)
+    return connected
+
+def _health_loop():
+    while True:
+        check_database_health()
+        time.sleep(HEALTH_CHECK_INTERVAL)
+
+def start_health_monitor():
+    global _health_thread
+    if _health_thread is None:
+        _health_thread = threading.Thread(target=_health_loop, name='mongo-health', daemon=True)
+        _health_thread.start()
+
+def ensure_indexes():
+    """Create the indexes behind /timetables and /get_timetable (idempotent)"""
+    try:
+        collection = get_client().timetable_db.timetables
+        collection.create_index(
+            [('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+            name='status_created_at'
+        )
+        collection.create_index([('created_at', DESCENDING), ('_id', DESCENDING)], name='created_at')
+        collection.create_index([('input_hash', ASCENDING)], name='input_hash')
+    except Exception as e:
+        logger.error(f"Failed to create MongoDB indexes: {str(e)}")
+
 def get_database():
+    """Return the timetable database, or None while MongoDB is known to be unreachable"""
     try:
-        client = MongoClient(MONGODB_URI)
-        # Test the connection
-        client.admin.command('ping')
-        logger.info("Successfully connected to MongoDB")
-        return client.timetable_db
+        client = get_client()
     except Exception as e:
-        logger.error(f"Failed to connect to MongoDB: {str(e)}")
+        logger.error(f"Failed to create MongoDB client: {str(e)}")
+        return None
+    if _db_health['connected'] is False:
         return None
+    return client.timetable_db
+
+# Storage format of timetables saved to MongoDB
+GRID_FORMAT = 'grid-v1'
+FREE_CELL = -1
+
+def compact_timetable(timetable):
+    """
+    Pack the {class: {day: [cell, ...]}} API shape into the stored grid format
+
+    Distinct (subject, teacher) pairs are stored once in ``slots`` as
+    indices into the ``subjects``/``teachers`` tables; each class keeps a
+    day x period matrix of slot indices, with -1 for a free period.
+    """
+    subjects, teachers, slots = [], [], []
+    subject_index, teacher_index, slot_index = {}, {}, {}
+    days = []
+    classes = {}
+    for class_name, class_days in timetable.items():
+        if not days:
+            days = list(class_days)
+        matrix = []
+        for day in days:
+            row = []
+            for cell in class_days.get(day, []):
+                subject = cell.get('subject') if isinstance(cell, dict) else cell
+                teacher = cell.get('teacher', '') if isinstance(cell, dict) else ''
+                if subject in (None, '', 'Free'):
+                    row.append(FREE_CELL)
+                    continue
+                if subject not in subject_index:
+                    subject_index[subject] = len(subjects)
+                    subjects.append(subject)
+                if teacher not in teacher_index:
+                    teacher_index[teacher] = len(teachers)
+                    teachers.append(teacher)
+                pair = (subject_index[subject], teacher_index[teacher])
+                if pair not in slot_index:
+                    slot_index[pair] = len(slots)
+                    slots.append(list(pair))
+                row.append(slot_index[pair])
+            matrix.append(row)
+        classes[class_name] = matrix
+    return {
+        'format': GRID_FORMAT,
+        'days': days,
+        'subjects': subjects,
+        'teachers': teachers,
+        'slots': slots,
+        'classes': classes,
+    }
+
+def expand_timetable(grid):
+    """Unpack a stored grid back into the {class: {day: [cell, ...]}} API shape"""
+    cells = [
+        {'subject': grid['subjects'][s], 'teacher': grid['teachers'][t]}
+        for s, t in grid['slots']
+    ]
+    free = {'subject': 'Free', 'teacher': ''}
+    return {
+        class_name: {
+            day: [cells[i] if i != FREE_CELL else free for i in matrix[d]]
+            for d, day in enumerate(grid['days'])
+        }
+        for class_name, matrix in grid['classes'].items()
+    }
+
+def document_timetable(doc):
+    """Timetable of a stored document in API shape, for both grid and legacy documents"""
+    if 'grid' in doc:
+        return expand_timetable(doc['grid'])
+    return doc.get('timetable_data')
 
 # Store generated timetable globally (fallback)
 generated_timetable = None
 
+# Latest generated document from MongoDB, shared by /get_timetable calls
+_latest_cache = {'doc': None, 'loaded_at': 0.0}
+
+def invalidate_latest_cache():
+    _latest_cache.update(doc=None, loaded_at=0.0)
+
+def get_latest_timetable(db):
+    """Latest generated timetable document, cached in-process for LATEST_CACHE_TTL seconds"""
+    if _latest_cache['doc'] is not None and time.monotonic() - _latest_cache['loaded_at'] < LATEST_CACHE_TTL:
+        return _latest_cache['doc']
+    doc = db.timetables.find_one(
+        {'status': 'generated'}, 
+        {'grid': 1, 'timetable_data': 1, 'created_at': 1},
+        sort=[('created_at', -1), ('_id', -1)]
+    )
+    _latest_cache.update(doc=doc, loaded_at=time.monotonic())
+    return doc
+
+# Generated timetables keyed by input hash: hash -> (document id or None, timetable)
+_generation_cache = OrderedDict()
+_generation_cache_lock = threading.Lock()
+
+def generation_key(subjects, teachers, classes, periods_per_day, working_days):
+    """
+    Canonical hash of a generation request
+
+    Dict key order is normalized away; list order is kept because the
+    generator places subjects in the order given.
+    """
+    canonical = json.dumps(
+        {
+            'subjects': subjects,
+            'teachers': teachers,
+            'classes': classes,
+            'periods_per_day': periods_per_day,
+            'working_days': working_days,
+        },
+        sort_keys=True,
+        separators=(',', ':'),
+        default=str
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def remember_generation(key, document_id, timetable):
+    with _generation_cache_lock:
+        _generation_cache[key] = (document_id, timetable)
+        _generation_cache.move_to_end(key)
+        while len(_generation_cache) > GENERATION_CACHE_SIZE:
+            _generation_cache.popitem(last=False)
+
+def forget_document(document_id):
+    with _generation_cache_lock:
+        for key in [k for k, (doc_id, _) in _generation_cache.items() if doc_id == document_id]:
+            del _generation_cache[key]
+
+def find_generation(db, key):
+    """Look up a previous result for ``key`` in the LRU, then in MongoDB"""
+    with _generation_cache_lock:
+        hit = _generation_cache.get(key)
+        if hit is not None:
+            _generation_cache.move_to_end(key)
+            return hit
+    if db is None:
+        return None
+    doc = db.timetables.find_one({'input_hash': key, 'status': 'generated'}, {'grid': 1, 'timetable_data': 1})
+    if doc is None:
+        return None
+    timetable = document_timetable(doc)
+    remember_generation(key, doc['_id'], timetable)
+    return doc['_id'], timetable
+
+# Bounded queue of documents waiting to be inserted by the writer thread
+_write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+_write_stats = {'enqueued': 0, 'written': 0, 'retries': 0, 'failed': 0, 'inline': 0, 'last_error': None}
+_write_stats_lock = threading.Lock()
+_writer_thread = None
+_writer_thread_lock = threading.Lock()
+
+def _count_write(key, error=None):
+    with _write_stats_lock:
+        _write_stats[key] += 1
+        if error is not None:
+            _write_stats['last_error'] = {'error': error, 'at': datetime.now().isoformat()}
+
+def _insert_timetable(doc):
+    """Insert one document, retrying with exponential backoff; returns True once stored"""
+    for attempt in range(1, WRITE_MAX_ATTEMPTS + 1):
+        db = get_database()
+        try:
+            if db is None:
+                raise RuntimeError('MongoDB is unreachable')
+            db.timetables.insert_one(doc)
+            _count_write('written')
+            logger.info(f"Timetable saved to MongoDB with ID: {doc['_id']}")
+            return True
+        except Exception as e:
+            # Duplicate key means an earlier attempt landed before its ack was lost
+            if getattr(e, 'code', None) == 11000:
+                _count_write('written')
+                return True
+            if attempt == WRITE_MAX_ATTEMPTS:
+                _count_write('failed', str(e))
+                logger.error(f"Failed to save timetable {doc['_id']} to MongoDB: {str(e)}")
+                return False
+            _count_write('retries', str(e))
+            time.sleep(WRITE_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+def _persist(doc):
+    if not _insert_timetable(doc):
+        # Never stored: stop handing out its id as a cached result
+        forget_document(doc['_id'])
+        if _latest_cache['doc'] is doc:
+            invalidate_latest_cache()
+
+def _write_loop():
+    while True:
+        doc = _write_queue.get()
+        try:
+            _persist(doc)
+        finally:
+            _write_queue.task_done()
+
+def start_writer():
+    global _writer_thread
+    with _writer_thread_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_write_loop, name='timetable-writer', daemon=True)
+            _writer_thread.start()
+
+def enqueue_timetable(doc):
+    """
+    Queue ``doc`` for insertion by the writer thread
+
+    The caller assigns ``_id`` up front so it can answer with the id before
+    the write happens. When the queue is full the write is done inline,
+    which slows the request down instead of dropping the document.
+    """
+    start_writer()
+    try:
+        _write_queue.put_nowait(doc)
+        _count_write('enqueued')
+    except queue.Full:
+        _count_write('inline')
+        _persist(doc)
+
+@atexit.register
+def flush_write_queue(timeout=None):
+    """Wait for queued writes to finish; returns the number still pending"""
+    timeout = WRITE_FLUSH_TIMEOUT if timeout is None else timeout
+    if _writer_thread is None:
+        return 0
+    deadline = time.monotonic() + timeout
+    while _write_queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+    pending = _write_queue.unfinished_tasks
+    if pending:
+        logger.error(f"{pending} timetable write(s) still pending at shutdown")
+    return pending
+
 @app.route('/generate_timetable', methods=['POST'])
 def generate_timetable():
     global generated_timetable
@@ -66,37 +394,60 @@ def generate_timetable():
                 'message': 'Incomplete data provided. Please check subjects, teachers, and classes.'
             }), 400
         
+        # Identical requests reuse the stored result instead of regenerating
+        input_hash = generation_key(subjects, teachers, classes, periods_per_day, working_days)
+        db = get_database()
+        try:
+            previous = find_generation(db, input_hash)
+        except Exception as e:
+            logger.error(f"Failed to look up cached timetable: {str(e)}")
+            previous = None
+        if previous is not None:
+            document_id, timetable = previous
+            generated_timetable = timetable
+            logger.info(f"Reusing timetable for input {input_hash[:12]}")
+            return jsonify({
+                'status': 'generated',
+                'timetable': timetable,
+                'message': 'Timetable generated successfully',
+                'cache_hit': True,
+                'timetable_id': str(document_id) if document_id else None
+            })
+        
         # Generate timetable
         timetable = generate_timetable_logic(subjects, teachers, classes, periods_per_day, working_days)
         
         if timetable:
             generated_timetable = timetable
+            document_id = None
             
-            # Save to MongoDB
-            db = get_database()
-            if db:
-                try:
-                    timetable_doc = {
-                        'name': f'Timetable_{datetime.now().strftime("%Y%m%d_%H%M%S")}',
-                        'subjects': subjects,
-                        'teachers': teachers,
-                        'classes': classes,
-                        'periods_per_day': periods_per_day,
-                        'working_days': working_days,
-                        'timetable_data': timetable,
-                        'created_at': datetime.now(),
-                        'status': 'generated'
-                    }
-                    result = db.timetables.insert_one(timetable_doc)
-                    logger.info(f"Timetable saved to MongoDB with ID: {result.inserted_id}")
-                except Exception as e:
-                    logger.error(f"Failed to save to MongoDB: {str(e)}")
+            # Save to MongoDB in the background; the id is assigned here so it can be returned now
+            if db is not None:
+                timetable_doc = {
+                    '_id': ObjectId(),
+                    'name': f'Timetable_{datetime.now().strftime("%Y%m%d_%H%M%S")}',
+                    'classes': classes,
+                    'periods_per_day': periods_per_day,
+                    'working_days': working_days,
+                    'grid': compact_timetable(timetable),
+                    'created_at': datetime.now(),
+                    'status': 'generated',
+                    'input_hash': input_hash
+                }
+                document_id = timetable_doc['_id']
+                _latest_cache.update(doc=timetable_doc, loaded_at=time.monotonic())
             
+            # Only a result that is being stored is reused; _persist evicts it again if the write fails
+            if document_id is not None:
+                remember_generation(input_hash, document_id, timetable)
+                enqueue_timetable(timetable_doc)
             logger.info("Timetable generated successfully")
             return jsonify({
                 'status': 'generated',
                 'timetable': timetable,
-                'message': 'Timetable generated successfully'
+                'message': 'Timetable generated successfully',
+                'cache_hit': False,
+                'timetable_id': str(document_id) if document_id else None
             })
         else:
             logger.warning("Timetable generation failed")
@@ -115,28 +466,31 @@ def generate_timetable():
 def generate_timetable_logic(subjects, teachers, classes, periods_per_day, working_days):
     """
     Core timetable generation logic
+
+    Free periods are kept as one bitmask per day for every class and every
+    teacher (bit p set = period p free), so finding a period both can use
+    is a single AND. Each period of a subject goes to the class's least
+    loaded day that still has a common free period, preferring days where
+    that subject is not yet taught, which spreads the week evenly.
     """
     try:
         timetable = {}
         days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'][:working_days]
+        full_day = (1 << periods_per_day) - 1
         
-        # Initialize timetable structure
-        for class_name in classes:
-            timetable[class_name] = {}
-            for day in days:
-                timetable[class_name][day] = ['Free' for _ in range(periods_per_day)]
+        # Group subjects by class once instead of rescanning per class
+        subjects_by_class = {}
+        for subj in subjects:
+            subjects_by_class.setdefault(subj.get('class'), []).append(subj)
         
-        # Assign subjects to periods
-        teacher_schedule = {}  # Track teacher availability
+        teacher_free = {}  # teacher -> free-period mask per day
         
         for class_name in classes:
-            class_subjects = [subj for subj in subjects if subj.get('class') == class_name]
+            grid = [[None] * periods_per_day for _ in days]
+            class_free = [full_day] * len(days)
+            class_load = [0] * len(days)
             
-            if not class_subjects:
-                continue
-                
-            # Assign subjects to this class
-            for subject_data in class_subjects:
+            for subject_data in subjects_by_class.get(class_name, []):
                 subject_name = subject_data.get('name', '')
                 subject_teacher = subject_data.get('teacher', '')
                 subject_periods = subject_data.get('periodsPerWeek', 1)
@@ -144,47 +498,37 @@ def generate_timetable_logic(subjects, teachers, classes, periods_per_day, worki
                 if not subject_name or not subject_teacher:
                     continue
                 
-                periods_assigned = 0
-                max_attempts = periods_per_day * working_days * 2
+                busy = teacher_free.setdefault(subject_teacher, [full_day] * len(days))
+                entry = {'subject': subject_name, 'teacher': subject_teacher}
+                subject_load = [0] * len(days)
                 
-                for attempt in range(max_attempts):
-                    if periods_assigned >= subject_periods:
-                        break
-                        
-                    # Try to find an available slot
-                    for day in days:
-                        if periods_assigned >= subject_periods:
-                            break
-                            
-                        for period in range(periods_per_day):
-                            if (timetable[class_name][day][period] == 'Free' and 
-                                is_teacher_available(teacher_schedule, subject_teacher, day, period)):
-                                
-                                # Assign the subject
-                                timetable[class_name][day][period] = {
-                                    'subject': subject_name,
-                                    'teacher': subject_teacher
-                                }
-                                
-                                # Update teacher schedule
-                                if subject_teacher not in teacher_schedule:
-                                    teacher_schedule[subject_teacher] = {}
-                                if day not in teacher_schedule[subject_teacher]:
-                                    teacher_schedule[subject_teacher][day] = []
-                                teacher_schedule[subject_teacher][day].append(period)
-                                
-                                periods_assigned += 1
-                                break
-        
-        # Fill remaining slots with free periods
-        for class_name in classes:
-            for day in days:
-                for period in range(periods_per_day):
-                    if timetable[class_name][day][period] == 'Free':
-                        timetable[class_name][day][period] = {
-                            'subject': 'Free',
-                            'teacher': ''
-                        }
+                for _ in range(subject_periods):
+                    best_day = None
+                    for d in range(len(days)):
+                        if class_free[d] & busy[d] and (
+                            best_day is None
+                            or (subject_load[d], class_load[d]) < (subject_load[best_day], class_load[best_day])
+                        ):
+                            best_day = d
+                    if best_day is None:
+                        break  # no common free period left this week
+                    
+                    common = class_free[best_day] & busy[best_day]
+                    period_bit = common & -common  # lowest free period
+                    grid[best_day][period_bit.bit_length() - 1] = entry
+                    class_free[best_day] &= ~period_bit
+                    busy[best_day] &= ~period_bit
+                    class_load[best_day] += 1
+                    subject_load[best_day] += 1
+            
+            # Fill remaining slots with free periods
+            timetable[class_name] = {
+                day: [
+                    slot or {'subject': 'Free', 'teacher': ''}
+                    for slot in grid[d]
+                ]
+                for d, day in enumerate(days)
+            }
         
         logger.info(f"Generated timetable for {len(classes)} classes")
         return timetable
@@ -193,32 +537,19 @@ def generate_timetable_logic(subjects, teachers, classes, periods_per_day, worki
         logger.error(f"Error in timetable logic: {str(e)}")
         return None
 
-def is_teacher_available(teacher_schedule, teacher, day, period):
-    """
-    Check if teacher is available at given day and period
-    """
-    if teacher not in teacher_schedule:
-        return True
-    if day not in teacher_schedule[teacher]:
-        return True
-    return period not in teacher_schedule[teacher][day]
-
 @app.route('/get_timetable', methods=['GET'])
 def get_timetable():
     global generated_timetable
     
     # Try to get from MongoDB first
     db = get_database()
-    if db:
+    if db is not None:
         try:
-            latest_timetable = db.timetables.find_one(
-                {'status': 'generated'}, 
-                sort=[('created_at', -1)]
-            )
+            latest_timetable = get_latest_timetable(db)
             if latest_timetable:
                 return jsonify({
                     'status': 'generated',
-                    'timetable': latest_timetable['timetable_data'],
+                    'timetable': document_timetable(latest_timetable),
                     'message': 'Timetable loaded from database'
                 })
         except Exception as e:
@@ -239,16 +570,44 @@ def get_timetable():
 
 @app.route('/timetables', methods=['GET'])
 def get_all_timetables():
-    """Get all saved timetables"""
+    """
+    Get saved timetables, newest first, one page at a time
+
+    Query parameters: limit (default 50, max 200), after (the next_cursor
+    of the previous page) and an optional status filter.
+    """
     db = get_database()
-    if not db:
+    if db is None:
         return jsonify({'status': 'error', 'message': 'Database connection failed'}), 500
     
     try:
+        limit = min(max(int(request.args.get('limit', TIMETABLES_PAGE_SIZE)), 1), TIMETABLES_MAX_PAGE_SIZE)
+        after = request.args.get('after')
+        status = request.args.get('status')
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit must be an integer'}), 400
+    
+    try:
+        query = {'status': status} if status else {}
+        if after:
+            # Keyset pagination on (created_at, _id) so pages stay stable and index-backed
+            if not ObjectId.is_valid(after):
+                return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+            anchor = db.timetables.find_one({'_id': ObjectId(after)}, {'created_at': 1})
+            if not anchor:
+                return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+            query['$or'] = [
+                {'created_at': {'$lt': anchor['created_at']}},
+                {'created_at': anchor['created_at'], '_id': {'$lt': anchor['_id']}},
+            ]
+        
         timetables = list(db.timetables.find(
-            {}, 
+            query, 
             {'name': 1, 'created_at': 1, 'status': 1, 'classes': 1}
-        ).sort('created_at', -1))
+        ).sort([('created_at', -1), ('_id', -1)]).limit(limit + 1))
+        
+        has_more = len(timetables) > limit
+        timetables = timetables[:limit]
         
         # Convert ObjectId to string for JSON serialization
         for timetable in timetables:
@@ -257,7 +616,8 @@ def get_all_timetables():
         
         return jsonify({
             'status': 'success',
-            'timetables': timetables
+            'timetables': timetables,
+            'next_cursor': timetables[-1]['_id'] if has_more else None
         })
     except Exception as e:
         logger.error(f"Error fetching timetables: {str(e)}")
@@ -267,12 +627,14 @@ def get_all_timetables():
 def get_timetable_by_id(timetable_id):
     """Get specific timetable by ID"""
     db = get_database()
-    if not db:
+    if db is None:
         return jsonify({'status': 'error', 'message': 'Database connection failed'}), 500
     
     try:
         timetable = db.timetables.find_one({'_id': ObjectId(timetable_id)})
         if timetable:
+            timetable['timetable_data'] = document_timetable(timetable)
+            timetable.pop('grid', None)
             timetable['_id'] = str(timetable['_id'])
             timetable['created_at'] = timetable['created_at'].isoformat()
             return jsonify({
@@ -289,11 +651,13 @@ def get_timetable_by_id(timetable_id):
 def delete_timetable(timetable_id):
     """Delete a timetable"""
     db = get_database()
-    if not db:
+    if db is None:
         return jsonify({'status': 'error', 'message': 'Database connection failed'}), 500
     
     try:
         result = db.timetables.delete_one({'_id': ObjectId(timetable_id)})
+        invalidate_latest_cache()
+        forget_document(ObjectId(timetable_id))
         if result.deleted_count > 0:
             return jsonify({'status': 'success', 'message': 'Timetable deleted'})
         else:
@@ -302,44 +666,114 @@ def delete_timetable(timetable_id):
         logger.error(f"Error deleting timetable: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-# Health check endpoint with DB check
+# Health check endpoint with cached DB status
 @app.route('/health', methods=['GET'])
 def health_check():
-    db = get_database()
-    db_status = "connected" if db is not None else "disconnected"  # ← FIXED
+    get_client()  # starts the background monitor on first use
+    if _db_health['connected'] is None:
+        db_status = "unknown"
+    else:
+        db_status = "connected" if _db_health['connected'] else "disconnected"
+    checked_at = _db_health['checked_at']
     return jsonify({
         'status': 'healthy', 
         'message': 'Backend is running',
-        'database': db_status
+        'database': db_status,
+        'database_checked_at': checked_at.isoformat() if checked_at else None
+    })
+
+# Write-behind queue status
+@app.route('/persistence_status', methods=['GET'])
+def persistence_status():
+    with _write_stats_lock:
+        stats = dict(_write_stats)
+    return jsonify({
+        'status': 'success',
+        'queue_depth': _write_queue.qsize(),
+        'pending': _write_queue.unfinished_tasks,
+        'queue_capacity': WRITE_QUEUE_SIZE,
+        'writer_running': _writer_thread is not None and _writer_thread.is_alive(),
+        **stats
     })
 
 # Test MongoDB connection endpoint
 @app.route('/test_db', methods=['GET'])
 def test_db():
-    db = get_database()
-    if db:
-        try:
-            # Test the connection
-            db.command('ping')
-            return jsonify({
-                'status': 'success', 
-                'message': 'MongoDB connection successful'
-            })
-        except Exception as e:
-            return jsonify({
-                'status': 'error', 
-                'message': f'MongoDB connection failed: {str(e)}'
-            })
-    else:
+    # Live ping on the pooled client; also refreshes the cached health status
+    if check_database_health():
         return jsonify({
-            'status': 'error', 
-            'message': 'Failed to connect to MongoDB'
+            'status': 'success', 
+            'message': 'MongoDB connection successful'
         })
+    return jsonify({
+        'status': 'error', 
+        'message': f"MongoDB connection failed: {_db_health['error']}"
+    })
+
+@app.cli.command('compact-timetables')
+def compact_timetables_command():
+    """Rewrite legacy timetable documents into the compact grid format"""
+    db = get_client().timetable_db
+    migrated = 0
+    bytes_before = 0
+    bytes_after = 0
+    for doc in db.timetables.find({'grid': {'$exists': False}, 'timetable_data': {'$exists': True}}):
+        grid = compact_timetable(doc['timetable_data'] or {})
+        compacted = {k: v for k, v in doc.items() if k not in ('timetable_data', 'subjects', 'teachers')}
+        compacted['grid'] = grid
+        bytes_before += len(BSON.encode(doc))
+        bytes_after += len(BSON.encode(compacted))
+        db.timetables.update_one(
+            {'_id': doc['_id']},
+            {'$set': {'grid': grid}, '$unset': {'timetable_data': '', 'subjects': '', 'teachers': ''}}
+        )
+        migrated += 1
+    invalidate_latest_cache()
+    print(f"Compacted {migrated} timetable(s): {bytes_before} -> {bytes_after} bytes")
+
+@app.cli.command('bench-generator')
+@click.option('--classes', default=200, help='Number of classes')
+@click.option('--periods', default=10, help='Periods per day')
+@click.option('--days', default=5, help='Working days')
+@click.option('--subjects', default=9, help='Subjects per class')
+@click.option('--teachers', default=200, help='Teachers shared by all classes')
+@click.option('--repeat', default=5, help='Runs; the fastest is reported')
+@click.option('--seed', default=1)
+def bench_generator_command(classes, periods, days, subjects, teachers, repeat, seed):
+    """Time generate_timetable_logic on a synthetic school and check the result"""
+    rnd = random.Random(seed)
+    class_names = [f'C{i}' for i in range(classes)]
+    teacher_map = {f'T{i}': {} for i in range(teachers)}
+    subject_list = [
+        {'name': f'S{j}', 'teacher': f'T{rnd.randrange(teachers)}', 'class': c, 'periodsPerWeek': rnd.choice([3, 4, 5, 6])}
+        for c in class_names for j in range(subjects)
+    ]
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        timetable = generate_timetable_logic(subject_list, teacher_map, class_names, periods, days)
+        best = min(best, time.perf_counter() - started)
+
+    requested = sum(s['periodsPerWeek'] for s in subject_list)
+    busy = set()
+    placed = clashes = 0
+    per_day = {}
+    for class_days in timetable.values():
+        for day, cells in class_days.items():
+            for period, cell in enumerate(cells):
+                if cell['subject'] == 'Free':
+                    continue
+                placed += 1
+                per_day[day] = per_day.get(day, 0) + 1
+                clashes += (cell['teacher'], day, period) in busy
+                busy.add((cell['teacher'], day, period))
+    print(f"{classes} classes x {periods} periods x {days} days: best of {repeat} {best * 1000:.1f} ms")
+    print(f"placed {placed}/{requested} periods, {clashes} teacher clashes")
+    print("periods per day: " + ', '.join(f'{day} {count}' for day, count in per_day.items()))
 
 if __name__ == '__main__':
     # Test database connection on startup
-    db = get_database()
-    if db is not None:  # ← FIXED: Check if db is not None
+    if check_database_health():
         logger.info("✅ MongoDB connection established")
     else:
         logger.warning("❌ MongoDB connection failed - running in fallback mode")
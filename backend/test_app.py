@@ -0,0 +1,201 @@
+"""Tests of the Flask backend (app.py) against an in-memory MongoDB (mongomock).
+
+Install requirements-dev.txt, then run from backend/: python -m pytest -q test_app.py
+"""
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from bson import ObjectId
+from pymongo.errors import ServerSelectionTimeoutError
+
+import app
+
+REQUEST = {
+    'subjects': [
+        {'name': 'Maths', 'teacher': 'T1', 'periodsPerWeek': 4, 'class': '10A'},
+        {'name': 'Physics', 'teacher': 'T2', 'periodsPerWeek': 3, 'class': '10A'},
+        {'name': 'Maths', 'teacher': 'T1', 'periodsPerWeek': 4, 'class': '10B'},
+    ],
+    'teachers': {'T1': {}, 'T2': {}},
+    'classes': ['10A', '10B'],
+    'periodsPerDay': 6,
+    'workingDays': 5,
+}
+
+
+class DownClient(mongomock.MongoClient):
+    """A client whose server cannot be reached"""
+
+    def __getattr__(self, name):
+        raise ServerSelectionTimeoutError('No servers found yet')
+
+    def __getitem__(self, name):
+        raise ServerSelectionTimeoutError('No servers found yet')
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Point app.py at a fresh mongomock client and reset its process-wide state"""
+    clients = []
+
+    def client_factory(*args, **kwargs):
+        clients.append(mongomock.MongoClient(*args, **kwargs))
+        return clients[-1]
+
+    monkeypatch.setattr(app, 'MONGODB_URI', 'mongodb://localhost')
+    monkeypatch.setattr(app, 'MongoClient', client_factory)
+    monkeypatch.setattr(app, 'start_health_monitor', lambda: None)
+    monkeypatch.setattr(app, 'WRITE_RETRY_BACKOFF', 0)
+    monkeypatch.setattr(app, '_mongo_client', None)
+    monkeypatch.setattr(app, '_indexes_ensured', False)
+    monkeypatch.setattr(app, '_db_health', {'connected': None, 'checked_at': None, 'error': None})
+    monkeypatch.setattr(app, '_write_stats', dict.fromkeys(app._write_stats, 0) | {'last_error': None})
+    monkeypatch.setattr(app, 'generated_timetable', None)
+    app._generation_cache.clear()
+    app.invalidate_latest_cache()
+    yield clients
+    assert app.flush_write_queue(timeout=5) == 0
+    app._generation_cache.clear()
+    app.invalidate_latest_cache()
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def collection():
+    return app.get_client().timetable_db.timetables
+
+
+def test_get_client_is_created_once_with_its_indexes(monkeypatch, mongo):
+    calls = []
+    ensure_indexes = app.ensure_indexes
+    monkeypatch.setattr(app, 'ensure_indexes', lambda: calls.append(1) or ensure_indexes())
+    first = app.get_client()
+    assert app.get_client() is first
+    assert len(mongo) == 1
+    assert calls == [1]
+    assert {'status_created_at', 'created_at', 'input_hash'} <= set(collection().index_information())
+
+
+def test_health_check_connects(mongo, client):
+    assert client.get('/health').get_json()['database'] == 'unknown'
+    assert app.check_database_health() is True
+    body = client.get('/health').get_json()
+    assert body['database'] == 'connected'
+    assert body['database_checked_at'] is not None
+
+
+def test_health_monitor_starts_one_thread(monkeypatch):
+    checks = []
+    monkeypatch.setattr(app, '_health_thread', None)
+    monkeypatch.setattr(app, '_health_loop', lambda: checks.append(1))
+    app.start_health_monitor()
+    thread = app._health_thread
+    app.start_health_monitor()
+    thread.join(timeout=5)
+    assert app._health_thread is thread
+    assert checks == [1]
+
+
+def test_generate_persists_through_the_writer(mongo, client):
+    body = client.post('/generate_timetable', json=REQUEST).get_json()
+    assert body['status'] == 'generated'
+    assert body['cache_hit'] is False
+    assert app.flush_write_queue(timeout=5) == 0
+
+    stored = collection().find_one({'_id': ObjectId(body['timetable_id'])})
+    assert stored['input_hash'] == app.generation_key(
+        REQUEST['subjects'], REQUEST['teachers'], REQUEST['classes'], 6, 5
+    )
+    assert app.document_timetable(stored) == body['timetable']
+    status = client.get('/persistence_status').get_json()
+    assert (status['enqueued'], status['written'], status['failed'], status['pending']) == (1, 1, 0, 0)
+    assert status['writer_running'] is True
+
+
+def test_identical_request_is_a_memo_hit(mongo, client):
+    first = client.post('/generate_timetable', json=REQUEST).get_json()
+    second = client.post('/generate_timetable', json=dict(REQUEST, teachers={'T2': {}, 'T1': {}})).get_json()
+    assert second['cache_hit'] is True
+    assert second['timetable_id'] == first['timetable_id']
+    assert second['timetable'] == first['timetable']
+
+    # Another process (empty LRU) finds the stored result by its input hash
+    app.flush_write_queue(timeout=5)
+    app._generation_cache.clear()
+    third = client.post('/generate_timetable', json=REQUEST).get_json()
+    assert (third['cache_hit'], third['timetable_id']) == (True, first['timetable_id'])
+
+
+def test_delete_invalidates_the_memo(mongo, client):
+    first = client.post('/generate_timetable', json=REQUEST).get_json()
+    app.flush_write_queue(timeout=5)
+    assert client.delete(f"/timetables/{first['timetable_id']}").status_code == 200
+
+    again = client.post('/generate_timetable', json=REQUEST).get_json()
+    assert again['cache_hit'] is False
+    assert again['timetable_id'] != first['timetable_id']
+    assert client.get('/get_timetable').get_json()['message'] == 'Timetable loaded from database'
+
+
+def test_timetables_keyset_pagination(mongo, client):
+    created = datetime(2026, 1, 1)
+    # Two documents share each timestamp so ties are broken by _id
+    docs = [
+        {'_id': ObjectId(), 'name': f'T{i}', 'status': 'generated', 'classes': [], 'created_at': created + timedelta(minutes=i // 2)}
+        for i in range(7)
+    ]
+    collection().insert_many(docs)
+    expected = [str(d['_id']) for d in sorted(docs, key=lambda d: (d['created_at'], d['_id']), reverse=True)]
+
+    seen, cursor = [], None
+    while True:
+        url = '/timetables?limit=3' + (f'&after={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        assert len(page['timetables']) <= 3
+        seen += [t['_id'] for t in page['timetables']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == expected
+    assert client.get('/timetables?after=nope').status_code == 400
+    assert client.get('/timetables?limit=x').status_code == 400
+
+
+def test_mongo_down_falls_back_to_memory(monkeypatch, mongo, client):
+    monkeypatch.setattr(app, 'MongoClient', DownClient)
+    assert app.check_database_health() is False
+    assert client.get('/health').get_json()['database'] == 'disconnected'
+    assert client.get('/timetables').status_code == 500
+
+    body = client.post('/generate_timetable', json=REQUEST).get_json()
+    assert body['status'] == 'generated'
+    assert body['timetable_id'] is None
+    assert client.get('/get_timetable').get_json()['message'] == 'Timetable loaded from memory'
+    assert client.get('/persistence_status').get_json()['enqueued'] == 0
+    # Not stored, so not reused either
+    assert client.post('/generate_timetable', json=REQUEST).get_json()['cache_hit'] is False
+
+
+def test_failed_write_evicts_the_memo(monkeypatch, mongo, client):
+    monkeypatch.setattr(app, 'WRITE_MAX_ATTEMPTS', 1)
+    monkeypatch.setattr(mongomock.collection.Collection, 'insert_one', lambda self, doc: 1 / 0)
+
+    first = client.post('/generate_timetable', json=REQUEST).get_json()
+    assert app.flush_write_queue(timeout=5) == 0
+    assert client.get('/persistence_status').get_json()['failed'] == 1
+    again = client.post('/generate_timetable', json=REQUEST).get_json()
+    assert again['cache_hit'] is False
+    assert again['timetable_id'] != first['timetable_id']
+
+
+def test_bench_generator_command():
+    result = app.app.test_cli_runner().invoke(
+        args=['bench-generator', '--classes', '20', '--teachers', '20', '--repeat', '1']
+    )
+    assert result.exit_code == 0, result.output
+    assert '20 classes x 10 periods x 5 days' in result.output
+    assert ', 0 teacher clashes' in result.output
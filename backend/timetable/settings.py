@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 
@@ -21,6 +22,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.RequestMetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -58,6 +60,16 @@ DATABASES = {
     }
 }
 
+# Applied to each new SQLite connection by api.db.configure_sqlite_connection
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "10000")),
+    # Negative cache_size is in KiB
+    "cache_size": -int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536")),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+}
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = "en-us"
@@ -70,6 +82,34 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Generated session versions kept per timetable for rollback
+TIMETABLE_KEEP_VERSIONS = int(os.environ.get("TIMETABLE_KEEP_VERSIONS", "3"))
+
+# Per-timetable run locks shared by all worker processes on this host
+TIMETABLE_LOCK_DIR = os.environ.get("TIMETABLE_LOCK_DIR", os.path.join(tempfile.gettempdir(), "timetable-locks"))
+TIMETABLE_RUN_WAIT_SECONDS = int(os.environ.get("TIMETABLE_RUN_WAIT_SECONDS", "600"))
+
+# Course-section placement order: "most_constrained" or "input"; per request via ?ordering=
+SCHEDULER_ORDERING = os.environ.get("SCHEDULER_ORDERING", "most_constrained")
+
+# Reuse the compiled class problem across runs until a solver input is written (see api.problem_cache)
+SCHEDULER_PROBLEM_CACHE = os.environ.get("SCHEDULER_PROBLEM_CACHE", "1") == "1"
+
+# Multi-start generation: solver starts per run, their wall-time budget and worker processes
+# (default: one per CPU); per request via ?starts= and ?budget=
+SCHEDULER_PORTFOLIO_STARTS = int(os.environ.get("SCHEDULER_PORTFOLIO_STARTS", "1"))
+SCHEDULER_PORTFOLIO_MAX_STARTS = int(os.environ.get("SCHEDULER_PORTFOLIO_MAX_STARTS", "32"))
+SCHEDULER_PORTFOLIO_BUDGET_SECONDS = float(os.environ.get("SCHEDULER_PORTFOLIO_BUDGET_SECONDS", "30"))
+SCHEDULER_PORTFOLIO_WORKERS = int(os.environ["SCHEDULER_PORTFOLIO_WORKERS"]) if os.environ.get("SCHEDULER_PORTFOLIO_WORKERS") else None
+
+# Solver decision traces, replayable with "manage.py replay_trace"; per request via ?trace=1
+SCHEDULER_TRACE = os.environ.get("SCHEDULER_TRACE", "0") == "1"
+SCHEDULER_TRACE_DIR = os.environ.get("SCHEDULER_TRACE_DIR", os.path.join(tempfile.gettempdir(), "timetable-traces"))
+
+# Requests slower than this, or issuing more queries, are logged with their top SQL statements
+REQUEST_SLOW_MS = float(os.environ.get("REQUEST_SLOW_MS", "1000"))
+REQUEST_SLOW_QUERIES = int(os.environ.get("REQUEST_SLOW_QUERIES", "50"))
+
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",
@@ -78,5 +118,6 @@ REST_FRAMEWORK = {
 }
 
 CORS_ALLOW_ALL_ORIGINS = True  # For development only
+CORS_EXPOSE_HEADERS = ["X-DB-Query-Count", "X-DB-Time-Ms", "X-Response-Time-Ms"]
 
 
@@ -1,10 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 from . import views  # import your home view
+from api import views as api_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),  # keep your api routes
+    path('metrics', api_views.metrics, name='metrics'),
     path('', views.home, name='home'),  # 👈 root path
 ]
     
\ No newline at end of file